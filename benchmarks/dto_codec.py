@@ -0,0 +1,123 @@
+"""
+TortoiseDTO serialization throughput.
+
+Encodes lists of a wide model (``--fields`` columns of mixed types) to JSON
+with litestar's ``DTOBackend`` and with the compiled codecs of
+``oya.core.dto.codec``, as a handler returning ``list[Model]`` does, the
+value rows of a streamed queryset with its ``RowCodec``, and
+times building the DTO of a handler, parsing the model fields each time or
+once. Prints rows per second and build times.
+
+    python benchmarks/dto_codec.py [--fields 40] [--rows 10000] [--rounds 5]
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+from datetime import datetime, timezone
+
+from oya.conf import settings
+
+settings.configure(INSTALLED_APPS=[], TORTOISE_ORM={"connections": {"default": "sqlite://:memory:"}, "apps": {}})
+
+# pylint: disable=wrong-import-position
+from litestar.dto._backend import DTOBackend
+from litestar.serialization import encode_json
+from litestar.typing import FieldDefinition
+from tortoise import Tortoise, fields
+from tortoise.models import Model
+
+from oya.core import dto as dto_module
+from oya.core.dto import TortoiseDTO
+from oya.core.dto.codec import CompiledDTOBackend
+
+
+FIELD_TYPES = (
+    lambda: fields.IntField(),
+    lambda: fields.CharField(max_length=64),
+    lambda: fields.TextField(),
+    lambda: fields.BooleanField(),
+    lambda: fields.DatetimeField(),
+    lambda: fields.CharField(max_length=32, null=True),
+)
+VALUES = (1234, "some short value", "a longer text " * 4, True, datetime(2024, 1, 1, tzinfo=timezone.utc), None)
+
+_handlers = itertools.count()
+
+
+def make_model(count: int) -> type[Model]:
+    attrs = {"__module__": __name__, "id": fields.IntField(pk=True)}
+    for i in range(count - 1):
+        attrs[f"f{i}"] = FIELD_TYPES[i % len(FIELD_TYPES)]()
+    # module attribute, for Tortoise.init() to find it.
+    globals()["Wide"] = model = type("Wide", (Model,), attrs)
+    return model
+
+
+def make_rows(model: type[Model], count: int) -> list[Model]:
+    names = [name for name in model._meta.fields_map if name != "id"]
+    values = {name: VALUES[i % len(VALUES)] for i, name in enumerate(names)}
+    return [model(id=i, **values) for i in range(count)]
+
+
+def make_backend(model: type[Model], backend_cls: type[DTOBackend]) -> DTOBackend:
+    dto = TortoiseDTO[model]
+    handler_id = f"bench:{next(_handlers)}"
+    dto.create_for_field_definition(FieldDefinition.from_annotation(list[model], name="return"), handler_id, backend_cls)
+    return dto._dto_backends[handler_id]["return_backend"]
+
+
+def run(backend: DTOBackend, rows: list[Model], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        encode_json(backend.encode_data(rows))
+    return len(rows) * rounds / (time.perf_counter() - start)
+
+
+def build_time(model: type[Model], cached: bool, count: int = 100) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        if not cached:
+            dto_module._model_fields.clear()
+        make_backend(model, CompiledDTOBackend)
+    return (time.perf_counter() - start) / count * 1000
+
+
+async def main(field_count: int, row_count: int, rounds: int):
+    model = make_model(field_count)
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": [__name__]})
+    try:
+        rows = make_rows(model, row_count)
+        backends = {
+            "litestar DTOBackend": make_backend(model, DTOBackend),
+            "CompiledDTOBackend": make_backend(model, CompiledDTOBackend),
+        }
+        encoded = {encode_json(backend.encode_data(rows[:10])) for backend in backends.values()}
+        assert len(encoded) == 1, "the backends encode differently"
+
+        row_codec = backends["CompiledDTOBackend"].row_codec
+        value_rows = [{column: getattr(row, column) for column in row_codec.columns} for row in rows]
+        assert encode_json(row_codec.encode_many(value_rows[:10])) in encoded, "the row codec encodes differently"
+
+        print(f"{field_count} fields, {row_count} rows, {rounds} rounds")
+        for name, backend in backends.items():
+            print(f"  {name:<20} {run(backend, rows, rounds):>12,.0f} rows/s")
+        start = time.perf_counter()
+        for _ in range(rounds):
+            encode_json(row_codec.encode_many(value_rows))
+        print(f"  {'RowCodec':<20} {row_count * rounds / (time.perf_counter() - start):>12,.0f} rows/s")
+        print("DTO build per handler")
+        for name, cached in (("fields parsed", False), ("fields cached", True)):
+            print(f"  {name:<20} {build_time(model, cached):>12.2f} ms")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fields", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.fields, args.rows, args.rounds))
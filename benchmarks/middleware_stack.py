@@ -0,0 +1,120 @@
+"""
+Layered vs fused header middlewares.
+
+Calls a tiny JSON endpoint through the ASGI interface of three applications:
+no middleware, allowed hosts + CORS + security headers as separate layers
+(the litestar middlewares and SecurityHeadersMiddleware), and the same
+checks in FusedHeadersMiddleware. Prints the time per request.
+
+    python benchmarks/middleware_stack.py [--requests 20000]
+"""
+
+import argparse
+import asyncio
+import time
+
+from oya.conf import settings
+
+settings.configure(
+    SECURITY_HEADERS={
+        "X-Content-Type-Options": "nosniff",
+        "X-Frame-Options": "DENY",
+        "Referrer-Policy": "same-origin",
+    },
+)
+
+# pylint: disable=wrong-import-position
+from litestar import Litestar, get
+from litestar.config.allowed_hosts import AllowedHostsConfig
+from litestar.config.cors import CORSConfig
+from litestar.middleware.base import DefineMiddleware
+
+from oya.middleware.builtins.headers import (
+    FusedHeadersConfig,
+    FusedHeadersMiddleware,
+    SecurityHeadersMiddleware,
+    get_security_headers,
+)
+
+
+HOSTS = ["api.example.com", "*.tenant.example.com"]
+ORIGINS = ["https://app.example.com"]
+
+
+@get("/items/{pk:int}")
+async def item(pk: int) -> dict:
+    return {"pk": pk}
+
+
+def build_apps() -> dict[str, Litestar]:
+    hosts = AllowedHostsConfig(allowed_hosts=HOSTS)
+    cors = CORSConfig(allow_origins=ORIGINS)
+
+    fused_config = FusedHeadersConfig(allowed_hosts=hosts, cors_config=cors, security_headers=get_security_headers())
+    fused = Litestar([item], middleware=[DefineMiddleware(FusedHeadersMiddleware, config=fused_config)])
+    fused_config.compile(fused)
+
+    return {
+        "bare": Litestar([item]),
+        "layered": Litestar([item], allowed_hosts=hosts, cors_config=cors, middleware=[SecurityHeadersMiddleware]),
+        "fused": fused,
+    }
+
+
+def make_scope(app: Litestar, origin: bool) -> dict:
+    headers = [(b"host", b"a.tenant.example.com"), (b"accept", b"application/json")]
+    if origin:
+        headers.append((b"origin", ORIGINS[0].encode()))
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/items/1",
+        "raw_path": b"/items/1",
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "client": ("127.0.0.1", 1234),
+        "server": ("127.0.0.1", 80),
+        "app": app,
+    }
+
+
+async def run(app: Litestar, origin: bool, requests: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    template = make_scope(app, origin)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(template), receive, send)
+    elapsed = time.perf_counter() - start
+    assert set(statuses) == {200}, statuses
+    return elapsed / requests * 1e6
+
+
+async def main(requests: int):
+    apps = build_apps()
+    for app in apps.values():
+        # warm up the routing and the caches.
+        await run(app, True, 200)
+
+    print(f"{'stack':<10}{'no origin':>14}{'with origin':>14}")
+    for name, app in apps.items():
+        plain = min([await run(app, False, requests) for _ in range(3)])
+        cors = min([await run(app, True, requests) for _ in range(3)])
+        print(f"{name:<10}{plain:>11.1f} us{cors:>11.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    asyncio.run(main(parser.parse_args().requests))
@@ -0,0 +1,75 @@
+"""
+Rate limiter throughput.
+
+Counts hits spread over 50k client keys against both algorithms, in the
+in-process store (called directly, as the middleware does) and in the SQLite
+store shared by the workers (called in a thread, as the middleware does).
+Prints the hits per second.
+
+    python benchmarks/ratelimit.py [--keys 50000] [--hits 200000] [--location /dev/shm/ratelimit.sqlite3]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from oya.conf import settings
+
+settings.configure()
+
+# pylint: disable=wrong-import-position
+from oya.middleware.builtins.ratelimit import MemoryRateLimitStore, RateLimit, SQLiteRateLimitStore
+
+
+POLICIES = {
+    "token_bucket": RateLimit("100/minute", algorithm="token_bucket", name="bench"),
+    "sliding_window": RateLimit("100/minute", algorithm="sliding_window", name="bench"),
+}
+
+
+def make_keys(count: int, hits: int) -> list[str]:
+    keys = [f"bench:10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(count)]
+    return [random.choice(keys) for _ in range(hits)]
+
+
+def run_memory(policy: RateLimit, keys: list[str]) -> float:
+    store = MemoryRateLimitStore()
+    start = time.perf_counter()
+    for key in keys:
+        store.hit_sync(key, policy)
+    return len(keys) / (time.perf_counter() - start)
+
+
+async def run_sqlite(policy: RateLimit, keys: list[str], location: str) -> float:
+    store = SQLiteRateLimitStore(location)
+    store.clear()
+    start = time.perf_counter()
+    for key in keys:
+        await store.hit(key, policy)
+    return len(keys) / (time.perf_counter() - start)
+
+
+def main(count: int, hits: int, location: str | None):
+    keys = make_keys(count, hits)
+    # the SQLite store is slower, fewer hits keep the run short.
+    sqlite_keys = keys[: max(hits // 10, count)]
+    with tempfile.TemporaryDirectory(dir="/dev/shm" if os.path.isdir("/dev/shm") else None) as tmp:
+        location = location or os.path.join(tmp, "ratelimit.sqlite3")
+        print(f"{len(keys)} hits over {count} keys ({len(sqlite_keys)} for sqlite)")
+        print(f"{'algorithm':<16}{'memory':>16}{'sqlite':>16}")
+        for name, policy in POLICIES.items():
+            memory = run_memory(policy, keys)
+            sqlite = asyncio.run(run_sqlite(policy, sqlite_keys, location))
+            print(f"{name:<16}{memory:>12,.0f} /s{sqlite:>12,.0f} /s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=50000)
+    parser.add_argument("--hits", type=int, default=200000)
+    parser.add_argument("--location", default=None)
+    args = parser.parse_args()
+    main(args.keys, args.hits, args.location)
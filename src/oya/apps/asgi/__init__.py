@@ -13,6 +13,8 @@ from litestar.config.cors import CORSConfig
 from litestar.config.csrf import CSRFConfig
 from litestar.config.response_cache import ResponseCacheConfig
 from litestar.config.compression import CompressionConfig
+from litestar.middleware.base import DefineMiddleware
+from litestar.middleware.compression import CompressionMiddleware
 from litestar.stores.registry import StoreRegistry
 from litestar.template.config import TemplateConfig
 from litestar.datastructures import State, ETag, CacheControlHeader
@@ -31,6 +33,7 @@ from litestar import Litestar
 from oya.core.exceptions import ImproperlyConfigured
 from oya.core.management.utils import close_tortoise, init_tortoise_auto
 from oya.core.serialization import TortoiseSerializationPlugin
+from oya.core.cache import get_store_registry
 from oya.conf import settings
 from oya.apps import apps
 from oya.middleware.builtins import (
@@ -41,13 +44,38 @@ from oya.middleware.builtins import (
     get_response_cache_config
 )
 
-from .utils import get_template_config, get_static_file_config, get_middleware
+from oya.middleware.builtins.metrics import MetricsMiddleware, get_metrics_handler
+from oya.middleware.builtins.tracing import TracingMiddleware, shutdown_tracing, trace_hook
+from oya.middleware.builtins.monitor import LoopMonitorMiddleware
+from oya.middleware.builtins.hosts import AllowedHostsMatcherMiddleware
+from oya.middleware.builtins.ratelimit import RateLimitMiddleware
+from oya.middleware.builtins.uploads import SpooledUploadMiddleware
+from oya.middleware.builtins.cache import ResponseCacheLeaseMiddleware
+from oya.middleware.builtins.headers import FusedHeadersConfig, FusedHeadersMiddleware, SecurityHeadersMiddleware
+from oya.core.monitor import start_loop_monitor, stop_loop_monitor
+
+from .utils import get_template_config, get_static_file_config, get_middleware, get_logging_config
 
 
 
 __all__ = ("Application",)
 
 
+# outermost layers, measuring the time and errors of the other ones.
+_OUTER_MIDDLEWARES = (MetricsMiddleware, TracingMiddleware, LoopMonitorMiddleware)
+
+
+def _insert_below_outer(middlewares: List[Any], middleware: Any) -> List[Any]:
+    """
+    Return ``middlewares`` with ``middleware`` added first after the metrics,
+    tracing and loop monitor layers.
+    """
+    index = 0
+    while index < len(middlewares) and middlewares[index] in _OUTER_MIDDLEWARES:
+        index += 1
+    return [*middlewares[:index], middleware, *middlewares[index:]]
+
+
 
 
 class Application:
@@ -69,7 +97,7 @@ class Application:
     route_handlers: List[Callable[[Any], Any]] = []
 
     state: dict[str, Any] = {}
-    stores: Any = None
+    stores: Any = get_store_registry()
 
     before_send: List[Callable[[Any], Any]] = []
     after_exceptions: List[Callable[[Any], Any]] = []
@@ -84,7 +112,7 @@ class Application:
 
     allowed_hosts: list[str] | None = get_allowed_hosts_config()
 
-    logging_config:LoggingConfig = LoggingConfig()
+    logging_config:LoggingConfig = get_logging_config()
     static_file_config: List[Any] = get_static_file_config()
     template_config: TemplateConfig | None = get_template_config()
 
@@ -155,11 +183,22 @@ class Application:
         if cls.on_app_init:
             app_config["on_app_init"] = cls.on_app_init 
 
-        if cls.on_startup:
-            app_config["on_startup"] = cls.on_startup
+        on_startup = list(cls.on_startup or [])
+        on_shutdown = list(cls.on_shutdown or [])
+
+        tracing = getattr(settings, 'TRACING_ENABLED', False)
+        if tracing:
+            on_shutdown.append(shutdown_tracing)
+
+        if getattr(settings, 'LOOP_MONITOR_ENABLED', False):
+            on_startup.append(start_loop_monitor)
+            on_shutdown.insert(0, stop_loop_monitor)
 
-        if cls.on_shutdown:
-            app_config["on_shutdown"] = cls.on_shutdown
+        if on_startup:
+            app_config["on_startup"] = on_startup
+
+        if on_shutdown:
+            app_config["on_shutdown"] = on_shutdown
 
 
         if cls.state:
@@ -190,16 +229,22 @@ class Application:
             app_config["exception_handlers"] = cls.exception_hanlders
 
         if cls.before_request:
-            app_config["before_request"] = cls.before_request
+            app_config["before_request"] = (
+                trace_hook(cls.before_request, "before_request") if tracing else cls.before_request
+            )
 
         if cls.after_request:
-            app_config["after_request"] = cls.after_request
+            app_config["after_request"] = (
+                trace_hook(cls.after_request, "after_request") if tracing else cls.after_request
+            )
 
         if cls.after_response:
             app_config["after_response"] = cls.after_response
 
-        if cls.allowed_hosts:
-            app_config["allowed_hosts"] = cls.allowed_hosts
+        # allowed hosts, CORS and security headers fused in one layer.
+        fused_config = None
+        if getattr(settings, 'MIDDLEWARE_FUSED', False):
+            fused_config = FusedHeadersConfig.from_settings(cls.allowed_hosts, cls.cors_config)
 
         if cls.pdb_exceeption:
             app_config["pdb_on_exception"] = cls.pdb_exceeption
@@ -217,11 +262,32 @@ class Application:
             app_config["cache_control"] = cls.cache_control
 
         if cls.compression_config:
-            app_config["compression_config"] = cls.compression_config
-
-        if cls.cors_config:
+            middleware_class = cls.compression_config.middleware_class or CompressionMiddleware
+            if middleware_class is CompressionMiddleware:
+                app_config["compression_config"] = cls.compression_config
+            else:
+                # litestar always builds its own CompressionMiddleware from the config.
+                app_config["middleware"] = _insert_below_outer(
+                    app_config.get("middleware", []),
+                    DefineMiddleware(middleware_class, config=cls.compression_config),
+                )
+
+        if cls.allowed_hosts and fused_config is None:
+            # same checks and place as the litestar middleware, innermost of
+            # the app middlewares, with the precompiled host matcher.
+            app_config["middleware"] = [
+                *app_config.get("middleware", []),
+                DefineMiddleware(AllowedHostsMatcherMiddleware, config=cls.allowed_hosts),
+            ]
+
+        if cls.cors_config and fused_config is None:
             app_config["cors_config"] = cls.cors_config
 
+        if fused_config is not None:
+            app_config["middleware"] = _insert_below_outer(
+                app_config.get("middleware", []), DefineMiddleware(FusedHeadersMiddleware, config=fused_config)
+            )
+
         if cls.csrf_config:
             app_config["csrf_config"] = cls.csrf_config
 
@@ -293,10 +359,15 @@ class Application:
         for app in apps.app_configs.values():
             routes.extend(app.get_endpoints())
 
+        if getattr(settings, 'METRICS_ENABLED', False):
+            routes.append(get_metrics_handler())
+
         app_config["route_handlers"] = set(routes) # unique
 
 
         cls.asgi_application = Litestar(**app_config)
+        if fused_config is not None:
+            fused_config.compile(cls.asgi_application)
 
         return cls.asgi_application
 
@@ -372,4 +443,29 @@ class Application:
         else:
             cls.middlewares = settings_middlewares + cls.middlewares
 
+        # after the other middlewares, so the authentication has run.
+        if getattr(settings, 'RATE_LIMIT_ENABLED', False):
+            cls.middlewares.append(RateLimitMiddleware)
+
+        # the requests of the cached routes coalesce their recomputations.
+        if cls.response_cache_config:
+            cls.middlewares.append(ResponseCacheLeaseMiddleware)
+
+        # innermost, the rejected requests are not read.
+        if getattr(settings, 'UPLOAD_SPOOLED', False):
+            cls.middlewares.append(SpooledUploadMiddleware)
+
+        if getattr(settings, 'SECURITY_HEADERS', None) and not getattr(settings, 'MIDDLEWARE_FUSED', False):
+            cls.middlewares.insert(0, SecurityHeadersMiddleware)
+
+        if getattr(settings, 'LOOP_MONITOR_ENABLED', False):
+            cls.middlewares.insert(0, LoopMonitorMiddleware)
+
+        if getattr(settings, 'TRACING_ENABLED', False):
+            cls.middlewares.insert(0, TracingMiddleware)
+
+        # outermost, so the latency includes the other middlewares.
+        if getattr(settings, 'METRICS_ENABLED', False):
+            cls.middlewares.insert(0, MetricsMiddleware)
+
         cls._middlewares_loaded = True
@@ -1,10 +1,12 @@
 from typing import List, Iterable
 from pathlib import Path
+from litestar.logging import LoggingConfig
 from litestar.template.config import TemplateConfig
 from litestar.static_files.config import StaticFilesConfig
 
 from oya.conf import settings
 from oya.core.exceptions import ImproperlyConfigured, LoadMiddlewareError
+from oya.core.staticfiles import get_collected_config
 from oya.utils.module_loading import import_string
 
 
@@ -72,6 +74,9 @@ def _parse_static_config(conf: dict) -> StaticFilesConfig:
 def get_static_file_config() -> List[StaticFilesConfig]:
     """Get static files configuration.
 
+    The entries collected into settings.STATIC_ROOT (collectstatic command) are
+    served from there, see oya.core.staticfiles.
+
     Returns:
         List[StaticFilesConfig]: Static files configuration.
 
@@ -82,9 +87,9 @@ def get_static_file_config() -> List[StaticFilesConfig]:
     if isinstance(settings.STATIC_FILES, list) or isinstance(settings.STATIC_FILES, tuple):
         for conf in settings.STATIC_FILES:
             if isinstance(conf, dict):
-                configs.append(_parse_static_config(conf))
+                configs.append(get_collected_config(_parse_static_config(conf)))
             elif isinstance(conf, StaticFilesConfig):
-                configs.append(conf)
+                configs.append(get_collected_config(conf))
             else:
                 raise ImproperlyConfigured("settings.STATIC_FILES element must be a dict or StaticFilesConfig.")
         
@@ -109,3 +114,51 @@ def get_middleware():
                 raise ImproperlyConfigured(f"middleware in settings.MIDDLEWARE must compatible string for import, {mid} is not a string")
 
     return _mids
+
+
+
+def get_logging_config() -> LoggingConfig:
+    """Get logging configuration.
+
+    settings.LOGGING (a LoggingConfig or its keyword arguments) is used when
+    defined, otherwise the records are written by the non-blocking pipeline of
+    oya.utils.log.
+
+    Returns:
+        LoggingConfig: Logging configuration.
+    """
+    logging_config = getattr(settings, 'LOGGING', None)
+    if isinstance(logging_config, LoggingConfig):
+        return logging_config
+    if isinstance(logging_config, dict):
+        return LoggingConfig(**logging_config)
+    if logging_config is not None:
+        raise ImproperlyConfigured("settings.LOGGING must be a LoggingConfig or dict.")
+
+    level = getattr(settings, 'LOG_LEVEL', 'INFO')
+    log_format = getattr(settings, 'LOG_FORMAT', 'text' if settings.DEBUG else 'json')
+    if log_format not in ('json', 'text'):
+        raise ImproperlyConfigured("settings.LOG_FORMAT must be 'json' or 'text'.")
+
+    # named queue_listener, so that litestar does not add its own handler.
+    handler = {
+        '()': 'oya.utils.log.QueueLogHandler',
+        'formatter': log_format,
+        'outputs': list(getattr(settings, 'LOG_OUTPUTS', ['stdout'])),
+        'queue_size': getattr(settings, 'LOG_QUEUE_SIZE', 10000),
+        'batch_size': getattr(settings, 'LOG_BATCH_SIZE', 256),
+    }
+    loggers = {
+        name: {'level': level, 'handlers': ['queue_listener'], 'propagate': False}
+        for name in ('litestar', 'oya', 'uvicorn.error', 'uvicorn.access')
+    }
+
+    return LoggingConfig(
+        formatters={
+            'json': {'()': 'oya.utils.log.JSONFormatter'},
+            'text': {'format': '%(levelname)s - %(asctime)s - %(name)s - %(module)s - %(message)s'},
+        },
+        handlers={'queue_listener': handler},
+        loggers=loggers,
+        root={'handlers': ['queue_listener'], 'level': level},
+    )
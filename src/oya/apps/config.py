@@ -7,6 +7,7 @@ https://github.com/django/django/blob/master/django/apps/config.py
 
 import inspect
 import os
+import zlib
 from importlib import import_module
 from types import ModuleType
 
@@ -59,6 +60,26 @@ class AppConfig:
         if not hasattr(self, "path"):
             self.path = self._path_from_module(app_module)
 
+        # Connection names of the shards when the models of this app are
+        # partitioned horizontally, see shard_key().
+        if not hasattr(self, "shards"):
+            self.shards = None
+
+        # Tortoise connection of the app models, this is the
+        # "default_connection" of the app in settings.TORTOISE_ORM['apps'].
+        if not hasattr(self, "connection"):
+            self.connection = self.shards[0] if self.shards else "default"
+
+        # Read replicas used by oya.db.routers.ReplicaRouter for the models of
+        # this app. None falls back to settings.DATABASE_REPLICAS, an empty
+        # list sends every read to the primary.
+        if not hasattr(self, "read_replicas"):
+            self.read_replicas = None
+
+        # Whether reads stick to the primary after a write in the same request.
+        if not hasattr(self, "sticky_reads"):
+            self.sticky_reads = None
+
         # Module containing models e.g. <module 'django.contrib.admin.models'
         # from 'django/contrib/admin/models.py'>. Set by import_models().
         # None if the application doesn't have a models module.
@@ -284,5 +305,27 @@ class AppConfig:
             raise ImproperlyConfigured("Endpoints must be a list, dict or tuple")
         return endpoints
     
+    def get_connections(self) -> list[str]:
+        """
+        Return the connections holding the tables of this app.
+        """
+        return list(self.shards) if self.shards else [self.connection]
+
+    def shard_key(self, model, key) -> int:
+        """
+        Map the shard key of a model row (e.g. a tenant id) to a shard index.
+
+        Override this method in subclasses to control the partitioning.
+        """
+        return zlib.crc32(str(key).encode())
+
+    def get_shard_connection(self, model, key) -> str:
+        """
+        Return the connection name of the shard holding the given key.
+        """
+        if not self.shards:
+            return self.connection
+        return self.shards[self.shard_key(model, key) % len(self.shards)]
+
     def get_migrations_path(self) -> str:
         return os.path.join(self.path, settings.APP_MIGRATIONS_FOLDER)
\ No newline at end of file
@@ -115,15 +115,26 @@ class Apps:
     
 
     def prepare_toirtoise_config(self):
+        connections = settings.TORTOISE_ORM['connections']
         for app_config in self.get_app_configs():
+            for connection in app_config.get_connections():
+                if connection not in connections:
+                    raise ImproperlyConfigured(
+                        "The app '%s' uses the connection '%s' which is not in "
+                        "TORTOISE_ORM['connections']." % (app_config.label, connection)
+                    )
+
             self.tortoise_apps_config[app_config.label] = {
                 'models' : [app_config.get_models()], # will support many models in the future, like is designed by toirtoise
-                "default_connection": "default",       # Connection too will be added on the App Config
+                "default_connection": app_config.connection,
             }
 
         self.tortoise_prepared = True
         settings.TORTOISE_ORM['apps'].update(self.tortoise_apps_config)
 
+        if settings.DATABASE_ROUTERS:
+            settings.TORTOISE_ORM.setdefault('routers', list(settings.DATABASE_ROUTERS))
+
 
     def get_toirtoise_app_config(self):
         if not self.tortoise_prepared:
@@ -14,6 +14,9 @@ DATABASES = {}
 # Classes used to implement DB routing behavior.
 DATABASE_ROUTERS = []
 
+# Read replicas by primary connection name, used by oya.db.routers.ReplicaRouter.
+DATABASE_REPLICAS = {}
+
 # The email backend to use. For possible shortcuts see django.core.mail.
 # The default is to use the SMTP backend.
 # Third-party backends can be specified by providing a Python path
@@ -0,0 +1,102 @@
+"""
+Cache stores.
+
+``settings.CACHES`` declares the stores registered on the application, by
+name (``response_cache`` is the store of the response cache)::
+
+    CACHES = {
+        "response_cache": {
+            "MAX_BYTES": 64 * 1024 * 1024,
+            "SHARED": "oya.core.cache.SQLiteStore",
+            "LOCATION": BASE_DIR / "cache.sqlite3",
+            "STALE_TTL": 30,
+        },
+    }
+
+Each one is a ``TieredStore``: an in-process LRU tier in front of the
+``SHARED`` store (a dotted path or a litestar ``Store`` instance, None to
+cache in memory only). Entries are invalidated by model tags, see
+``oya.core.cache.tags``.
+"""
+
+from typing import Any
+
+from litestar.stores.base import NamespacedStore, Store
+from litestar.stores.registry import StoreRegistry
+
+from oya.conf import settings
+from oya.core.cache.memory import LRUMemoryStore
+from oya.core.cache.sqlite import SQLiteStore
+from oya.core.cache.tags import add_cache_tags, invalidate_tags, model_tag
+from oya.core.cache.tiered import DEFAULT_LOCK_TIMEOUT, DEFAULT_MEMORY_TTL, DEFAULT_TAG_TTL, TieredStore
+from oya.core.exceptions import ImproperlyConfigured
+from oya.utils.module_loading import import_string
+
+
+__all__ = (
+    "LRUMemoryStore",
+    "SQLiteStore",
+    "TieredStore",
+    "add_cache_tags",
+    "get_cache_store",
+    "get_store_registry",
+    "invalidate_tags",
+    "model_tag",
+)
+
+
+DEFAULT_SHARED = "oya.core.cache.SQLiteStore"
+
+
+def _get_shared_store(name: str, conf: dict[str, Any]) -> Store | None:
+    shared = conf.get("SHARED", DEFAULT_SHARED)
+    if shared is None or isinstance(shared, Store):
+        return shared
+
+    try:
+        store_class = import_string(shared)
+    except ImportError as e:
+        raise ImproperlyConfigured(f"CACHES['{name}']['SHARED']: {e}") from e
+
+    location = conf.get("LOCATION")
+    store = store_class(location) if location is not None else store_class()
+    if isinstance(store, NamespacedStore):
+        store = store.with_namespace(name)
+    return store
+
+
+def get_cache_store(name: str) -> TieredStore:
+    """
+    Build the store ``name`` of ``settings.CACHES``.
+    """
+    caches = getattr(settings, "CACHES", None) or {}
+    if name not in caches:
+        raise ImproperlyConfigured(f"'{name}' is not defined in CACHES.")
+
+    conf = caches[name]
+    if not isinstance(conf, dict):
+        raise ImproperlyConfigured(f"CACHES['{name}'] must be a dict.")
+
+    return TieredStore(
+        shared=_get_shared_store(name, conf),
+        max_bytes=conf.get("MAX_BYTES", 64 * 1024 * 1024),
+        memory_ttl=conf.get("MEMORY_TTL", DEFAULT_MEMORY_TTL),
+        stale_ttl=conf.get("STALE_TTL", 0),
+        lock_timeout=conf.get("LOCK_TIMEOUT", DEFAULT_LOCK_TIMEOUT),
+        coalesce=conf.get("COALESCE", True),
+        tag_ttl=conf.get("TAG_TTL", DEFAULT_TAG_TTL),
+    )
+
+
+def get_store_registry() -> StoreRegistry | None:
+    """
+    Return the registry of the stores of ``settings.CACHES``, None when
+    no cache is configured.
+
+    Returns:
+        StoreRegistry | None
+    """
+    caches = getattr(settings, "CACHES", None)
+    if not caches:
+        return None
+    return StoreRegistry({name: get_cache_store(name) for name in caches})
@@ -0,0 +1,108 @@
+import math
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any
+
+from litestar.stores.base import Store
+
+
+__all__ = ("LRUMemoryStore",)
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "meta")
+
+    def __init__(self, value: bytes, expires_at: float, meta: Any):
+        self.value = value
+        self.expires_at = expires_at
+        self.meta = meta
+
+
+def expiry(expires_in: int | float | timedelta | None, now: float | None = None) -> float:
+    """
+    Return the timestamp of an ``expires_in`` delay, ``inf`` for no expiry.
+    """
+    if isinstance(expires_in, timedelta):
+        expires_in = expires_in.total_seconds()
+    if not expires_in:
+        return math.inf
+    return (time.time() if now is None else now) + expires_in
+
+
+class LRUMemoryStore(Store):
+    """
+    In-process store evicting the least recently used values once the stored
+    values exceed ``max_bytes``.
+
+    The entries are only visible to the current process, see ``TieredStore``
+    for a store shared by the workers.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data: OrderedDict[str, _Entry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_entry(self, key: str) -> _Entry | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            self.pop(key)
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def put(self, key: str, value: bytes, expires_at: float = math.inf, meta: Any = None):
+        self.pop(key)
+        if len(value) > self.max_bytes:
+            return
+        self._data[key] = _Entry(value, expires_at, meta)
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self.size -= len(evicted.value)
+
+    def pop(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.value)
+
+    def clear(self):
+        self._data.clear()
+        self.size = 0
+
+    async def set(self, key: str, value: str | bytes, expires_in: int | timedelta | None = None) -> None:
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        self.put(key, value, expiry(expires_in))
+
+    async def get(self, key: str, renew_for: int | timedelta | None = None) -> bytes | None:
+        entry = self.get_entry(key)
+        if entry is None:
+            return None
+        if renew_for and entry.expires_at != math.inf:
+            entry.expires_at = expiry(renew_for)
+        return entry.value
+
+    async def delete(self, key: str) -> None:
+        self.pop(key)
+
+    async def delete_all(self) -> None:
+        self.clear()
+
+    async def exists(self, key: str) -> bool:
+        return self.get_entry(key) is not None
+
+    async def expires_in(self, key: str) -> int | None:
+        entry = self.get_entry(key)
+        if entry is None or entry.expires_at == math.inf:
+            return None
+        return int(entry.expires_at - time.time())
@@ -0,0 +1,171 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from litestar.stores.base import NamespacedStore
+
+from oya.core.cache.memory import expiry
+
+
+__all__ = ("SQLiteStore",)
+
+
+CLEANUP_EVERY = 1000
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS oya_cache ("
+    " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, expires_at REAL,"
+    " PRIMARY KEY (namespace, key)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS oya_cache_lock ("
+    " namespace TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL,"
+    " PRIMARY KEY (namespace, key)) WITHOUT ROWID",
+)
+
+
+class SQLiteStore(NamespacedStore):
+    """
+    Store shared by the processes of a host, backed by a SQLite file in WAL
+    mode. Queries run in a thread.
+
+    Args:
+        path (str | Path): database file, created on first use.
+        namespace (str): isolates the keys of several stores sharing a file.
+        timeout (float): seconds to wait for the lock of a concurrent writer.
+    """
+
+    def __init__(self, path: str | Path = "cache.sqlite3", namespace: str = "oya", timeout: float = 5.0):
+        self.path = str(path)
+        self.namespace = namespace
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._writes = 0
+
+    def with_namespace(self, namespace: str) -> "SQLiteStore":
+        return SQLiteStore(self.path, f"{self.namespace}_{namespace}", self.timeout)
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection must not cross a fork, each worker opens its own.
+        if self._connection is None or self._pid != os.getpid():
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def _execute(self, sql: str, params: tuple = ()) -> tuple | None:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchone()
+
+    def _set(self, key: str, value: bytes, expires_at: float | None):
+        self._execute(
+            "INSERT OR REPLACE INTO oya_cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, key, value, expires_at),
+        )
+        self._writes += 1
+        if self._writes % CLEANUP_EVERY == 0:
+            self._execute("DELETE FROM oya_cache WHERE expires_at <= ?", (time.time(),))
+
+    def _get(self, key: str, renew_for: int | timedelta | None) -> bytes | None:
+        row = self._execute(
+            "SELECT value, expires_at FROM oya_cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+        )
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None:
+            if expires_at <= time.time():
+                self._delete(key)
+                return None
+            if renew_for:
+                self._execute(
+                    "UPDATE oya_cache SET expires_at = ? WHERE namespace = ? AND key = ?",
+                    (expiry(renew_for), self.namespace, key),
+                )
+        return value
+
+    def _delete(self, key: str):
+        self._execute("DELETE FROM oya_cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def _delete_all(self):
+        # child namespaces are deleted with their parent.
+        pattern = self.namespace.replace("\\", "\\\\").replace("_", "\\_").replace("%", "\\%") + "\\_%"
+        self._execute(
+            "DELETE FROM oya_cache WHERE namespace = ? OR namespace LIKE ? ESCAPE '\\'",
+            (self.namespace, pattern),
+        )
+
+    def _expires_at(self, key: str) -> float | None:
+        row = self._execute(
+            "SELECT expires_at FROM oya_cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+        )
+        if row is None:
+            return None
+        if row[0] is not None and row[0] <= time.time():
+            return None
+        return row[0] if row[0] is not None else -1.0
+
+    def _try_lock(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "DELETE FROM oya_cache_lock WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                    (self.namespace, key, now),
+                )
+                acquired = connection.execute(
+                    "INSERT OR IGNORE INTO oya_cache_lock (namespace, key, expires_at) VALUES (?, ?, ?)",
+                    (self.namespace, key, now + ttl),
+                ).rowcount == 1
+            finally:
+                connection.execute("COMMIT")
+        return acquired
+
+    def _unlock(self, key: str):
+        self._execute("DELETE FROM oya_cache_lock WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    async def set(self, key: str, value: str | bytes, expires_in: int | timedelta | None = None) -> None:
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        expires_at = expiry(expires_in)
+        await asyncio.to_thread(self._set, key, value, None if expires_at == float("inf") else expires_at)
+
+    async def get(self, key: str, renew_for: int | timedelta | None = None) -> bytes | None:
+        return await asyncio.to_thread(self._get, key, renew_for)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete, key)
+
+    async def delete_all(self) -> None:
+        await asyncio.to_thread(self._delete_all)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self._expires_at, key) is not None
+
+    async def expires_in(self, key: str) -> int | None:
+        expires_at = await asyncio.to_thread(self._expires_at, key)
+        if expires_at is None or expires_at < 0:
+            return None
+        return int(expires_at - time.time())
+
+    async def try_lock(self, key: str, ttl: float) -> bool:
+        """
+        Take the lease of ``key`` for ``ttl`` seconds, False when another
+        process holds it.
+        """
+        return await asyncio.to_thread(self._try_lock, key, ttl)
+
+    async def unlock(self, key: str) -> None:
+        await asyncio.to_thread(self._unlock, key)
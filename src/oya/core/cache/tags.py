@@ -0,0 +1,179 @@
+"""
+Model tags of the cache entries.
+
+The entries of a ``TieredStore`` carry the tags added while they were
+computed, with ``add_cache_tags()`` in the handler (or the ``cache_tags``
+opt of a cached route) for the response cache or in the ``compute`` of
+``TieredStore.get_or_set()`` for fragments. Saving or deleting a model
+instance invalidates the tags of its model and of its primary key::
+
+    @get("/posts/{pk:int}", cache=3600)
+    async def post(pk: int) -> dict:
+        post = await Post.get(pk=pk)
+        add_cache_tags(post)            # "blog.Post:<pk>", purged on save
+        ...
+
+    @get("/posts", cache=3600, opt={"cache_tags": [Post]})   # "blog.Post"
+    async def posts() -> list: ...
+
+The tags of the changes made in a transaction are invalidated once it is
+committed, so no entry is recomputed from the rows it has not committed yet.
+Bulk ``update()``/``delete()`` queries send no signal, call
+``invalidate_tags()`` after them.
+"""
+
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterable, Iterator
+
+from tortoise import Tortoise
+from tortoise.backends.base.client import BaseDBAsyncClient, BaseTransactionWrapper
+from tortoise.models import Model
+from tortoise.signals import Signals
+
+from oya.db.commit import on_commit
+
+
+__all__ = (
+    "add_cache_tags",
+    "get_cache_tags",
+    "get_model_tags",
+    "invalidate_tags",
+    "model_tag",
+    "register_invalidation_receivers",
+    "tag_scope",
+)
+
+
+_tags: ContextVar[set[str] | None] = ContextVar("oya_cache_tags", default=None)
+
+# stores holding tagged entries, see TieredStore.
+_stores: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+
+def register_tagged_store(store: Any):
+    _stores.add(store)
+
+
+def model_tag(model: type[Model], pk: Any = None) -> str:
+    """
+    Return the tag of a model, or of one of its instances when ``pk`` is
+    given.
+    """
+    label = f"{model._meta.app or model.__module__}.{model.__name__}"  # pylint: disable=protected-access
+    return label if pk is None else f"{label}:{pk}"
+
+
+def _as_tags(obj: Any) -> Iterator[str]:
+    if isinstance(obj, str):
+        yield obj
+    elif isinstance(obj, Model):
+        yield model_tag(type(obj), obj.pk)
+    elif isinstance(obj, type) and issubclass(obj, Model):
+        yield model_tag(obj)
+    elif isinstance(obj, Iterable):
+        for item in obj:
+            yield from _as_tags(item)
+    else:
+        raise TypeError(f"Unable to tag a cache entry with {obj!r}")
+
+
+def add_cache_tags(*objects: Any):
+    """
+    Tag the cache entry being computed with tags, models (any instance
+    saved) or instances (this instance saved).
+    """
+    tags = _tags.get()
+    if tags is None:
+        tags = set()
+        _tags.set(tags)
+    for obj in objects:
+        tags.update(_as_tags(obj))
+
+
+def get_cache_tags() -> set[str]:
+    return _tags.get() or set()
+
+
+def start_tag_collection():
+    """
+    Reset the tags of the current context, done when a request starts to
+    recompute a cached response.
+    """
+    _tags.set(set())
+
+
+@contextmanager
+def tag_scope() -> Iterator[set[str]]:
+    """
+    Collect the tags of a nested entry (a fragment), they are added to the
+    enclosing entry too.
+    """
+    outer = _tags.get()
+    tags: set[str] = set()
+    token = _tags.set(tags)
+    try:
+        yield tags
+    finally:
+        _tags.reset(token)
+        if outer is not None:
+            outer.update(tags)
+
+
+def get_model_tags(instance: Model) -> list[str]:
+    """
+    Return the tags invalidated by a change of ``instance``, for its class
+    and the model classes it inherits from.
+    """
+    tags = []
+    for cls in type(instance).__mro__:
+        if cls is Model or not (isinstance(cls, type) and issubclass(cls, Model)):
+            continue
+        tags.append(model_tag(cls))
+        tags.append(model_tag(cls, instance.pk))
+    return tags
+
+
+async def invalidate_tags(*tags: str):
+    """
+    Invalidate the entries tagged with any of ``tags`` in every store.
+    """
+    for store in list(_stores):
+        await store.invalidate_tags(tags)
+
+
+_PENDING_TAGS = "_oya_cache_tags"
+
+
+async def _invalidate_instance(sender, instance: Model, *args, **kwargs):
+    if not _stores:
+        return
+    tags = get_model_tags(instance)
+    # the connection of the change, positional in post_save and post_delete.
+    connection = next((arg for arg in args if isinstance(arg, BaseDBAsyncClient)), None)
+    if not isinstance(connection, BaseTransactionWrapper):
+        await invalidate_tags(*tags)
+        return
+
+    pending = connection.__dict__.get(_PENDING_TAGS)
+    if pending is None:
+        pending = set()
+        setattr(connection, _PENDING_TAGS, pending)
+
+        async def flush():
+            await invalidate_tags(*connection.__dict__.pop(_PENDING_TAGS, ()))
+
+        await on_commit(flush, connection)
+    pending.update(tags)
+
+
+def register_invalidation_receivers():
+    """
+    Connect the ``post_save`` and ``post_delete`` receivers invalidating the
+    tags of every model, called once Tortoise is initialized.
+    """
+    for models in Tortoise.apps.values():
+        for model in models.values():
+            model.register_listener(Signals.post_save, _invalidate_instance)
+            model.register_listener(Signals.post_delete, _invalidate_instance)
@@ -0,0 +1,431 @@
+import asyncio
+import logging
+import math
+import struct
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from typing import AsyncIterator, Awaitable, Callable, Iterable
+
+from litestar.stores.base import Store
+
+from oya.core.cache.memory import LRUMemoryStore, expiry
+from oya.core.cache.tags import get_cache_tags, register_tagged_store, start_tag_collection, tag_scope
+
+
+__all__ = ("TieredStore",)
+
+
+logger = logging.getLogger("oya.cache")
+
+DEFAULT_MEMORY_TTL = 5.0
+DEFAULT_LOCK_TIMEOUT = 10.0
+DEFAULT_TAG_TTL = 86400
+MAX_LOCAL_TAGS = 10000
+TAG_PREFIX = "oya-tag:"
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.5
+
+# fresh until, stale until, tag count: prefix of the values in the shared
+# tier, followed by the tags and their versions.
+_HEADER = struct.Struct("!ddH")
+_TAG = struct.Struct("!HQ")
+
+Tags = tuple[tuple[str, int], ...]
+
+# key -> value served by get() to the holder of a lease of the key.
+_leases: ContextVar[dict[str, bytes | None] | None] = ContextVar("oya_cache_leases", default=None)
+
+
+def _encode(value: bytes, fresh_until: float, stale_until: float, tags: Tags) -> bytes:
+    chunks = [_HEADER.pack(fresh_until, stale_until, len(tags))]
+    for tag, version in tags:
+        encoded = tag.encode("utf-8")
+        chunks.append(_TAG.pack(len(encoded), version))
+        chunks.append(encoded)
+    chunks.append(value)
+    return b"".join(chunks)
+
+
+def _decode(raw: bytes) -> tuple[bytes, float, float, Tags] | None:
+    try:
+        fresh_until, stale_until, count = _HEADER.unpack_from(raw)
+        offset = _HEADER.size
+        tags = []
+        for _ in range(count):
+            size, version = _TAG.unpack_from(raw, offset)
+            offset += _TAG.size
+            tags.append((raw[offset:offset + size].decode("utf-8"), version))
+            offset += size
+    except (struct.error, UnicodeDecodeError):
+        return None
+    return raw[offset:], fresh_until, stale_until, tuple(tags)
+
+
+class _Pending:
+    __slots__ = ("future", "deadline", "leased")
+
+    def __init__(self, future: asyncio.Future, deadline: float, leased: bool):
+        self.future = future
+        self.deadline = deadline
+        self.leased = leased
+
+
+class TieredStore(Store):
+    """
+    Cache store with an in-process LRU tier in front of a store shared by the
+    workers.
+
+    ``get()`` has no side effect. Within ``lease()`` (used by
+    ``get_or_set()`` and by the response cache), an expired or missing key
+    makes the caller responsible for recomputing it: until it ``set()`` the
+    key or leaves the lease, the other callers get the stale value, when
+    expired for less than ``stale_ttl`` seconds, or wait for the new one.
+    Shared stores with ``try_lock()`` and ``unlock()`` methods
+    (``SQLiteStore``) extend this to the other processes.
+
+    Entries are tagged with the tags collected while they were computed (see
+    ``oya.core.cache.tags``), an entry is dropped once the version of one
+    of its tags changed.
+
+    Args:
+        shared (Store | None): shared tier, None to only cache in memory.
+        max_bytes (int): size of the values kept in memory.
+        memory_ttl (float): seconds a value is served from memory before being
+            read again from the shared tier, bounds the staleness of the
+            workers after a deletion in another process.
+        stale_ttl (float): seconds an expired value is still served while it is
+            recomputed.
+        lock_timeout (float): seconds after which a recomputation is
+            considered abandoned.
+        coalesce (bool): disable for stores that are not caches (sessions),
+            ``lease()`` then never waits.
+        tag_ttl (int): seconds the version of a tag is kept in the shared
+            tier, older entries with this tag are then dropped.
+    """
+
+    def __init__(
+        self,
+        shared: Store | None = None,
+        max_bytes: int = 64 * 1024 * 1024,
+        memory_ttl: float = DEFAULT_MEMORY_TTL,
+        stale_ttl: float = 0,
+        lock_timeout: float = DEFAULT_LOCK_TIMEOUT,
+        coalesce: bool = True,
+        tag_ttl: int = DEFAULT_TAG_TTL,
+    ):
+        self.shared = shared
+        self.memory = LRUMemoryStore(max_bytes)
+        self.memory_ttl = memory_ttl
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        self.coalesce = coalesce
+        self.tag_ttl = tag_ttl
+        self.stats = {"hits": 0, "stale": 0, "misses": 0, "coalesced": 0}
+        self._pending: dict[str, _Pending] = {}
+        self._tasks: set[asyncio.Task] = set()
+        # tag -> (version, checked until)
+        self._versions: dict[str, tuple[int, float]] = {}
+        register_tagged_store(self)
+
+    def _remember(self, key: str, value: bytes, fresh_until: float, stale_until: float, tags: Tags):
+        expires_at = stale_until
+        if self.shared is not None and self.memory_ttl:
+            expires_at = min(stale_until, time.time() + self.memory_ttl)
+        self.memory.put(key, value, expires_at, (fresh_until, stale_until, tags))
+
+    async def _tag_version(self, tag: str) -> int:
+        now = time.time()
+        local = self._versions.get(tag)
+        if local is not None and now < local[1]:
+            return local[0]
+
+        raw = await self.shared.get(TAG_PREFIX + tag) if self.shared is not None else None
+        if raw is not None:
+            version = int(raw)
+        else:
+            version = await self._bump(tag)
+        self._remember_version(tag, version, now)
+        return version
+
+    def _remember_version(self, tag: str, version: int, now: float):
+        if len(self._versions) >= MAX_LOCAL_TAGS:
+            self._versions.clear()
+        checked_until = now + self.memory_ttl if self.shared is not None else math.inf
+        self._versions[tag] = (version, checked_until)
+
+    async def _bump(self, tag: str) -> int:
+        # versions are not incremented, a new one only has to differ.
+        version = time.time_ns()
+        if self.shared is not None:
+            await self.shared.set(TAG_PREFIX + tag, str(version), expires_in=self.tag_ttl)
+        return version
+
+    async def _valid(self, tags: Tags) -> bool:
+        for tag, version in tags:
+            if await self._tag_version(tag) != version:
+                return False
+        return True
+
+    async def _lookup(self, key: str) -> tuple[bytes, float, float, Tags] | None:
+        entry = self.memory.get_entry(key)
+        if entry is not None:
+            fresh_until, stale_until, tags = entry.meta
+            if tags and not await self._valid(tags):
+                self.memory.pop(key)
+                return None
+            return entry.value, fresh_until, stale_until, tags
+        if self.shared is None:
+            return None
+
+        raw = await self.shared.get(key)
+        decoded = _decode(raw) if raw is not None else None
+        if decoded is None:
+            return None
+        value, fresh_until, stale_until, tags = decoded
+        if tags and not await self._valid(tags):
+            return None
+        self._remember(key, value, fresh_until, stale_until, tags)
+        return value, fresh_until, stale_until, tags
+
+    async def _write(
+        self, key: str, value: bytes, expires_in: int | float | timedelta | None, tags: Iterable[str] | None = None
+    ):
+        now = time.time()
+        fresh_until = expiry(expires_in, now)
+        stale_until = fresh_until + self.stale_ttl
+        versions = tuple([(tag, await self._tag_version(tag)) for tag in sorted(tags)] if tags else ())
+        self._remember(key, value, fresh_until, stale_until, versions)
+        if self.shared is not None:
+            await self.shared.set(
+                key,
+                _encode(value, fresh_until, stale_until, versions),
+                expires_in=None if stale_until == math.inf else math.ceil(stale_until - now),
+            )
+
+    async def invalidate_tags(self, tags: Iterable[str]):
+        """
+        Drop the entries tagged with any of ``tags``, in this process at once
+        and within ``memory_ttl`` seconds in the other ones.
+        """
+        now = time.time()
+        for tag in tags:
+            # a tag no entry was stored with has no version to change.
+            if tag not in self._versions and (self.shared is None or await self.shared.get(TAG_PREFIX + tag) is None):
+                continue
+            self._remember_version(tag, await self._bump(tag), now)
+
+    async def _claim(self, key: str) -> bool:
+        """
+        Make the current caller recompute ``key``, False when another
+        process already does.
+        """
+        try_lock = getattr(self.shared, "try_lock", None)
+        if try_lock is not None and not await try_lock(key, self.lock_timeout):
+            return False
+        self._pending[key] = _Pending(
+            asyncio.get_running_loop().create_future(),
+            time.monotonic() + self.lock_timeout,
+            try_lock is not None,
+        )
+        return True
+
+    def _active(self, key: str) -> _Pending | None:
+        pending = self._pending.get(key)
+        if pending is not None and pending.deadline <= time.monotonic():
+            # the request recomputing the key failed without releasing it.
+            self.release(key)
+            return None
+        return pending
+
+    async def _wait(self, pending: _Pending) -> bytes | None:
+        self.stats["coalesced"] += 1
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(pending.future), max(pending.deadline - time.monotonic(), 0)
+            )
+        except asyncio.TimeoutError:
+            return None
+
+    async def _poll(self, key: str) -> bytes | None:
+        # another process recomputes the key, wait for its value.
+        self.stats["coalesced"] += 1
+        deadline = time.monotonic() + self.lock_timeout
+        interval = POLL_INTERVAL
+        while time.monotonic() < deadline:
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+            self.memory.pop(key)
+            entry = await self._lookup(key)
+            if entry is not None and time.time() < entry[1]:
+                return entry[0]
+        return None
+
+    async def _fetch(self, key: str, renew_for: int | timedelta | None = None) -> tuple[bytes | None, bool]:
+        # the value and whether the caller has to recompute it.
+        entry = await self._lookup(key)
+        now = time.time()
+        if entry is not None and now < entry[1]:
+            self.stats["hits"] += 1
+            if renew_for and entry[1] != math.inf:
+                await self._write(key, entry[0], renew_for, {tag for tag, _ in entry[3]})
+            return entry[0], False
+
+        if not self.coalesce:
+            self.stats["misses"] += 1
+            return None, False
+
+        stale = entry[0] if entry is not None and now < entry[2] else None
+        pending = self._active(key)
+        if pending is None:
+            if await self._claim(key):
+                self.stats["misses"] += 1
+                return None, True
+            # claimed meanwhile by this process or by another one.
+            pending = self._active(key)
+            if pending is None and stale is None:
+                return await self._poll(key), False
+
+        if stale is not None:
+            self.stats["stale"] += 1
+            return stale, False
+        return await self._wait(pending), False
+
+    async def get(self, key: str, renew_for: int | timedelta | None = None) -> bytes | None:
+        leases = _leases.get()
+        if leases is not None and key in leases:
+            # decided by lease(): the stale value, the one computed by another
+            # caller, or None for the caller recomputing it.
+            entry = await self._lookup(key)
+            if entry is not None and time.time() < entry[1]:
+                return entry[0]
+            return leases[key]
+
+        entry = await self._lookup(key)
+        if entry is None or time.time() >= entry[1]:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        if renew_for and entry[1] != math.inf:
+            await self._write(key, entry[0], renew_for, {tag for tag, _ in entry[3]})
+        return entry[0]
+
+    @asynccontextmanager
+    async def lease(self, key: str) -> AsyncIterator[bytes | None]:
+        """
+        Coalesce the recomputations of ``key``: yield its value, the stale
+        one while another caller recomputes it, or None when the current
+        caller has to recompute it. The key is released on exit, cancellation
+        included, when it was not ``set()`` meanwhile.
+        """
+        value, claimed = await self._fetch(key)
+        leases = dict(_leases.get() or {})
+        leases[key] = value
+        token = _leases.set(leases)
+        if claimed:
+            # the value computed by this caller is tagged on set().
+            start_tag_collection()
+        try:
+            yield value
+        finally:
+            _leases.reset(token)
+            if claimed:
+                self.release(key)
+
+    async def set(self, key: str, value: str | bytes, expires_in: int | timedelta | None = None) -> None:
+        """
+        Set the value of ``key``, tagged with the tags of the current context.
+        """
+        await self._set(key, value, expires_in, get_cache_tags())
+
+    async def _set(self, key: str, value: str | bytes, expires_in: int | timedelta | None, tags: Iterable[str]):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        await self._write(key, value, expires_in, tags)
+        self.release(key, value)
+
+    def release(self, key: str, value: bytes | None = None):
+        """
+        End the recomputation of ``key``, the waiting callers get ``value``
+        or recompute it themselves when None.
+        """
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        if not pending.future.done():
+            pending.future.set_result(value)
+        if pending.leased:
+            self._spawn(self.shared.unlock(key))
+
+    def _spawn(self, coroutine: Awaitable):
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def get_or_set(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[str | bytes]],
+        expires_in: int | timedelta | None = None,
+    ) -> bytes:
+        """
+        Return the value of ``key``, computed with ``compute()`` when missing.
+        Stale values are returned at once and refreshed in the background.
+        """
+        entry = await self._lookup(key)
+        now = time.time()
+        if entry is not None and now < entry[1]:
+            self.stats["hits"] += 1
+            return entry[0]
+
+        if entry is not None and now < entry[2]:
+            self.stats["stale"] += 1
+            if self._active(key) is None and await self._claim(key):
+                self._spawn(self._refresh(key, compute, expires_in))
+            return entry[0]
+
+        value, claimed = await self._fetch(key)
+        if value is not None:
+            return value
+        try:
+            with tag_scope() as tags:
+                value = await compute()
+        except BaseException:
+            if claimed:
+                self.release(key)
+            raise
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        await self._set(key, value, expires_in, tags)
+        return value
+
+    async def _refresh(self, key: str, compute: Callable[[], Awaitable[str | bytes]], expires_in):
+        try:
+            with tag_scope() as tags:
+                value = await compute()
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Unable to refresh the cache key %s", key)
+            self.release(key)
+            return
+        await self._set(key, value, expires_in, tags)
+
+    async def delete(self, key: str) -> None:
+        self.memory.pop(key)
+        if self.shared is not None:
+            await self.shared.delete(key)
+
+    async def delete_all(self) -> None:
+        self.memory.clear()
+        if self.shared is not None:
+            await self.shared.delete_all()
+
+    async def exists(self, key: str) -> bool:
+        entry = await self._lookup(key)
+        return entry is not None and time.time() < entry[1]
+
+    async def expires_in(self, key: str) -> int | None:
+        entry = await self._lookup(key)
+        if entry is None or entry[1] == math.inf or time.time() >= entry[1]:
+            return None
+        return int(entry[1] - time.time())
@@ -7,6 +7,7 @@ from msgspec import Meta
 from typing_extensions import Annotated
 
 from litestar.dto import AbstractDTO, DTOField, Mark
+from litestar.dto._backend import DTOBackend
 from litestar.dto.data_structures import DTOFieldDefinition
 from litestar.exceptions import MissingDependencyException
 from litestar.types import Empty
@@ -21,9 +22,12 @@ except ImportError as e:
 from tortoise.fields import Field
 from tortoise import fields
 from tortoise.models import Model
+from tortoise.queryset import QuerySet
 
 
 from oya.apps import apps
+from oya.core.dto.codec import CompiledDTOBackend
+from oya.core.dto.related import RelatedPlan, get_related_plan
 
 
 T = TypeVar("T", bound=Model)
@@ -78,24 +82,82 @@ def _create_field_extra(field: Field) -> dict[str, Any]:
     return extra
 
 
+# parsed fields of the models: (name, field definition, pk, required)
+_model_fields: dict[type[Model], tuple[tuple[str, FieldDefinition, bool, bool], ...]] = {}
+
+
+def _is_generated_relation(field: Field) -> bool:
+    # reverse sides added by Tortoise.init(): left out so the codecs built
+    # after it match the DTOs built with the app, before it.
+    return isinstance(field, fields.relational.BackwardFKRelation) or getattr(field, "_generated", False)
+
+
+def _get_model_fields(model_type: type[Model]) -> tuple[tuple[str, FieldDefinition, bool, bool], ...]:
+    model_fields = _model_fields.get(model_type)
+    if model_fields is None:
+        model_fields = _model_fields[model_type] = tuple(
+            (
+                field.model_field_name,
+                _parse_toirtoise_type(field, _create_field_extra(field)),
+                field.pk,
+                field.required,
+            )
+            for field in model_type._meta.fields_map.values()
+            if not _is_generated_relation(field)
+        )
+    return model_fields
+
+
 class TortoiseDTO(AbstractDTO[T], Generic[T]):
     
     @classmethod
     def generate_field_definitions(cls, model_type: type[Model]) -> Generator[FieldDefinition, None, None]:
         
-        for field in model_type._meta.fields_map.values():
-            
+        for name, field_definition, pk, required in _get_model_fields(model_type):
+            # a new DTOField each time, litestar may update its mark.
             yield replace(
                 DTOFieldDefinition.from_field_definition(
-                    field_definition=_parse_toirtoise_type(field, _create_field_extra(field)),
-                    dto_field=DTOField(mark=Mark.READ_ONLY if field.pk else None),
+                    field_definition=field_definition,
+                    dto_field=DTOField(mark=Mark.READ_ONLY if pk else None),
                     model_name=model_type.__name__,
                     default_factory=lambda x: x,  # i don't know why Empty  doesn't work, but it works for PiccoloDTO
                 ),
-                default=Empty if field.required else None,
-                name=field.model_field_name,
+                default=Empty if required else None,
+                name=name,
             )
 
+    @classmethod
+    def create_for_field_definition(
+        cls, field_definition: FieldDefinition, handler_id: str, backend_cls: type[DTOBackend] | None = None
+    ) -> None:
+        # encoded by the codecs of oya.core.dto.codec, unless the codegen backend is asked for.
+        if backend_cls is None and not cls.config.experimental_codegen_backend:
+            backend_cls = CompiledDTOBackend
+        super().create_for_field_definition(field_definition, handler_id, backend_cls)
+
     @classmethod
     def detect_nested_field(cls, field_definition: FieldDefinition) -> bool:
         return field_definition.is_subclass_of(Model)
+
+    def data_to_encodable_type(self, data: Any) -> Any:
+        backend = self._dto_backends[self.asgi_connection.route_handler.handler_id]["return_backend"]
+        # a queryset returned for a list is streamed, see oya.core.serialization.streaming
+        if isinstance(data, QuerySet):
+            if backend.wrapper_attribute_name is None and backend.field_definition.is_non_string_collection:
+                from oya.core.serialization.streaming import QuerySetStream
+
+                return QuerySetStream(data, codec=backend)
+
+        elif backend.wrapper_attribute_name is None:
+            instances = data if isinstance(data, list) else [data]
+            plan = get_related_plan(backend)
+            if plan and instances and isinstance(instances[0], Model) and plan.missing(instances[0]):
+                # awaited by the response handler of litestar.
+                return self._fetch_related(data, instances, backend, plan)
+
+        return super().data_to_encodable_type(data)
+
+    @staticmethod
+    async def _fetch_related(data: Any, instances: list[Model], backend: DTOBackend, plan: RelatedPlan) -> Any:
+        await plan.fetch(instances)
+        return backend.encode_data(data)
@@ -0,0 +1,298 @@
+"""
+Compiled codecs of ``TortoiseDTO``.
+
+litestar's ``DTOBackend`` transfers every instance field by field, checking
+each field definition and transfer type again for every row. The
+``CompiledDTOBackend`` of ``TortoiseDTO`` resolves that once per model and
+field set into a ``ModelCodec``: a positional msgspec ``Struct`` filled from
+an ``attrgetter`` of the included fields, with converters only for the
+nested and collection fields. The codecs are shared by the handlers with the
+same model and field set, and built before the pre-fork server forks.
+
+When the included fields are columns of the model, or foreign keys to such
+fields, a ``RowCodec`` encodes the rows of ``QuerySet.values()`` of these
+columns into the same structs: the excluded columns (the large text and JSON
+ones for instance) are not fetched, and no instance is built.
+"""
+
+from functools import partial
+from operator import attrgetter, itemgetter
+from typing import Any, Callable, Collection
+
+from litestar.dto._backend import DTOBackend, _transfer_type_data
+from litestar.dto._types import CollectionType, SimpleType, TransferDTOFieldDefinition, TransferType, UnionType
+from litestar.types import Empty
+from msgspec import UNSET, defstruct
+
+from oya.core.dto.related import RelatedPlan, _nested_type, plan_related
+
+
+__all__ = (
+    "CompiledDTOBackend",
+    "ModelCodec",
+    "RowCodec",
+    "get_model_codec",
+    "get_row_codec",
+)
+
+
+_codecs: dict[Any, "ModelCodec"] = {}
+_row_codecs: dict[Any, "RowCodec | None"] = {}
+_NOT_COMPILED: Any = object()
+
+
+def _codec_key(field_definitions: tuple[TransferDTOFieldDefinition, ...]) -> tuple:
+    key = []
+    for field_definition in field_definitions:
+        if field_definition.is_excluded:
+            continue
+        transfer_type = field_definition.transfer_type
+        nested = None
+        if isinstance(transfer_type, SimpleType) and transfer_type.nested_field_info:
+            nested = _codec_key(transfer_type.nested_field_info.field_definitions)
+        elif transfer_type.has_nested:
+            # transferred by litestar, see _get_converter().
+            nested = id(transfer_type)
+        key.append((field_definition.name, field_definition.serialization_name, nested))
+    return tuple(key)
+
+
+def _get_getter(names: list[str], getter_type: Callable[..., Callable] = attrgetter) -> Callable[[Any], tuple]:
+    if len(names) > 1:
+        return getter_type(*names)
+    if names:
+        getter = getter_type(names[0])
+        return lambda instance: (getter(instance),)
+    return lambda instance: ()
+
+
+def _get_converter(transfer_type: TransferType) -> Callable[[Any], Any] | None:
+    if isinstance(transfer_type, SimpleType):
+        if transfer_type.nested_field_info is None:
+            return None
+        nested = get_model_codec(
+            transfer_type.field_definition.annotation, transfer_type.nested_field_info.field_definitions
+        )
+        return lambda value: None if value is None else nested.encode(value)
+
+    if isinstance(transfer_type, CollectionType) and not transfer_type.has_nested:
+        return transfer_type.field_definition.instantiable_origin
+
+    if isinstance(transfer_type, UnionType) and len(transfer_type.inner_types) == 2:
+        # Optional[Model], the nullable foreign keys.
+        inner_types = [
+            inner_type for inner_type in transfer_type.inner_types if not inner_type.field_definition.is_none_type
+        ]
+        if len(inner_types) == 1 and isinstance(inner_types[0], SimpleType):
+            return _get_converter(inner_types[0])
+
+    if isinstance(transfer_type, (CollectionType, UnionType)) or transfer_type.has_nested:
+        return partial(
+            _transfer_type_data,
+            transfer_type=transfer_type,
+            nested_as_dict=False,
+            is_data_field=False,
+            override_serialization_name=False,
+        )
+    return None
+
+
+class ModelCodec:
+    """
+    Encoder of the instances of a model into a ``Struct`` of the included
+    fields.
+    """
+
+    __slots__ = ("struct", "getter", "converters")
+
+    def __init__(self, name: str, field_definitions: tuple[TransferDTOFieldDefinition, ...]):
+        included = [field_definition for field_definition in field_definitions if not field_definition.is_excluded]
+        self.struct = defstruct(
+            f"{name}Codec",
+            [(field_definition.serialization_name or field_definition.name, Any) for field_definition in included],
+            gc=False,
+        )
+        self.getter = _get_getter([field_definition.name for field_definition in included])
+        self.converters = tuple(
+            (index, converter)
+            for index, field_definition in enumerate(included)
+            if (converter := _get_converter(field_definition.transfer_type)) is not None
+        )
+
+    def encode(self, instance: Any) -> Any:
+        values = self.getter(instance)
+        if self.converters:
+            values = list(values)
+            for index, converter in self.converters:
+                values[index] = converter(values[index])
+        return self.struct(*values)
+
+    def encode_many(self, instances: Collection[Any]) -> list[Any]:
+        if self.converters:
+            return [self.encode(instance) for instance in instances]
+        struct, getter = self.struct, self.getter
+        return [struct(*getter(instance)) for instance in instances]
+
+
+def get_model_codec(model: Any, field_definitions: tuple[TransferDTOFieldDefinition, ...]) -> ModelCodec:
+    """
+    Return the codec of ``model`` restricted to the included
+    ``field_definitions``, compiled once.
+    """
+    key = (model, _codec_key(field_definitions))
+    codec = _codecs.get(key)
+    if codec is None:
+        codec = _codecs[key] = ModelCodec(getattr(model, "__name__", "Model"), field_definitions)
+    return codec
+
+
+def _compile_row_encoder(
+    model: Any, field_definitions: tuple[TransferDTOFieldDefinition, ...], prefix: str
+) -> tuple[list[str], Callable[[dict], Any]] | None:
+    meta = model._meta
+    # the primary key first: the keyset of the pages, and the null relations.
+    columns = [f"{prefix}{meta.pk_attr}"]
+    getters: list[Callable[[dict], Any]] = []
+    # the columns of the fields, while they are all columns.
+    keys: list[str] | None = []
+    for field_definition in field_definitions:
+        if field_definition.is_excluded:
+            continue
+        name = field_definition.name
+        nested, many = _nested_type(field_definition.transfer_type)
+        if nested is not None:
+            if many or (name not in meta.fk_fields and name not in meta.o2o_fields):
+                return None
+            compiled = _compile_row_encoder(
+                nested.field_definition.annotation, nested.nested_field_info.field_definitions, f"{prefix}{name}__"
+            )
+            if compiled is None:
+                return None
+            nested_columns, nested_encode = compiled
+            columns.extend(nested_columns)
+            getters.append(partial(_encode_related, nested_columns[0], nested_encode))
+            keys = None
+        elif name in meta.fields_db_projection:
+            if f"{prefix}{name}" not in columns:
+                columns.append(f"{prefix}{name}")
+            getters.append(itemgetter(f"{prefix}{name}"))
+            if keys is not None:
+                keys.append(f"{prefix}{name}")
+        else:
+            return None
+
+    struct = get_model_codec(model, field_definitions).struct
+    if keys is None:
+        return columns, lambda row: struct(*[getter(row) for getter in getters])
+    getter = _get_getter(keys, itemgetter)
+    return columns, lambda row: struct(*getter(row))
+
+
+def _encode_related(pk_column: str, encode: Callable[[dict], Any], row: dict) -> Any:
+    # LEFT JOIN of a null foreign key: the columns of the relation are null.
+    return None if row[pk_column] is None else encode(row)
+
+
+class RowCodec:
+    """
+    Encoder of the rows of ``QuerySet.values(*columns)`` into the structs of
+    the ``ModelCodec`` of the model.
+    """
+
+    __slots__ = ("columns", "encode")
+
+    def __init__(self, columns: list[str], encode: Callable[[dict], Any]):
+        self.columns = tuple(columns)
+        self.encode = encode
+
+    def encode_many(self, rows: Collection[dict]) -> list[Any]:
+        return list(map(self.encode, rows))
+
+
+def get_row_codec(model: Any, field_definitions: tuple[TransferDTOFieldDefinition, ...]) -> RowCodec | None:
+    """
+    Return the codec of the value rows of ``model`` restricted to the
+    included ``field_definitions``, None when they are not all columns.
+    """
+    key = (model, _codec_key(field_definitions))
+    codec = _row_codecs.get(key, _NOT_COMPILED)
+    if codec is _NOT_COMPILED:
+        compiled = _compile_row_encoder(model, field_definitions, "")
+        codec = _row_codecs[key] = None if compiled is None else RowCodec(*compiled)
+    return codec
+
+
+class CompiledDTOBackend(DTOBackend):
+    """
+    ``DTOBackend`` encoding the instances (and decoding the flat request
+    bodies) with compiled codecs, litestar's transfer otherwise.
+    """
+
+    __slots__ = ("codec", "decoder", "_related_plan", "_row_codec")
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.codec = None if self.is_data_field else get_model_codec(self.model_type, self.parsed_field_definitions)
+        self.decoder = self._compile_decoder() if self.is_data_field and self.dto_data_type is None else None
+        self._related_plan: RelatedPlan | None = None
+        self._row_codec: RowCodec | None = _NOT_COMPILED
+
+    @property
+    def related_plan(self) -> RelatedPlan:
+        """
+        Related models of the nested fields, see ``oya.core.dto.related``.
+        """
+        # planned on first use, the reverse relations are set by Tortoise.init().
+        if self._related_plan is None:
+            self._related_plan = plan_related(self.model_type, self.parsed_field_definitions)
+        return self._related_plan
+
+    @property
+    def row_codec(self) -> RowCodec | None:
+        """
+        Codec of the value rows of the included columns, None when some
+        included fields are not columns.
+        """
+        if self._row_codec is _NOT_COMPILED:
+            self._row_codec = None if self.is_data_field else get_row_codec(self.model_type, self.parsed_field_definitions)
+        return self._row_codec
+
+    def _compile_decoder(self) -> Callable[[Any], Any] | None:
+        fields = []
+        for field_definition in self.parsed_field_definitions:
+            if field_definition.is_excluded:
+                continue
+            if field_definition.transfer_type.has_nested or isinstance(field_definition.transfer_type, CollectionType):
+                return None
+            fields.append((field_definition.name, field_definition.serialization_name or field_definition.name))
+        model_type = self.model_type
+
+        def decode(struct: Any) -> Any:
+            values = {}
+            for name, serialization_name in fields:
+                value = getattr(struct, serialization_name, Empty)
+                if value is not UNSET and value is not Empty:
+                    values[name] = value
+            return model_type(**values)
+
+        return decode
+
+    def _is_many(self) -> bool:
+        return self.field_definition.is_non_string_collection and not self.field_definition.is_mapping
+
+    def encode_data(self, data: Any) -> Any:
+        if self.codec is None or self.wrapper_attribute_name:
+            return super().encode_data(data)
+        if self._is_many():
+            encoded = self.codec.encode_many(data)
+            origin = self.field_definition.instantiable_origin
+            return encoded if origin is list else origin(encoded)
+        return self.codec.encode(data)
+
+    def populate_data_from_raw(self, raw: bytes, asgi_connection: Any) -> Any:
+        if self.decoder is None or self.override_serialization_name:
+            return super().populate_data_from_raw(raw, asgi_connection)
+        data = self.parse_raw(raw, asgi_connection)
+        if self._is_many():
+            return self.field_definition.instantiable_origin(self.decoder(item) for item in data)
+        return self.decoder(data)
@@ -0,0 +1,133 @@
+"""
+Related models of the nested fields of a ``TortoiseDTO``.
+
+A queryset returned by a handler is encoded with the related models its DTO
+includes already fetched: the foreign keys and one to one relations, and the
+ones below them, are joined with ``select_related()``, the others (reverse
+and many to many relations) are fetched with ``prefetch_related()``, one
+query per relation. A list of rows with two nested relations costs a single
+query instead of 2N+1. The instances returned by a handler without their
+related models get them with ``fetch_for_list()``, one query per relation.
+"""
+
+from typing import Any, Iterator, NamedTuple, Sequence
+
+from litestar.dto._types import CollectionType, SimpleType, TransferDTOFieldDefinition, TransferType, UnionType
+from tortoise.models import Model
+from tortoise.queryset import QuerySet
+
+
+__all__ = (
+    "RelatedPlan",
+    "get_related_plan",
+    "plan_related",
+)
+
+
+class RelatedPlan(NamedTuple):
+    select_related: tuple[str, ...] = ()
+    prefetch_related: tuple[str, ...] = ()
+
+    def __bool__(self) -> bool:
+        return bool(self.select_related or self.prefetch_related)
+
+    def apply(self, queryset: QuerySet) -> QuerySet:
+        """
+        Return ``queryset`` fetching the related models of the plan it does
+        not fetch yet.
+        """
+        selected = queryset._select_related
+        select = [path for path in self.select_related if path not in selected]
+        if select:
+            queryset = queryset.select_related(*select)
+        if self.prefetch_related:
+            # merged with the prefetches of the queryset by tortoise.
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+    def missing(self, instance: Model) -> bool:
+        """
+        Return True when the related models of the plan are not fetched on
+        ``instance``.
+        """
+        for path in self.select_related + self.prefetch_related:
+            # fetched relations are cached by tortoise as "_<name>".
+            related = instance.__dict__.get(f"_{path.split('__', 1)[0]}", _MISSING)
+            if related is _MISSING or getattr(related, "_fetched", True) is False:
+                return True
+        return False
+
+    async def fetch(self, instances: Sequence[Model]) -> None:
+        """
+        Fetch the related models of the plan on ``instances``.
+        """
+        if instances:
+            await type(instances[0]).fetch_for_list(instances, *self.select_related, *self.prefetch_related)
+
+
+_MISSING = object()
+
+
+def _nested_type(transfer_type: TransferType) -> tuple[SimpleType | None, bool]:
+    """
+    Return the nested model type of ``transfer_type``, and if it is a
+    collection.
+    """
+    if isinstance(transfer_type, SimpleType):
+        return (transfer_type if transfer_type.nested_field_info else None), False
+    if isinstance(transfer_type, CollectionType):
+        return _nested_type(transfer_type.inner_type)[0], True
+    if isinstance(transfer_type, UnionType):
+        for inner_type in transfer_type.inner_types:
+            nested, many = _nested_type(inner_type)
+            if nested is not None:
+                return nested, many
+    return None, False
+
+
+def _iter_paths(
+    model: Any, field_definitions: tuple[TransferDTOFieldDefinition, ...], prefix: str, joined: bool
+) -> Iterator[tuple[str, bool]]:
+    meta = model._meta
+    for field_definition in field_definitions:
+        if field_definition.is_excluded:
+            continue
+        nested, many = _nested_type(field_definition.transfer_type)
+        if nested is None:
+            continue
+        name = field_definition.name
+        path = f"{prefix}{name}"
+        # joins only along foreign keys, from the model of the queryset.
+        join = joined and not many and (name in meta.fk_fields or name in meta.o2o_fields)
+        yield path, join
+        yield from _iter_paths(
+            nested.field_definition.annotation, nested.nested_field_info.field_definitions, f"{path}__", join
+        )
+
+
+def plan_related(model: Any, field_definitions: tuple[TransferDTOFieldDefinition, ...]) -> RelatedPlan:
+    """
+    Return the related models to fetch with the instances of ``model`` for
+    the nested ``field_definitions``.
+    """
+    select_related, prefetch_related = [], []
+    for path, join in _iter_paths(model, field_definitions, "", True):
+        if join:
+            select_related.append(path)
+        else:
+            prefetch_related.append(path)
+    # "a__b" prefetches "a" as well.
+    prefetch_related = [
+        path for path in prefetch_related if not any(other.startswith(f"{path}__") for other in prefetch_related)
+    ]
+    return RelatedPlan(tuple(select_related), tuple(prefetch_related))
+
+
+def get_related_plan(backend: Any) -> RelatedPlan:
+    """
+    Return the related models to fetch for the DTO backend ``backend``.
+    """
+    plan = getattr(backend, "related_plan", None)
+    if plan is None:
+        plan = plan_related(backend.model_type, backend.parsed_field_definitions)
+    return plan
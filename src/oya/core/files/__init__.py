@@ -0,0 +1,62 @@
+"""
+Uploaded files and their storage.
+
+With ``settings.UPLOAD_SPOOLED``, ``Application`` installs
+``oya.middleware.builtins.uploads.SpooledUploadMiddleware``: the multipart
+bodies are parsed as they arrive, the files written to temporary files above
+``UPLOAD_SPOOL_SIZE`` and hashed on the way. Handlers receive
+``SpooledUploadFile`` (an ``UploadFile``) and hand it to a storage, moved
+rather than copied::
+
+    @post("/files")
+    async def upload(data: UploadFile = Body(media_type=RequestEncodingType.MULTI_PART)) -> dict:
+        name = await get_storage().save(data.filename, data)
+        return {"name": name, "sha256": data.hashes["sha256"]}
+
+``settings.STORAGES`` declares the storages by alias, ``default`` being the
+one of ``get_storage()``::
+
+    STORAGES = {
+        "default": {
+            "BACKEND": "oya.core.files.FileSystemStorage",
+            "OPTIONS": {"location": BASE_DIR / "media", "base_url": "/media/"},
+        },
+    }
+"""
+
+from functools import cache
+
+from oya.conf import DEFAULT_STORAGE_ALIAS, settings
+from oya.core.exceptions import ImproperlyConfigured
+from oya.core.files.storage import FileSystemStorage, Storage
+from oya.core.files.uploads import MultipartParser, SpooledUploadFile
+from oya.utils.module_loading import import_string
+
+
+__all__ = (
+    "FileSystemStorage",
+    "MultipartParser",
+    "SpooledUploadFile",
+    "Storage",
+    "get_storage",
+)
+
+
+@cache
+def get_storage(alias: str = DEFAULT_STORAGE_ALIAS) -> Storage:
+    """
+    Return the storage ``alias`` of ``settings.STORAGES``, a
+    ``FileSystemStorage`` of ``./media`` when the default one is not set.
+    """
+    storages = getattr(settings, "STORAGES", None) or {}
+    if alias not in storages:
+        if alias == DEFAULT_STORAGE_ALIAS:
+            return FileSystemStorage()
+        raise ImproperlyConfigured(f"'{alias}' is not defined in STORAGES.")
+
+    conf = storages[alias]
+    try:
+        backend = import_string(conf.get("BACKEND", "oya.core.files.FileSystemStorage"))
+    except ImportError as e:
+        raise ImproperlyConfigured(f"STORAGES['{alias}']['BACKEND']: {e}") from e
+    return backend(**conf.get("OPTIONS", {}))
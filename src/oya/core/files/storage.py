@@ -0,0 +1,110 @@
+import asyncio
+import os
+from pathlib import Path
+from typing import Any
+
+from oya.core.files.uploads import SpooledUploadFile
+
+
+__all__ = (
+    "FileSystemStorage",
+    "Storage",
+)
+
+
+class Storage:
+    """
+    Where the uploaded files are kept.
+    """
+
+    async def save(self, name: str, upload: Any) -> str:
+        """
+        Store ``upload`` under ``name`` and return the name it was stored as.
+        """
+        raise NotImplementedError("subclasses of Storage must provide a save() method")
+
+    async def delete(self, name: str) -> None:
+        raise NotImplementedError("subclasses of Storage must provide a delete() method")
+
+    def url(self, name: str) -> str:
+        raise NotImplementedError("subclasses of Storage must provide an url() method")
+
+
+class FileSystemStorage(Storage):
+    """
+    Files of a local directory. A ``SpooledUploadFile`` written to disk is
+    renamed into the directory, without copying it when ``UPLOAD_TEMP_DIR``
+    is on the same file system.
+
+    Args:
+        location (str | Path): root directory.
+        base_url (str): URL of the root directory.
+    """
+
+    def __init__(self, location: str | Path = "media", base_url: str = "/media/"):
+        self.location = Path(location)
+        self.base_url = base_url if base_url.endswith("/") else f"{base_url}/"
+
+    def path(self, name: str) -> Path:
+        path = (self.location / name).resolve()
+        if not path.is_relative_to(self.location.resolve()):
+            raise ValueError(f"'{name}' is outside of the storage location.")
+        return path
+
+    def get_available_name(self, name: str) -> str:
+        """
+        Return ``name``, suffixed with a counter when it is taken.
+        """
+        path = self.path(name)
+        stem, suffix, counter = path.stem, path.suffix, 1
+        while path.exists():
+            path = path.with_name(f"{stem}_{counter}{suffix}")
+            counter += 1
+        return path.relative_to(self.location.resolve()).as_posix()
+
+    def reserve_name(self, name: str) -> str:
+        """
+        Create an empty file at ``name``, suffixed with a counter when it is
+        taken, and return its name. The creation is exclusive, concurrent
+        saves of the same name get distinct names.
+        """
+        path = self.path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        stem, suffix, counter = path.stem, path.suffix, 1
+        while True:
+            try:
+                os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+            except FileExistsError:
+                path = path.with_name(f"{stem}_{counter}{suffix}")
+                counter += 1
+                continue
+            return path.relative_to(self.location.resolve()).as_posix()
+
+    def _write(self, path: Path, upload: Any):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as fd:
+            upload.file.seek(0)
+            while chunk := upload.file.read(1024 * 1024):
+                fd.write(chunk)
+
+    async def save(self, name: str, upload: Any) -> str:
+        # the reserved file is replaced by the upload.
+        name = await asyncio.to_thread(self.reserve_name, name)
+        try:
+            if isinstance(upload, SpooledUploadFile):
+                await upload.move_to(self.path(name))
+            else:
+                await asyncio.to_thread(self._write, self.path(name), upload)
+        except BaseException:
+            await self.delete(name)
+            raise
+        return name
+
+    async def delete(self, name: str) -> None:
+        try:
+            await asyncio.to_thread(os.unlink, self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def url(self, name: str) -> str:
+        return f"{self.base_url}{name}"
@@ -0,0 +1,332 @@
+import asyncio
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+from email.utils import decode_rfc2231
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterable
+from urllib.parse import unquote
+
+from litestar._multipart import parse_content_header
+from litestar.datastructures import UploadFile
+from litestar.exceptions import ClientException, ValidationException
+
+
+__all__ = (
+    "MultipartParser",
+    "SpooledUploadFile",
+)
+
+
+DEFAULT_SPOOL_SIZE = 1024 * 1024
+DEFAULT_MAX_FIELD_SIZE = 1024 * 1024
+# disk writes are batched and run in a thread.
+WRITE_BUFFER_SIZE = 1024 * 1024
+MAX_HEADERS_SIZE = 16 * 1024
+
+
+def _too_large(what: str, limit: int) -> ClientException:
+    return ClientException(status_code=413, detail=f"{what} exceeds the limit of {limit} bytes")
+
+
+class SpooledUploadFile(UploadFile):
+    """
+    ``UploadFile`` kept in memory up to ``spool_size`` bytes, then written to
+    a named temporary file in ``temp_dir``, so ``move_to()`` can rename it
+    into its destination instead of copying it. The ``hashes`` of the
+    content are computed while it is written.
+    """
+
+    __slots__ = ("size", "path", "spool_size", "temp_dir", "_hashers", "_pending", "_moved")
+
+    def __init__(
+        self,
+        content_type: str,
+        filename: str,
+        headers: dict[str, str] | None = None,
+        spool_size: int = DEFAULT_SPOOL_SIZE,
+        hashes: Iterable[str] = (),
+        temp_dir: str | None = None,
+    ):
+        # not UploadFile.__init__(), which opens a SpooledTemporaryFile.
+        self.filename = filename
+        self.content_type = content_type
+        self.headers = headers or {}
+        self.file: Any = io.BytesIO()
+        self.size = 0
+        self.path: str | None = None
+        self.spool_size = spool_size
+        self.temp_dir = temp_dir
+        self._hashers = {name: hashlib.new(name) for name in hashes}
+        self._pending = bytearray()
+        self._moved = False
+
+    @property
+    def rolled_to_disk(self) -> bool:
+        return self.path is not None
+
+    @property
+    def hashes(self) -> dict[str, str]:
+        return {name: hasher.hexdigest() for name, hasher in self._hashers.items()}
+
+    def _write_pending(self, data: bytes):
+        for hasher in self._hashers.values():
+            hasher.update(data)
+        self.file.write(data)
+
+    def _rollover(self):
+        spooled = self.file.getvalue()
+        descriptor, self.path = tempfile.mkstemp(prefix="oya-upload-", dir=self.temp_dir)
+        self.file = os.fdopen(descriptor, "w+b")
+        self.file.write(spooled)
+
+    async def feed(self, data: bytes):
+        """
+        Append ``data`` while receiving the upload.
+        """
+        self.size += len(data)
+        if self.path is None:
+            if self.size <= self.spool_size:
+                self._write_pending(data)
+                return
+            await asyncio.to_thread(self._rollover)
+        self._pending += data
+        if len(self._pending) >= WRITE_BUFFER_SIZE:
+            pending, self._pending = bytes(self._pending), bytearray()
+            await asyncio.to_thread(self._write_pending, pending)
+
+    async def finish(self):
+        """
+        Write the buffered data and rewind the file, once the upload is
+        received.
+        """
+        if self._pending:
+            pending, self._pending = bytes(self._pending), bytearray()
+            await asyncio.to_thread(self._write_pending, pending)
+        if self.path is not None:
+            await asyncio.to_thread(self.file.flush)
+        self.file.seek(0)
+
+    def _move_to(self, destination: str) -> str:
+        Path(destination).parent.mkdir(parents=True, exist_ok=True)
+        if self.path is None:
+            with open(destination, "wb") as fd:
+                fd.write(self.file.getbuffer())
+        else:
+            self.file.close()
+            try:
+                os.replace(self.path, destination)
+            except OSError:
+                # another file system, copied once.
+                shutil.move(self.path, destination)
+            self.path = None
+        self._moved = True
+        return destination
+
+    async def move_to(self, destination: str | Path) -> str:
+        """
+        Move the upload to ``destination``, renamed when it was written to
+        disk on the same file system. The upload can't be read afterwards.
+        """
+        return await asyncio.to_thread(self._move_to, str(destination))
+
+    def _cleanup(self):
+        if not self.file.closed:
+            self.file.close()
+        if self.path is not None and not self._moved:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+    async def close(self) -> None:
+        """
+        Close the file and delete the temporary file.
+        """
+        if self.path is not None:
+            await asyncio.to_thread(self._cleanup)
+        else:
+            self._cleanup()
+
+    def __repr__(self) -> str:
+        return f"{self.filename} - {self.content_type} ({self.size} bytes)"
+
+
+class MultipartParser:
+    """
+    Incremental ``multipart/form-data`` parser: file parts are streamed to
+    ``SpooledUploadFile`` and the limits are checked as the body arrives.
+
+    Args:
+        boundary (bytes): boundary of the ``Content-Type`` header.
+        part_limit (int): maximum number of parts.
+        max_size (int | None): maximum size of the body.
+        max_part_size (int | None): maximum size of a file.
+        max_field_size (int): maximum size of a non-file field, kept in memory.
+        spool_size (int): size above which a file is written to disk.
+        hashes (Iterable[str]): hashlib algorithms computed for the files.
+        temp_dir (str | None): directory of the temporary files, on the file
+            system of the storage to move them without a copy.
+    """
+
+    def __init__(
+        self,
+        boundary: bytes,
+        part_limit: int = 1000,
+        max_size: int | None = None,
+        max_part_size: int | None = None,
+        max_field_size: int = DEFAULT_MAX_FIELD_SIZE,
+        spool_size: int = DEFAULT_SPOOL_SIZE,
+        hashes: Iterable[str] = (),
+        temp_dir: str | None = None,
+    ):
+        self.delimiter = b"--" + boundary
+        self.separator = b"\r\n--" + boundary
+        self.part_limit = part_limit
+        self.max_size = max_size
+        self.max_part_size = max_part_size
+        self.max_field_size = max_field_size
+        self.spool_size = spool_size
+        self.hashes = tuple(hashes)
+        self.temp_dir = temp_dir
+        self.uploads: list[SpooledUploadFile] = []
+
+    async def parse(self, chunks: AsyncIterator[bytes]) -> dict[str, Any]:
+        """
+        Parse the body, returns the form values as litestar does: a value
+        per field, a list for the repeated fields.
+        """
+        fields: defaultdict[str, list[Any]] = defaultdict(list)
+        buffer = bytearray()
+        state = "preamble"
+        received = parts = 0
+        name: str | None = None
+        part: SpooledUploadFile | bytearray | None = None
+        charset = "utf-8"
+        keep = len(self.separator) - 1
+
+        async for chunk in chunks:
+            received += len(chunk)
+            if self.max_size is not None and received > self.max_size:
+                raise _too_large("Request body", self.max_size)
+            buffer += chunk
+
+            while True:
+                if state == "preamble":
+                    index = buffer.find(self.delimiter)
+                    if index < 0:
+                        del buffer[: max(len(buffer) - keep, 0)]
+                        break
+                    del buffer[: index + len(self.delimiter)]
+                    state = "delimiter"
+
+                elif state == "delimiter":
+                    if len(buffer) < 2:
+                        break
+                    if buffer[:2] == b"--":
+                        state = "end"
+                    elif buffer[:2] == b"\r\n":
+                        del buffer[:2]
+                        state = "headers"
+                    else:
+                        raise ClientException("Malformed multipart body")
+
+                elif state == "headers":
+                    index = buffer.find(b"\r\n\r\n")
+                    if index < 0:
+                        if len(buffer) > MAX_HEADERS_SIZE:
+                            raise ClientException("Multipart part headers too large")
+                        break
+                    parts += 1
+                    if parts > self.part_limit:
+                        raise ValidationException(
+                            f"number of multipart components exceeds the allowed limit of {self.part_limit}, "
+                            f"this potentially indicates a DoS attack"
+                        )
+                    name, part, charset = self._start_part(bytes(buffer[:index]))
+                    del buffer[: index + 4]
+                    state = "body"
+
+                elif state == "body":
+                    index = buffer.find(self.separator)
+                    end = index if index >= 0 else len(buffer) - keep
+                    if end > 0:
+                        await self._feed(part, bytes(buffer[:end]))
+                        del buffer[:end]
+                    if index < 0:
+                        break
+                    del buffer[: len(self.separator)]
+                    if name is not None:
+                        fields[name].append(await self._finish_part(part, charset))
+                    state = "delimiter"
+
+                else:
+                    buffer.clear()
+                    break
+
+        if state != "end":
+            raise ClientException("Malformed multipart body")
+        return {key: values if len(values) > 1 else values[0] for key, values in fields.items()}
+
+    def _start_part(self, raw_headers: bytes) -> tuple[str | None, SpooledUploadFile | bytearray, str]:
+        name = filename = None
+        content_type = "text/plain"
+        charset = "utf-8"
+        headers: dict[str, str] = {}
+        for line in raw_headers.decode("utf-8").split("\r\n"):
+            if ":" not in line:
+                continue
+            field, value = line.split(":", 1)
+            field = field.strip().lower()
+            value, options = parse_content_header(value.strip())
+            if field == "content-disposition":
+                name = options.get("name")
+                filename = options.get("filename")
+                if filename is None and (filename_with_asterisk := options.get("filename*")):
+                    encoding, _, quoted = decode_rfc2231(filename_with_asterisk)
+                    filename = unquote(quoted, encoding=encoding or charset)
+            elif field == "content-type":
+                content_type = value
+                charset = options.get("charset", "utf-8")
+            headers[field] = value
+
+        if filename is None:
+            return name, bytearray(), charset
+        upload = SpooledUploadFile(
+            content_type=content_type,
+            filename=filename,
+            headers=headers,
+            spool_size=self.spool_size,
+            hashes=self.hashes,
+            temp_dir=self.temp_dir,
+        )
+        self.uploads.append(upload)
+        return name, upload, charset
+
+    async def _feed(self, part: SpooledUploadFile | bytearray, data: bytes):
+        if isinstance(part, bytearray):
+            if len(part) + len(data) > self.max_field_size:
+                raise _too_large("Form field", self.max_field_size)
+            part += data
+            return
+        if self.max_part_size is not None and part.size + len(data) > self.max_part_size:
+            raise _too_large("Uploaded file", self.max_part_size)
+        await part.feed(data)
+
+    async def _finish_part(self, part: SpooledUploadFile | bytearray, charset: str) -> Any:
+        if isinstance(part, bytearray):
+            return part.decode(charset) if part else None
+        await part.finish()
+        return part
+
+    async def close(self):
+        """
+        Close the uploads and delete their temporary files.
+        """
+        for upload in self.uploads:
+            await upload.close()
+        self.uploads.clear()
@@ -0,0 +1,45 @@
+from oya.apps.asgi.utils import get_static_file_config
+from oya.core.management.base import BaseCommand, CommandError
+from oya.core.management.color import make_style
+from oya.core.staticfiles import collect_static, get_static_root
+from oya.conf import settings
+
+
+
+class Command(BaseCommand):
+    help = "Collect the static files into STATIC_ROOT, with hashed names and precompressed variants."
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            "-c",
+            "--clear",
+            action="store_true",
+            dest="clear",
+            help="delete the previously collected files first.",
+        )
+
+        parser.add_argument(
+            "--no-compress",
+            action="store_true",
+            dest="no_compress",
+            help="do not generate the gzip and brotli variants.",
+        )
+
+
+    def handle(self, *args, **options):
+        style = make_style()
+
+        if not getattr(settings, "STATIC_ROOT", None):
+            raise CommandError("settings.STATIC_ROOT is not set.")
+
+        encodings = () if options["no_compress"] else getattr(settings, "STATIC_COMPRESSION", ("br", "gzip"))
+
+        for config in get_static_file_config():
+            root = get_static_root(config)
+            manifest = collect_static(config.directories, root, encodings=encodings, clear=options["clear"])
+            variants = sum(len(manifest["files"][hashed]["encodings"]) for hashed in manifest["paths"].values())
+            self.stdout.write(
+                style.SUCCESS(f"{len(manifest['paths'])} files of {config.path} collected into {root}")
+                + f" ({variants} compressed variants)"
+            )
@@ -1,9 +1,8 @@
 from oya.db.migrations import Command as AerichCommand
 from oya.core.management.base import BaseCommand
-from oya.core.management.utils import coro
+from oya.core.management.utils import coro, get_app_tortoise_config
 from oya.core.management.color import make_style
 from oya.apps import apps as oya_apps
-from oya.conf import settings
 
 
 
@@ -22,7 +21,7 @@ class Command(BaseCommand):
         apps = oya_apps.get_app_configs()
 
         for app in apps:
-            command = AerichCommand(tortoise_config=settings.TORTOISE_ORM, app=app.label, location=app.get_migrations_path())
+            command = AerichCommand(tortoise_config=get_app_tortoise_config(app), app=app.label, location=app.get_migrations_path())
             await command.init()
             try:
                 head_list = await command.heads()
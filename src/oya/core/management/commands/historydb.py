@@ -1,8 +1,7 @@
 from oya.db.migrations import Command as AerichCommand
 from oya.core.management.base import BaseCommand
 from oya.core.management.color import make_style
-from oya.core.management.utils import coro, get_migratable_apps
-from oya.conf import settings
+from oya.core.management.utils import coro, get_app_tortoise_config, get_migratable_apps
 from oya.apps import apps as oya_apps
 
 
@@ -41,7 +40,7 @@ class Command(BaseCommand):
                     style.ERROR(f"Application '{app}' not found"))
                 continue
 
-            command = AerichCommand(tortoise_config=settings.TORTOISE_ORM, app=app, location=oya_app.get_migrations_path())
+            command = AerichCommand(tortoise_config=get_app_tortoise_config(oya_app), app=app, location=oya_app.get_migrations_path())
             await command.init()
             try:
                 versions = await command.history()
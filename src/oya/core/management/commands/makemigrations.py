@@ -1,9 +1,8 @@
 from oya.db.migrations import Command as AerichCommand
 from oya.db.migrations.utils import add_src_path
 from oya.core.management.base import BaseCommand
-from oya.core.management.utils import coro, get_migratable_apps, remove_initial
+from oya.core.management.utils import coro, get_app_tortoise_config, get_migratable_apps, remove_initial
 from oya.core.management.color import make_style
-from oya.conf import settings
 from oya.apps import apps as oya_apps
 
 
@@ -56,7 +55,7 @@ class Command(BaseCommand):
                         style.ERROR(f"Application '{app}' not found"))
                     continue
                         
-                command = AerichCommand(tortoise_config=settings.TORTOISE_ORM, app=app, location=oya_app.get_migrations_path())
+                command = AerichCommand(tortoise_config=get_app_tortoise_config(oya_app), app=app, location=oya_app.get_migrations_path())
                 await command.init()
                 if name:
                     res = await command.migrate(name)
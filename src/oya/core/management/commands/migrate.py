@@ -1,9 +1,8 @@
 from oya.db.migrations import Command as AerichCommand
 from oya.core.management.base import BaseCommand
-from oya.core.management.utils import coro, get_migratable_apps, remove_initial
+from oya.core.management.utils import coro, get_app_tortoise_config, get_migratable_apps, remove_initial
 from oya.core.management.color import make_style
 from oya.apps import apps as oya_apps
-from oya.conf import settings
 
 
 
@@ -52,14 +51,21 @@ class Command(BaseCommand):
                     style.ERROR(f"Application '{app}' not found"))
                 continue
             
-            command = AerichCommand(tortoise_config=settings.TORTOISE_ORM,app=app, location=oya_app.get_migrations_path())
-            await command.init()
-            migrated = await command.upgrade(run_in_transaction=options['transaction'])
-            
-            if migrated:
-                count_migrations += len(migrated)
-                for version_file in migrated:
-                    self.stdout.write(style.WARNING(f"Success upgrade {version_file}"))
+            connections = oya_app.get_connections()
+            for connection in connections:
+                command = AerichCommand(
+                    tortoise_config=get_app_tortoise_config(oya_app, connection),
+                    app=app,
+                    location=oya_app.get_migrations_path(),
+                )
+                await command.init()
+                migrated = await command.upgrade(run_in_transaction=options['transaction'])
+
+                if migrated:
+                    count_migrations += len(migrated)
+                    on = f" on '{connection}'" if len(connections) > 1 else ""
+                    for version_file in migrated:
+                        self.stdout.write(style.WARNING(f"Success upgrade {version_file}{on}"))
 
         if count_migrations == 0:
                 self.stdout.write(style.WARNING("No upgrade items found"))
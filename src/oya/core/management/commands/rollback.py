@@ -1,9 +1,8 @@
 from oya.db.migrations import Command as AerichCommand
 from oya.core.exceptions import DowngradeError
 from oya.core.management.base import BaseCommand
-from oya.core.management.utils import coro
+from oya.core.management.utils import coro, get_app_tortoise_config
 from oya.core.management.color import make_style
-from oya.conf import settings
 from oya.apps import apps as oya_apps
 
 
@@ -56,13 +55,20 @@ class Command(BaseCommand):
             return self.stdout.write(
                 style.ERROR(f"Application '{app}' not found"))
         
-        command = AerichCommand(tortoise_config=settings.TORTOISE_ORM, app=app, location=oya_app.get_migrations_path())
-        await command.init()
-        print(options['Version'][0])
-        try:
-            files = await command.downgrade(options['Version'][0], options['delete'])
-        except DowngradeError as e:
-            return self.stdout.write(
-                style.ERROR(f"Downgrade error: {e}"))
-        for file in files:
-            self.stdout.write(style.SUCCESS(f"Success downgrade {file}"))
+        connections = oya_app.get_connections()
+        for connection in connections:
+            command = AerichCommand(
+                tortoise_config=get_app_tortoise_config(oya_app, connection),
+                app=app,
+                location=oya_app.get_migrations_path(),
+            )
+            await command.init()
+            try:
+                # version files are only deleted once the last shard is downgraded.
+                delete = options['delete'] and connection == connections[-1]
+                files = await command.downgrade(options['Version'][0], delete)
+            except DowngradeError as e:
+                return self.stdout.write(
+                    style.ERROR(f"Downgrade error: {e}"))
+            for file in files:
+                self.stdout.write(style.SUCCESS(f"Success downgrade {file}"))
@@ -3,17 +3,50 @@
 import sys
 from uvicorn import main
 from oya.conf import settings
-from oya.core.management.base import BaseCommand
+from oya.core.management.base import BaseCommand, CommandError
 from oya.core.management.utils import print_banner
+from oya.core.server import PreforkServer
 
 
 class Command(BaseCommand):
     help = "An interface for uvicorn"
     add_help = False # don't add -h/--help and argparse have to accept unknown options
 
-    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prefork",
+            action="store_true",
+            dest="prefork",
+            help="Load the application once in a master process and fork the workers.",
+        )
+        parser.add_argument("--workers", type=int, dest="workers", default=None)
+        parser.add_argument("--host", dest="host", default=None)
+        parser.add_argument("--port", type=int, dest="port", default=None)
+        parser.add_argument("--log-level", dest="log_level", default=None)
+
+
     def handle(self, *args, **options):
         print_banner()
+
+        if options["prefork"] or getattr(settings, "PREFORK", False):
+            # the other options are uvicorn's, which the pre-fork server does not take.
+            parser = self.create_parser(sys.argv[0], sys.argv[1], add_help=False)
+            _, unknown = parser.parse_args(sys.argv[2:], known=True)
+            if unknown:
+                raise CommandError(
+                    "Unsupported options with --prefork: %s. It only takes --workers, --host, "
+                    "--port and --log-level." % " ".join(unknown)
+                )
+            server = PreforkServer(
+                settings.ASGI_APPLICATION,
+                host=options["host"] or getattr(settings, "UVICORN_HOST", "127.0.0.1"),
+                port=options["port"] or getattr(settings, "UVICORN_PORT", 8000),
+                workers=options["workers"] or getattr(settings, "PREFORK_WORKERS", None),
+                log_level=options["log_level"] or getattr(settings, "UVICORN_LOG_LEVEL", "info"),
+                graceful_timeout=getattr(settings, "PREFORK_GRACEFUL_TIMEOUT", 30),
+            )
+            sys.exit(server.run())
+
         sys.argv = sys.argv[1:]
         sys.argv.insert(1, settings.ASGI_APPLICATION)
-        sys.exit(main()) # ignore: E1120
\ No newline at end of file
+        sys.exit(main()) # ignore: E1120
@@ -17,6 +17,12 @@ from oya.utils.crypto import get_random_string
 from oya.utils.encoding import DEFAULT_LOCALE_ENCODING
 from .base import CommandError, CommandParser
 from oya.db.migrations import Command as AerichCommand
+from oya.db.migrations.utils import get_connection_config
+from oya.db.instrumentation import instrument_clients
+from oya.db.slowlog import enable_slow_query_log
+from oya.db.cache import enable_query_cache
+from oya.core.cache.tags import register_invalidation_receivers
+from oya.db.pool import get_pool_config, instrument_pools, pool_stats, warmup_pools
 
 
 
@@ -68,8 +74,19 @@ async def init_tortoise(tortoise_config):
     await Tortoise.init(tortoise_config)
 
 
-async def init_tortoise_auto():
-    await init_tortoise(settings.TORTOISE_ORM)
+async def init_tortoise_auto(app=None):
+    await init_tortoise(get_pool_config(settings.TORTOISE_ORM))
+    instrument_pools()
+    instrument_clients()
+    enable_slow_query_log()
+    enable_query_cache()
+    register_invalidation_receivers()
+
+    if getattr(settings, "DATABASE_POOL_WARMUP", False):
+        await warmup_pools()
+
+    if app is not None:
+        app.state.db_pool_stats = pool_stats
 
 
 async def close_tortoise():
@@ -265,6 +282,16 @@ def get_migratable_apps() -> list[str]:
     return apps
 
 
+def get_app_tortoise_config(app_config, connection: str | None = None) -> dict:
+    """
+    Returns the tortoise config used to migrate an app on one of its connections
+    (the app connection by default), the migration history is kept there too.
+    """
+    return get_connection_config(
+        settings.TORTOISE_ORM, app_config.label, connection or app_config.connection
+    )
+
+
 def print_banner():
     banner = f"\n OYA {__version__}. Copyright (c) OyaBytes 2023."
     print(banner)
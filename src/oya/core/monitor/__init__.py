@@ -0,0 +1,243 @@
+"""
+Event loop lag and blocking call monitor.
+
+Enabled with ``settings.LOOP_MONITOR_ENABLED``, ``Application`` then starts the
+monitor on startup. A task measures how late the loop wakes it up (the lag)
+every ``LOOP_MONITOR_INTERVAL`` seconds, while a watchdog thread captures the
+stack of the loop thread and the route being served when the loop is blocked
+for more than ``LOOP_BLOCK_THRESHOLD`` seconds.
+
+Blocking periods are logged on the ``oya.monitor`` logger, the lag
+percentiles are logged every ``LOOP_MONITOR_LOG_INTERVAL`` seconds and
+exported as gauges on the metrics endpoint.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from array import array
+from typing import Any
+
+from oya.conf import settings
+
+
+__all__ = (
+    "LoopMonitor",
+    "get_loop_monitor",
+    "start_loop_monitor",
+    "stop_loop_monitor",
+)
+
+
+logger = logging.getLogger("oya.monitor")
+
+DEFAULT_INTERVAL = 0.1
+DEFAULT_BLOCK_THRESHOLD = 0.1
+DEFAULT_LOG_INTERVAL = 60.0
+WINDOW = 600
+STACK_LIMIT = 24
+
+QUANTILES = (0.5, 0.9, 0.99)
+RECENT_LAG_WEIGHT = 0.3
+
+
+class LoopMonitor:
+    """
+    Lag measurements of a single event loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.interval: float = getattr(settings, "LOOP_MONITOR_INTERVAL", DEFAULT_INTERVAL)
+        self.block_threshold: float = getattr(settings, "LOOP_BLOCK_THRESHOLD", DEFAULT_BLOCK_THRESHOLD)
+        self.log_interval: float = getattr(settings, "LOOP_MONITOR_LOG_INTERVAL", DEFAULT_LOG_INTERVAL)
+
+        # ring buffer of the last lags, in seconds.
+        self.lags = array("d", bytes(8 * WINDOW))
+        self.count = 0
+        self.max_lag = 0.0
+        # exponentially weighted lag of the last measurements, see
+        # AdaptiveCompressionMiddleware.
+        self.recent_lag = 0.0
+        self.blocked_count = 0
+        self.blocked_time: dict[str, float] = {}
+
+        # routes of the requests being served, by task, see LoopMonitorMiddleware.
+        self.routes: dict[asyncio.Task, str] = {}
+
+        self._heartbeat = time.monotonic()
+        self._episode: tuple[float, str | None, str] | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if getattr(settings, "LOOP_MONITOR_DEBUG", False):
+            # asyncio reports the slow callbacks itself, at the cost of the
+            # debug mode overhead.
+            self.loop.set_debug(True)
+            self.loop.slow_callback_duration = self.block_threshold
+
+        self._task = self.loop.create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="oya-loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        next_log = time.monotonic() + self.log_interval
+        while True:
+            expected = time.monotonic() + self.interval
+            self._heartbeat = expected
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            self._heartbeat = now
+
+            self.lags[self.count % WINDOW] = lag
+            self.count += 1
+            self.recent_lag += (lag - self.recent_lag) * RECENT_LAG_WEIGHT
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag >= self.block_threshold:
+                self._report_blocking(lag)
+
+            if now >= next_log:
+                next_log = now + self.log_interval
+                self._log_percentiles()
+
+            # the gauges reach the other workers with the metrics snapshots.
+            if _metrics_registry is not None:
+                _metrics_registry.maybe_flush()
+
+    def _watch(self):
+        # pylint: disable=protected-access
+        current_tasks = asyncio.tasks._current_tasks
+        reported = None
+        while not self._stopped.wait(self.block_threshold / 2):
+            heartbeat = self._heartbeat
+            if heartbeat == reported or time.monotonic() - heartbeat < self.block_threshold:
+                continue
+            reported = heartbeat
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            task = current_tasks.get(self.loop)
+            route = self.routes.get(task) if task is not None else None
+            stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT)).rstrip()
+            self._episode = (heartbeat, route, stack)
+
+    def _report_blocking(self, lag: float):
+        route, stack = None, None
+        if self._episode is not None:
+            _, route, stack = self._episode
+            self._episode = None
+
+        self.blocked_count += 1
+        key = route or "-"
+        self.blocked_time[key] = self.blocked_time.get(key, 0.0) + lag
+        logger.warning(
+            "Event loop blocked for %.1fms%s%s",
+            lag * 1000,
+            f" while serving {route}" if route else "",
+            f"\n{stack}" if stack else "",
+            extra={"loop_lag_ms": round(lag * 1000, 3), "route": route},
+        )
+
+    def percentiles(self) -> dict[float, float]:
+        size = min(self.count, WINDOW)
+        if not size:
+            return {quantile: 0.0 for quantile in QUANTILES}
+        lags = sorted(self.lags[:size])
+        return {quantile: lags[min(int(quantile * size), size - 1)] for quantile in QUANTILES}
+
+    def _log_percentiles(self):
+        values = self.percentiles()
+        logger.info(
+            "Event loop lag p50=%.2fms p90=%.2fms p99=%.2fms max=%.2fms",
+            *(values[quantile] * 1000 for quantile in QUANTILES), self.max_lag * 1000,
+            extra={
+                "loop_lag_p50_ms": round(values[0.5] * 1000, 3),
+                "loop_lag_p90_ms": round(values[0.9] * 1000, 3),
+                "loop_lag_p99_ms": round(values[0.99] * 1000, 3),
+                "loop_lag_max_ms": round(self.max_lag * 1000, 3),
+                "loop_blocked_count": self.blocked_count,
+            },
+        )
+
+    def gauges(self) -> list[dict[str, Any]]:
+        gauges = [
+            {
+                "name": "oya_event_loop_lag_seconds",
+                "help": "Event loop lag over the last samples.",
+                "labels": {"quantile": str(quantile)},
+                "value": value,
+            }
+            for quantile, value in self.percentiles().items()
+        ]
+        gauges.append({
+            "name": "oya_event_loop_lag_max_seconds",
+            "help": "Maximum event loop lag.",
+            "labels": {},
+            "value": self.max_lag,
+        })
+        gauges.extend(
+            {
+                "name": "oya_event_loop_blocked_seconds",
+                "help": "Time the event loop was blocked, by route.",
+                "labels": {"route": route},
+                "value": total,
+            }
+            for route, total in self.blocked_time.items()
+        )
+        return gauges
+
+
+_monitor: LoopMonitor | None = None
+_metrics_registry = None
+
+
+def get_loop_monitor() -> LoopMonitor | None:
+    return _monitor
+
+
+async def start_loop_monitor():
+    """
+    Start monitoring the running loop, registered as an on_startup hook.
+    """
+    global _monitor, _metrics_registry  # pylint: disable=global-statement
+    if _monitor is not None:
+        return
+
+    _monitor = LoopMonitor(asyncio.get_running_loop())
+    _monitor.start()
+
+    if getattr(settings, "METRICS_ENABLED", False):
+        # imported here, the metrics module imports the middleware stack.
+        from oya.middleware.builtins.metrics import registry  # pylint: disable=import-outside-toplevel
+
+        _metrics_registry = registry
+        registry.add_gauge_provider(_monitor.gauges)
+
+
+async def stop_loop_monitor():
+    """
+    Stop the monitor, registered as an on_shutdown hook.
+    """
+    global _monitor  # pylint: disable=global-statement
+    if _monitor is not None:
+        _monitor.stop()
+        if _metrics_registry is not None:
+            try:
+                _metrics_registry.gauge_providers.remove(_monitor.gauges)
+            except ValueError:
+                pass
+        _monitor = None
@@ -5,10 +5,11 @@ from litestar.dto import AbstractDTO
 from litestar.plugins import SerializationPluginProtocol
 from litestar.typing import FieldDefinition
 from oya.core.dto import TortoiseDTO
+from oya.core.serialization.streaming import QuerySetStream
 from tortoise.models import Model, QuerySet
 
 
-__all__ = ["TortoiseSerializationPlugin"]
+__all__ = ["QuerySetStream", "TortoiseSerializationPlugin"]
 
 if TYPE_CHECKING:
     from litestar.typing import FieldDefinition
@@ -0,0 +1,220 @@
+"""
+Querysets streamed as JSON.
+
+A handler returning a queryset (for a ``list[Model]`` return annotation, or
+a ``QuerySetStream``) sends its rows as a JSON array, or as NDJSON when the
+client accepts ``application/x-ndjson`` first. The first chunk is fetched
+before the response starts, so a failing query gets an error response. The
+rows are fetched ``chunk_size`` at a time, by primary key ranges when the
+queryset is not ordered (by pages otherwise, ordered by the primary key
+last), with the related models of the nested fields of the DTO (see
+``oya.core.dto.related``), and each chunk is encoded through the DTO of the
+model, so memory does not grow with the size of the result. When the DTO includes columns only (and foreign
+keys to columns), only these columns are selected, as value rows encoded
+without building the instances (see ``oya.core.dto.codec.RowCodec``)::
+
+    @get("/export")
+    async def export() -> QuerySetStream:
+        return QuerySetStream(Book.filter(published=True), chunk_size=5000)
+"""
+
+from functools import lru_cache
+from typing import Any, AsyncIterator
+
+from litestar.dto._backend import DTOBackend
+from litestar.response import Stream
+from litestar.response.streaming import ASGIStreamingResponse
+from litestar.types import Send
+from litestar.serialization import encode_json
+from litestar.typing import FieldDefinition
+from pypika import Order
+from tortoise.models import Model
+from tortoise.queryset import QuerySet
+
+from oya.core.dto import TortoiseDTO
+from oya.core.dto.related import get_related_plan
+
+
+__all__ = (
+    "QuerySetStream",
+    "get_model_codec",
+    "iter_queryset",
+    "stream_queryset",
+)
+
+
+DEFAULT_CHUNK_SIZE = 1000
+JSON = "json"
+NDJSON = "ndjson"
+MEDIA_TYPES = {JSON: "application/json", NDJSON: "application/x-ndjson"}
+
+
+@lru_cache(maxsize=None)
+def get_model_codec(model: type[Model]) -> DTOBackend:
+    """
+    Return the DTO backend encoding lists of ``model``, built once per model.
+    """
+    dto = TortoiseDTO[model]
+    handler_id = f"oya.stream:{model.__module__}.{model.__qualname__}"
+    dto.create_for_field_definition(FieldDefinition.from_annotation(list[model], name="return"), handler_id)
+    return dto._dto_backends[handler_id]["return_backend"]
+
+
+async def iter_queryset(
+    queryset: QuerySet, chunk_size: int = DEFAULT_CHUNK_SIZE, values: tuple[str, ...] | None = None
+) -> AsyncIterator[list[Model] | list[dict]]:
+    """
+    Yield the rows of ``queryset`` by lists of ``chunk_size`` models, or of
+    dicts of the ``values`` fields (the primary key included) when given.
+    """
+    model = queryset.model
+    keyset = (
+        not queryset._orderings
+        and not model._meta.ordering
+        and queryset._limit is None
+        and queryset._offset is None
+        and not queryset._distinct
+    )
+    if keyset:
+        # primary key ranges: every query is an index range scan.
+        pk = model._meta.pk_attr
+        queryset = queryset.order_by(pk)
+        last = None
+        while True:
+            page = queryset if last is None else queryset.filter(**{f"{pk}__gt": last})
+            page = page.limit(chunk_size)
+            rows = await (page if values is None else page.values(*values))
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            last = getattr(rows[-1], pk) if values is None else rows[-1][pk]
+
+    # pages of a total order: the primary key breaks the ties (and orders the
+    # unordered querysets), no row is skipped or repeated between two pages.
+    orderings = list(queryset._orderings or model._meta.ordering)
+    if not any(field in (model._meta.pk_attr, "pk") for field, _ in orderings):
+        queryset = queryset._clone()
+        queryset._orderings = [*orderings, (model._meta.pk_attr, Order.asc)]
+
+    offset = queryset._offset or 0
+    remaining = queryset._limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        page = queryset.offset(offset).limit(size)
+        rows = await (page if values is None else page.values(*values))
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        offset += size
+        if remaining is not None:
+            remaining -= size
+
+
+async def stream_queryset(
+    queryset: QuerySet,
+    format: str = JSON,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    codec: DTOBackend | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yield the JSON array (or the NDJSON lines) of the rows of ``queryset``,
+    encoded by ``codec``, the DTO backend of the model by default.
+    """
+    codec = codec or get_model_codec(queryset.model)
+    # the columns of the DTO only, without instances, when they are enough.
+    row_codec = getattr(codec, "row_codec", None)
+    if row_codec is not None:
+        values, encode = row_codec.columns, row_codec.encode_many
+    else:
+        queryset = get_related_plan(codec).apply(queryset)
+        values, encode = None, codec.encode_data
+    # the array opens with the first chunk: nothing is sent before a query.
+    separator = b"["
+    async for rows in iter_queryset(queryset, chunk_size, values):
+        encodable = encode(rows)
+        if format == NDJSON:
+            yield b"\n".join(encode_json(row) for row in encodable) + b"\n"
+            continue
+        # "[a,b]" of the chunk, without its brackets.
+        yield separator + encode_json(encodable)[1:-1]
+        separator = b","
+    if format == JSON:
+        yield b"[]" if separator == b"[" else b"]"
+
+
+def _negotiate(accept: str | None) -> str:
+    for media_range in (accept or "").split(","):
+        media_type = media_range.split(";", 1)[0].strip()
+        if media_type in ("application/x-ndjson", "application/jsonl"):
+            return NDJSON
+        if media_type in ("application/json", "*/*"):
+            return JSON
+    return JSON
+
+
+async def _chain(first: bytes, iterator: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield first
+    async for chunk in iterator:
+        yield chunk
+
+
+class _QuerySetASGIResponse(ASGIStreamingResponse):
+    """
+    ``ASGIStreamingResponse`` fetching its first chunk before the response
+    starts, the errors of the first query are raised to the exception
+    handlers.
+    """
+
+    __slots__ = ()
+
+    async def start_response(self, send: Send) -> None:
+        iterator = self.iterator.__aiter__()
+        try:
+            self.iterator = _chain(await iterator.__anext__(), iterator)
+        except StopAsyncIteration:
+            self.iterator = iterator
+        await super().start_response(send)
+
+
+class QuerySetStream(Stream):
+    """
+    Streaming response of the rows of a queryset.
+
+    Args:
+        queryset (QuerySet): rows to send.
+        format (str | None): ``json``, ``ndjson``, or None to follow the
+            ``Accept`` header of the request.
+        chunk_size (int): rows fetched and encoded at once.
+        codec (DTOBackend | None): DTO backend of the rows, the one of the
+            handler for a queryset returned by a handler.
+    """
+
+    def __init__(
+        self,
+        queryset: QuerySet,
+        *,
+        format: str | None = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        codec: DTOBackend | None = None,
+        **kwargs: Any,
+    ):
+        if format is not None and format not in MEDIA_TYPES:
+            raise ValueError(f"Unknown format '{format}', expected one of {tuple(MEDIA_TYPES)}.")
+        super().__init__(b"", **kwargs)
+        self.queryset = queryset
+        self.format = format
+        self.chunk_size = chunk_size
+        self.codec = codec
+
+    def to_asgi_response(self, app: Any, request: Any, **kwargs: Any) -> Any:
+        format = self.format or _negotiate(request.headers.get("accept"))
+        self.iterator = stream_queryset(self.queryset, format, self.chunk_size, self.codec)
+        # over the media type of the route.
+        kwargs["media_type"] = self.media_type or MEDIA_TYPES[format]
+        response = super().to_asgi_response(app, request, **kwargs)
+        # same slots, see _QuerySetASGIResponse.
+        response.__class__ = _QuerySetASGIResponse
+        return response
+
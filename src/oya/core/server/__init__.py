@@ -0,0 +1,366 @@
+"""
+Pre-fork server for production deployments.
+
+The master process imports the project and builds the ASGI application once,
+freezes the garbage collector so that the loaded objects stay shared
+copy-on-write, then forks the workers. Tortoise connections are opened by the
+application ``on_startup`` hooks, which only run inside the workers.
+
+As the application is loaded once, before the workers are forked, a rolling
+restart (``SIGHUP``) only recycles the workers: their memory and connections
+are renewed, but no new code is loaded. Restart the master to deploy.
+"""
+
+import errno
+import gc
+import logging
+import os
+import select
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Any
+
+import uvicorn
+from uvicorn.importer import import_from_string
+from tortoise import Tortoise
+
+from oya.core.exceptions import ImproperlyConfigured
+
+
+__all__ = ("PreforkServer",)
+
+
+logger = logging.getLogger("oya.server")
+
+
+class _WorkerServer(uvicorn.Server):
+    """
+    uvicorn server of a worker, reporting its startup to the master.
+    """
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int | None = None):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets: list[socket.socket] | None = None) -> None:
+        await super().startup(sockets=sockets)
+        if self.ready_fd is not None:
+            if not self.should_exit:
+                os.write(self.ready_fd, b"1")
+            os.close(self.ready_fd)
+            self.ready_fd = None
+
+
+class PreforkServer:
+    """
+    Master process of the pre-fork server.
+
+    Signals handled by the master:
+
+    - ``SIGHUP``: rolling restart, workers are replaced one at a time, an
+      old worker is retired once its replacement serves requests. The
+      application is not reloaded.
+    - ``SIGTERM``/``SIGINT``: graceful shutdown of every worker.
+    - ``SIGTTIN``/``SIGTTOU``: add/remove one worker.
+    """
+
+    # hooks called in the worker right after fork, before uvicorn starts.
+    post_fork_hooks: list = []
+
+    def __init__(
+        self,
+        app: str,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        workers: int | None = None,
+        log_level: str = "info",
+        graceful_timeout: int = 30,
+        backlog: int = 2048,
+        **uvicorn_options: Any,
+    ):
+        self.app_path = app
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.log_level = log_level
+        self.graceful_timeout = graceful_timeout
+        self.backlog = backlog
+        self.uvicorn_options = uvicorn_options
+
+        self.app = None
+        self.sock: socket.socket | None = None
+        self.children: dict[int, float] = {}  # pid -> spawn time
+        self._retiring: set[int] = set()
+        self._signals: list[int] = []
+        self._wakeup_r, self._wakeup_w = -1, -1
+        self._stopping = False
+
+    @classmethod
+    def add_post_fork_hook(cls, hook):
+        """
+        Register a callable run in each worker right after fork.
+        """
+        if hook not in cls.post_fork_hooks:
+            cls.post_fork_hooks.append(hook)
+
+    def load(self):
+        """
+        Import the ASGI application in the master and freeze the heap.
+        """
+        # See https://docs.python.org/3/library/gc.html#gc.freeze, disabling
+        # the collector while loading avoids freeing pages that would
+        # then be copied by every worker.
+        gc.disable()
+        self.app = import_from_string(self.app_path)
+
+        if Tortoise._inited:  # pylint: disable=protected-access
+            raise ImproperlyConfigured(
+                "Tortoise connections were opened while loading '%s'. Connections "
+                "must only be opened by the workers (on_startup hooks)." % self.app_path
+            )
+
+        gc.freeze()
+
+    def bind(self):
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        sock.set_inheritable(True)
+        self.sock = sock
+
+    def run(self) -> int:
+        # shared by the workers to merge their metrics, see
+        # oya.middleware.builtins.metrics.
+        metrics_dir = None
+        if "OYA_METRICS_DIR" not in os.environ:
+            metrics_dir = os.environ["OYA_METRICS_DIR"] = tempfile.mkdtemp(prefix="oya-metrics-")
+
+        # table generations of the query cache, see oya.db.cache.
+        generations_file = None
+        if "OYA_QUERY_CACHE_FILE" not in os.environ:
+            fd, generations_file = tempfile.mkstemp(prefix="oya-query-cache-")
+            os.close(fd)
+            os.environ["OYA_QUERY_CACHE_FILE"] = generations_file
+
+        self.load()
+        self.bind()
+        self._install_signal_handlers()
+
+        logger.info(
+            "Pre-fork master %s listening on %s:%s with %s workers",
+            os.getpid(), self.host, self.port, self.workers,
+        )
+        for _ in range(self.workers):
+            self.spawn_worker()
+
+        try:
+            while not self._stopping:
+                self._wait_for_signal(timeout=1.0)
+                self._handle_signals()
+                self._reap_workers()
+                self._maintain_workers()
+        finally:
+            self.stop()
+            if metrics_dir is not None:
+                shutil.rmtree(metrics_dir, ignore_errors=True)
+            if generations_file is not None:
+                os.unlink(generations_file)
+        return 0
+
+    def spawn_worker(self, ready_pipe: tuple[int, int] | None = None) -> int:
+        """
+        Fork a worker. With ``ready_pipe``, the worker writes to its write end
+        once the application has started.
+        """
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return pid
+
+        # worker process, never returns.
+        exit_code = 0
+        try:
+            self._run_worker(ready_pipe)
+        except BaseException:  # pylint: disable=broad-exception-caught
+            logger.exception("Worker %s crashed", os.getpid())
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)  # pylint: disable=protected-access
+
+    def _run_worker(self, ready_pipe: tuple[int, int] | None = None):
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD,
+                    signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, signal.SIG_DFL)
+        signal.set_wakeup_fd(-1)
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+
+        gc.enable()
+
+        for hook in self.post_fork_hooks:
+            hook()
+
+        ready_fd = None
+        if ready_pipe is not None:
+            os.close(ready_pipe[0])
+            ready_fd = ready_pipe[1]
+
+        config = uvicorn.Config(
+            self.app,
+            lifespan="on",
+            log_level=self.log_level,
+            **self.uvicorn_options,
+        )
+        _WorkerServer(config, ready_fd).run(sockets=[self.sock])
+
+    def reload(self):
+        """
+        Rolling restart: start a new worker, then retire an old one once the
+        new one has started. Stops at the first worker failing to start.
+        """
+        logger.info("Rolling restart of %s workers", len(self.children))
+        for old_pid in list(self.children):
+            if old_pid not in self.children:
+                continue
+            if not self._spawn_ready_worker():
+                logger.error("Rolling restart aborted, a new worker did not start")
+                return
+            self._retire(old_pid)
+
+    def _spawn_ready_worker(self) -> bool:
+        """
+        Spawn a worker and wait until its application has started, False
+        when it exits or does not start within ``graceful_timeout``.
+        """
+        ready_r, ready_w = os.pipe()
+        try:
+            pid = self.spawn_worker((ready_r, ready_w))
+        finally:
+            os.close(ready_w)
+        try:
+            deadline = time.monotonic() + self.graceful_timeout
+            while time.monotonic() < deadline:
+                ready, _, _ = select.select([ready_r], [], [], 0.1)
+                if ready:
+                    # nothing to read: the worker exited before starting.
+                    return os.read(ready_r, 1) == b"1"
+                self._reap_workers()
+                if pid not in self.children:
+                    return False
+            return False
+        finally:
+            os.close(ready_r)
+
+    def stop(self):
+        self._stopping = True
+        if not self.children:
+            return
+        for pid in list(self.children):
+            self._kill(pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            self._reap_workers()
+            time.sleep(0.1)
+
+        for pid in list(self.children):
+            self._kill(pid, signal.SIGKILL)
+        self._reap_workers(block=True)
+
+    def _retire(self, pid: int):
+        self._retiring.add(pid)
+        self._kill(pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.graceful_timeout
+        while pid in self.children and time.monotonic() < deadline:
+            self._reap_workers()
+            time.sleep(0.05)
+
+        if pid in self.children:
+            self._kill(pid, signal.SIGKILL)
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+            self.children.pop(pid, None)
+            self._retiring.discard(pid)
+
+    def _kill(self, pid: int, sig: int):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            self.children.pop(pid, None)
+
+    def _reap_workers(self, block: bool = False):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if not pid:
+                return
+            self.children.pop(pid, None)
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+            elif not self._stopping:
+                logger.warning(
+                    "Worker %s exited with code %s", pid, os.waitstatus_to_exitcode(status)
+                )
+
+    def _maintain_workers(self):
+        if self._stopping:
+            return
+        while len(self.children) - len(self._retiring) < self.workers:
+            self.spawn_worker()
+        while len(self.children) - len(self._retiring) > self.workers:
+            self._retire(max(self.children, key=self.children.get))
+
+    def _install_signal_handlers(self):
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        for fd in (self._wakeup_r, self._wakeup_w):
+            os.set_blocking(fd, False)
+
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, self._signal_handler)
+        signal.signal(signal.SIGCHLD, self._signal_handler)
+
+    def _signal_handler(self, sig, frame):  # pylint: disable=unused-argument
+        if sig != signal.SIGCHLD:
+            self._signals.append(sig)
+        try:
+            os.write(self._wakeup_w, b".")
+        except OSError:
+            pass
+
+    def _wait_for_signal(self, timeout: float):
+        try:
+            ready, _, _ = select.select([self._wakeup_r], [], [], timeout)
+            if ready:
+                while os.read(self._wakeup_r, 64):
+                    pass
+        except OSError as exc:
+            if exc.errno not in (errno.EAGAIN, errno.EINTR):
+                raise
+
+    def _handle_signals(self):
+        while self._signals:
+            sig = self._signals.pop(0)
+            if sig in (signal.SIGTERM, signal.SIGINT):
+                logger.info("Shutting down pre-fork master %s", os.getpid())
+                self._stopping = True
+                return
+            if sig == signal.SIGHUP:
+                self.reload()
+            elif sig == signal.SIGTTIN:
+                self.workers += 1
+            elif sig == signal.SIGTTOU and self.workers > 1:
+                self.workers -= 1
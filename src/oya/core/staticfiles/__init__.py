@@ -0,0 +1,108 @@
+"""
+Static asset pipeline.
+
+The ``collectstatic`` command collects the ``DIRS`` of every ``STATIC_FILES``
+entry into ``STATIC_ROOT`` (under the ``PATH`` of the entry): hashed names,
+a manifest and precompressed variants, see ``oya.core.staticfiles.collect``.
+Once collected, the entry is served from there by ``CollectedStaticFiles``,
+and ``static_url()`` gives the hashed URL of a file::
+
+    static_url("css/app.css")      # "/static/css/app.3f2a9c01d2e4.css"
+"""
+
+from functools import lru_cache
+from pathlib import Path
+
+from litestar.file_system import BaseLocalFileSystem
+from litestar.static_files.config import StaticFilesConfig
+
+from oya.conf import settings
+from oya.core.staticfiles.collect import MANIFEST_NAME, collect_static, load_manifest
+from oya.core.staticfiles.handler import CollectedStaticFiles, CollectedStaticFilesConfig
+
+
+__all__ = (
+    "CollectedStaticFiles",
+    "CollectedStaticFilesConfig",
+    "MANIFEST_NAME",
+    "collect_static",
+    "get_collected_config",
+    "get_static_root",
+    "load_manifest",
+    "static_url",
+)
+
+
+def get_static_root(config: StaticFilesConfig) -> Path | None:
+    """
+    Return the collected tree of a static files entry, None when
+    ``settings.STATIC_ROOT`` is not set.
+    """
+    root = getattr(settings, "STATIC_ROOT", None)
+    if not root:
+        return None
+    return Path(root) / config.path.strip("/")
+
+
+def get_collected_config(config: StaticFilesConfig) -> StaticFilesConfig:
+    """
+    Return the config serving the collected tree of ``config`` once
+    collected, ``config`` itself otherwise.
+    """
+    root = get_static_root(config)
+    if (
+        root is None
+        or isinstance(config, CollectedStaticFilesConfig)
+        or type(config.file_system) is not BaseLocalFileSystem  # pylint: disable=unidiomatic-typecheck
+        or not (root / MANIFEST_NAME).is_file()
+    ):
+        return config
+
+    return CollectedStaticFilesConfig(
+        path=config.path,
+        directories=config.directories,
+        html_mode=config.html_mode,
+        name=config.name,
+        opt=config.opt,
+        guards=config.guards,
+        exception_handlers=config.exception_handlers,
+        send_as_attachment=config.send_as_attachment,
+        root=root,
+        max_age=getattr(settings, "STATIC_MAX_AGE", 0),
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_paths(root: Path) -> dict[str, str]:
+    manifest = load_manifest(root)
+    return manifest["paths"] if manifest else {}
+
+
+def static_url(name: str, path: str | None = None) -> str:
+    """
+    Return the URL of the static file ``name``, its hashed name when
+    collected.
+
+    Args:
+        name (str): file name, relative to the static directories.
+        path (str | None): ``PATH`` of the static files entry, the first
+            entry by default.
+
+    Returns:
+        str
+    """
+    # imported here, the application module imports this package.
+    from oya.apps.asgi.utils import get_static_file_config  # pylint: disable=import-outside-toplevel
+
+    name = name.lstrip("/")
+    configs = get_static_file_config()
+    for config in configs:
+        if path is not None and config.path != path.rstrip("/"):
+            continue
+        root = get_static_root(config)
+        hashed = _get_paths(root).get(name) if root is not None else None
+        if hashed is not None or path is not None:
+            return f"{config.path.rstrip('/')}/{hashed or name}"
+
+    prefix = configs[0].path.rstrip("/") if configs else ""
+    return f"{prefix}/{name}"
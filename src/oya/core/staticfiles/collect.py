@@ -0,0 +1,166 @@
+"""
+Collection of the static files into ``STATIC_ROOT``.
+
+Every file gets a content-hashed name (``css/app.css`` is written as
+``css/app.3f2a9c01d2e4.css``), along with its precompressed ``.br`` and
+``.gz`` variants when smaller. The manifest (``staticfiles.json``) maps the
+names to the hashed files. The hashed files of the previous collections are
+kept (and served), so the pages rendered by the old workers of a rolling
+deploy still find their assets, unless the output tree is cleared.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+from pathlib import Path
+from typing import Iterable
+
+from oya.utils.http import is_compressible
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+__all__ = (
+    "MANIFEST_NAME",
+    "collect_static",
+    "load_manifest",
+)
+
+
+logger = logging.getLogger("oya.staticfiles")
+
+MANIFEST_NAME = "staticfiles.json"
+MANIFEST_VERSION = 1
+
+# compression of a variant, and its file suffix.
+ENCODINGS = {
+    "br": ".br",
+    "gzip": ".gz",
+}
+MIN_COMPRESS_SIZE = 256
+# a variant is kept when it saves at least this ratio.
+MIN_COMPRESS_RATIO = 0.95
+
+
+def _compress(encoding: str, data: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _hashed_name(name: str, digest: str) -> str:
+    path = Path(name)
+    return path.with_name(f"{path.stem}.{digest}{path.suffix}").as_posix()
+
+
+def _write(path: Path, data: bytes, replace: bool = False):
+    if not replace and path.exists() and path.stat().st_size == len(data):
+        # hashed names: same name and size, same content.
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _iter_files(directories: Iterable[str | Path]) -> Iterable[tuple[str, Path]]:
+    seen: set[str] = set()
+    for directory in directories:
+        directory = Path(directory)
+        if not directory.is_dir():
+            logger.warning("Static directory %s does not exist.", directory)
+            continue
+        for path in sorted(directory.rglob("*")):
+            if not path.is_file():
+                continue
+            name = path.relative_to(directory).as_posix()
+            # the first directory wins, as when serving them.
+            if name not in seen:
+                seen.add(name)
+                yield name, path
+
+
+def collect_static(
+    directories: Iterable[str | Path],
+    output: str | Path,
+    encodings: Iterable[str] = ("br", "gzip"),
+    clear: bool = False,
+) -> dict:
+    """
+    Copy the files of ``directories`` into ``output`` under hashed names,
+    with their compressed variants, and write the manifest.
+
+    Args:
+        directories (Iterable[str | Path]): source directories, by priority.
+        output (str | Path): output tree.
+        encodings (Iterable[str]): variants to generate, ``br`` is skipped
+            when the brotli package is not installed.
+        clear (bool): delete the output tree first.
+
+    Returns:
+        dict: the manifest
+    """
+    output = Path(output)
+    if clear and output.exists():
+        shutil.rmtree(output)
+    output.mkdir(parents=True, exist_ok=True)
+
+    encodings = [encoding for encoding in encodings if encoding in ENCODINGS]
+    if "br" in encodings and brotli is None:
+        logger.warning("brotli is not installed, the .br variants are not generated.")
+        encodings.remove("br")
+
+    # hashed files of the previous collections, still served.
+    previous = None if clear else load_manifest(output)
+    files: dict[str, dict] = {
+        hashed: entry
+        for hashed, entry in (previous or {}).get("files", {}).items()
+        if (output / hashed).is_file()
+    }
+    paths: dict[str, str] = {}
+
+    for name, source in _iter_files(directories):
+        data = source.read_bytes()
+        digest = hashlib.blake2b(data, digest_size=6).hexdigest()
+        hashed = _hashed_name(name, digest)
+        paths[name] = hashed
+        if hashed in files:
+            continue
+        _write(output / hashed, data)
+
+        variants: dict[str, int] = {}
+        content_type = mimetypes.guess_type(name)[0]
+        if len(data) >= MIN_COMPRESS_SIZE and is_compressible(content_type):
+            for encoding in encodings:
+                compressed = _compress(encoding, data)
+                if len(compressed) <= len(data) * MIN_COMPRESS_RATIO:
+                    _write(output / (hashed + ENCODINGS[encoding]), compressed)
+                    variants[encoding] = len(compressed)
+
+        files[hashed] = {"digest": digest, "size": len(data), "encodings": variants}
+
+    manifest = {"version": MANIFEST_VERSION, "paths": paths, "files": files}
+    _write(output / MANIFEST_NAME, json.dumps(manifest, indent=1, sort_keys=True).encode(), replace=True)
+    return manifest
+
+
+def load_manifest(root: str | Path) -> dict | None:
+    """
+    Return the manifest of the output tree ``root``, None when there is no
+    (or an incompatible) manifest.
+    """
+    path = Path(root) / MANIFEST_NAME
+    try:
+        manifest = json.loads(path.read_bytes())
+    except FileNotFoundError:
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
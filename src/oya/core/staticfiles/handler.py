@@ -0,0 +1,202 @@
+"""
+Handler serving a collected static tree.
+
+The hashed names are served with ``Cache-Control: immutable`` for a year,
+the original names (revalidated with their ETag) for ``STATIC_MAX_AGE``
+seconds. The precompressed variant matching ``Accept-Encoding`` is sent as
+is, through the ``http.response.pathsend`` or ``http.response.zerocopysend``
+ASGI extensions when the server supports them.
+"""
+
+import asyncio
+import mimetypes
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from litestar.enums import ScopeType
+from litestar.exceptions import MethodNotAllowedException, NotFoundException
+from litestar.handlers import asgi
+from litestar.handlers.asgi_handlers import ASGIRouteHandler
+from litestar.static_files.config import StaticFilesConfig
+from litestar.types import Receive, Scope, Send
+
+from oya.core.exceptions import ImproperlyConfigured
+from oya.core.staticfiles.collect import ENCODINGS, load_manifest
+from oya.utils.http import choose_encoding
+
+
+__all__ = (
+    "CollectedStaticFiles",
+    "CollectedStaticFilesConfig",
+)
+
+
+IMMUTABLE_CACHE_CONTROL = b"public, max-age=31536000, immutable"
+CHUNK_SIZE = 256 * 1024
+
+
+class _Variant:
+    __slots__ = ("path", "size", "etag", "encoding")
+
+    def __init__(self, path: str, size: int, etag: bytes, encoding: str | None):
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.encoding = encoding
+
+
+class _Asset:
+    __slots__ = ("headers", "identity", "variants", "encodings")
+
+    def __init__(self, headers: list[tuple[bytes, bytes]], identity: _Variant, variants: dict[str, _Variant]):
+        self.headers = headers
+        self.identity = identity
+        self.variants = variants
+        # brotli first, the smaller.
+        self.encodings = tuple(encoding for encoding in ENCODINGS if encoding in variants)
+
+
+def _disposition(disposition: bytes, name: str) -> tuple[bytes, bytes]:
+    return b"content-disposition", b'%s; filename="%s"' % (disposition, Path(name).name.encode())
+
+
+class CollectedStaticFiles:
+    """
+    ASGI app serving the files of the manifest of ``root``.
+
+    Args:
+        root (str | Path): collected tree.
+        html_mode (bool): serve ``index.html`` for the directories.
+        send_as_attachment (bool): send a ``Content-Disposition: attachment``.
+        max_age (int): cache lifetime of the files requested by their
+            original name.
+    """
+
+    def __init__(self, root: str | Path, html_mode: bool = False, send_as_attachment: bool = False, max_age: int = 0):
+        manifest = load_manifest(root)
+        if manifest is None:
+            raise ImproperlyConfigured(f"No static manifest in {root}, run the collectstatic command.")
+        self.root = Path(root).resolve()
+        self.html_mode = html_mode
+        self.assets: dict[str, _Asset] = {}
+
+        disposition = b"attachment" if send_as_attachment else b"inline"
+        hashed_assets: dict[str, tuple[list, _Variant, dict]] = {}
+        for hashed, entry in manifest["files"].items():
+            content_type = mimetypes.guess_type(hashed)[0] or "application/octet-stream"
+            if content_type.startswith("text/") or content_type == "application/javascript":
+                content_type += "; charset=utf-8"
+            path = str(self.root / hashed)
+            digest = entry["digest"]
+            identity = _Variant(path, entry["size"], f'"{digest}"'.encode(), None)
+            variants = {
+                encoding: _Variant(path + ENCODINGS[encoding], size, f'"{digest}-{encoding}"'.encode(), encoding)
+                for encoding, size in entry["encodings"].items()
+                if encoding in ENCODINGS
+            }
+            headers = [(b"content-type", content_type.encode())]
+            if variants:
+                headers.append((b"vary", b"accept-encoding"))
+            hashed_assets[hashed] = (headers, identity, variants)
+            self.assets[hashed] = _Asset(
+                [*headers, _disposition(disposition, hashed), (b"cache-control", IMMUTABLE_CACHE_CONTROL)],
+                identity,
+                variants,
+            )
+
+        revalidate = (b"cache-control", b"public, max-age=%d, must-revalidate" % max_age)
+        for name, hashed in manifest["paths"].items():
+            headers, identity, variants = hashed_assets[hashed]
+            self.assets[name] = _Asset([*headers, _disposition(disposition, name), revalidate], identity, variants)
+
+    def _get_asset(self, path: str) -> _Asset | None:
+        name = path.strip("/")
+        asset = self.assets.get(name)
+        if asset is None and self.html_mode:
+            asset = self.assets.get(f"{name}/index.html" if name else "index.html")
+        return asset
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != ScopeType.HTTP or scope["method"] not in {"GET", "HEAD"}:
+            raise MethodNotAllowedException()
+
+        asset = self._get_asset(scope["path"])
+        if asset is None:
+            raise NotFoundException(f"no file matches the path {scope['path']}")
+
+        accept_encoding = if_none_match = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+            elif name == b"if-none-match":
+                if_none_match = value
+
+        encoding = choose_encoding(accept_encoding, asset.encodings)
+        variant = asset.variants[encoding] if encoding else asset.identity
+        headers = [*asset.headers, (b"etag", variant.etag)]
+        if variant.encoding:
+            headers.append((b"content-encoding", variant.encoding.encode()))
+
+        if if_none_match is not None and variant.etag in {
+            tag.strip().removeprefix(b"W/") for tag in if_none_match.split(b",")
+        }:
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        headers.append((b"content-length", str(variant.size).encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await self._send_file(scope, send, variant)
+
+    @staticmethod
+    async def _send_file(scope: Scope, send: Send, variant: _Variant):
+        extensions = scope.get("extensions") or {}
+        if "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": variant.path})  # type: ignore[typeddict-item]
+            return
+
+        with open(variant.path, "rb") as file:
+            if "http.response.zerocopysend" in extensions:
+                await send({"type": "http.response.zerocopysend", "file": file, "count": variant.size})  # type: ignore[typeddict-item]
+                return
+
+            # the tail (most files at all) is read in the loop, from the page
+            # cache, rather than paying for a thread hop.
+            remaining = variant.size
+            while True:
+                chunk = await asyncio.to_thread(file.read, CHUNK_SIZE) if remaining > CHUNK_SIZE else file.read()
+                remaining -= len(chunk)
+                more_body = bool(chunk) and remaining > 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                if not more_body:
+                    return
+
+
+@dataclass
+class CollectedStaticFilesConfig(StaticFilesConfig):
+    """
+    ``StaticFilesConfig`` served from the collected tree ``root``.
+    """
+
+    root: Any = None
+    max_age: int = 0
+
+    def to_static_files_app(self) -> ASGIRouteHandler:
+        static_files = CollectedStaticFiles(
+            self.root,
+            html_mode=self.html_mode,
+            send_as_attachment=self.send_as_attachment,
+            max_age=self.max_age,
+        )
+        return asgi(
+            path=self.path,
+            name=self.name,
+            is_static=True,
+            opt=self.opt,
+            guards=self.guards,
+            exception_handlers=self.exception_handlers,
+        )(static_files)
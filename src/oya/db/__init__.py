@@ -17,12 +17,14 @@ from tortoise import (
 )
 
 from oya.db.extras.models import ClosureModel
+from oya.db.cache import CachedManager
 
 
 __all__ = [
     'models',
     'fields',
     'ClosureModel',
+    'CachedManager',
     'indexes',
     'contrib',
     'timezone',
@@ -0,0 +1,327 @@
+"""
+Query result cache, enabled with ``settings.QUERY_CACHE_ENABLED``.
+
+Models using ``CachedManager`` get a ``cached()`` queryset modifier::
+
+    class Category(models.Model):
+        ...
+
+        class Meta:
+            manager = CachedManager()
+
+    categories = await Category.filter(active=True).cached(300)
+    names = await Category.all().cached().values_list("name", flat=True)
+
+The rows returned by the database are memoized, keyed by the compiled SQL,
+its parameters and the generations of the tables it reads. Every INSERT,
+UPDATE or DELETE executed through Tortoise bumps the generation of its table
+(see ``oya.db.instrumentation``), so a write invalidates the cached reads of
+this table at once. Writes in a transaction bump the generation once it is
+committed (see ``oya.db.commit``), none when it is rolled back, and the reads
+made in a transaction are not cached: they see its uncommitted rows.
+Statements run outside of Tortoise are only caught up by the TTL.
+
+Generations live in a shared memory file (``QUERY_CACHE_GENERATIONS_FILE``,
+created by the pre-fork server), so a write in a worker invalidates the
+entries of the others. The rows are kept in process, and in the
+``QUERY_CACHE_STORE`` of ``CACHES`` when set to share them between the
+workers.
+"""
+
+import functools
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from tortoise.backends.base.client import BaseTransactionWrapper
+from tortoise.manager import Manager
+from tortoise.queryset import QuerySet
+
+from oya.conf import settings
+from oya.db.commit import queue_on_commit
+from oya.db.instrumentation import QueryEvent, add_query_hook
+
+
+__all__ = (
+    "CachedManager",
+    "CachedQuerySet",
+    "enable_query_cache",
+    "get_generations",
+)
+
+
+logger = logging.getLogger("oya.db.cache")
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 1000
+SLOTS = 4096
+
+_IDENT = r"[`\"\[]?(\w+)[`\"\]]?"
+_QUALIFIED = rf"(?:[`\"\[]?\w+[`\"\]]?\.)?{_IDENT}"
+_READ_RE = re.compile(rf"\b(?:FROM|JOIN)\s+{_QUALIFIED}", re.IGNORECASE)
+_WRITE_RE = re.compile(
+    rf"^\s*(?:INSERT\s+(?:OR\s+\w+\s+|IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?)"
+    rf"\s+{_QUALIFIED}",
+    re.IGNORECASE,
+)
+
+
+@functools.lru_cache(maxsize=2048)
+def read_tables(sql: str) -> tuple[str, ...]:
+    if _WRITE_RE.match(sql):
+        return ()
+    return tuple(sorted({table.lower() for table in _READ_RE.findall(sql)}))
+
+
+@functools.lru_cache(maxsize=2048)
+def written_table(sql: str) -> str | None:
+    match = _WRITE_RE.match(sql)
+    return match.group(1).lower() if match else None
+
+
+class Generations:
+    """
+    Generation counters of the tables, hashed in a fixed number of slots.
+    A collision only invalidates more than needed.
+
+    Args:
+        path (str | None): file shared by the processes, anonymous memory
+            (shared with the processes forked later) when None.
+    """
+
+    def __init__(self, path: str | None = None):
+        size = SLOTS * 8
+        if path:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+                self._mmap = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        else:
+            self._mmap = mmap.mmap(-1, size)
+        self._slots = memoryview(self._mmap).cast("Q")
+
+    @staticmethod
+    def slot(table: str) -> int:
+        return zlib.crc32(table.encode()) % SLOTS
+
+    def get(self, tables: tuple[str, ...]) -> tuple[int, ...]:
+        slots = self._slots
+        return tuple(slots[self.slot(table)] for table in tables)
+
+    def bump(self, table: str):
+        # a new value rather than an increment: concurrent bumps of two
+        # processes never end up on the same generation.
+        index = self.slot(table)
+        self._slots[index] = max(time.time_ns(), self._slots[index] + 1)
+
+
+_generations: Generations | None = None
+
+
+def get_generations() -> Generations:
+    global _generations  # pylint: disable=global-statement
+    if _generations is None:
+        _generations = Generations(
+            getattr(settings, "QUERY_CACHE_GENERATIONS_FILE", None) or os.environ.get("OYA_QUERY_CACHE_FILE")
+        )
+    return _generations
+
+
+class _ResultCache:
+    """
+    Rows of the cached queries, in process and in the optional shared store.
+    """
+
+    def __init__(self):
+        self.max_entries: int = getattr(settings, "QUERY_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+        self.entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._store = None
+        self._store_name: str | None = getattr(settings, "QUERY_CACHE_STORE", None)
+
+    @property
+    def store(self):
+        if self._store is None and self._store_name:
+            from oya.core.cache import get_cache_store  # pylint: disable=import-outside-toplevel
+
+            self._store = get_cache_store(self._store_name)
+        return self._store
+
+    async def fetch(self, key: tuple, compute: Callable[[], Awaitable[Any]], ttl: int) -> Any:
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self.entries[key]
+
+        computed = False
+
+        async def run():
+            nonlocal computed
+            computed = True
+            return await compute()
+
+        if self.store is not None:
+            async def dump():
+                return pickle.dumps(await run())
+
+            raw = await self.store.get_or_set(_store_key(key), dump, ttl)
+            result = pickle.loads(raw)  # nosec: written by this application
+        else:
+            result = await run()
+
+        if computed:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.entries[key] = (time.monotonic() + ttl, result)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return result
+
+
+def _store_key(key: tuple) -> str:
+    return "oya-query:" + hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+
+
+_results: _ResultCache | None = None
+
+
+def _get_results() -> _ResultCache:
+    global _results  # pylint: disable=global-statement
+    if _results is None:
+        _results = _ResultCache()
+    return _results
+
+
+def _params_key(values: list | None) -> str | None:
+    # a digest: the parameters can be lists or dicts, which are not hashable.
+    if not values:
+        return None
+    return hashlib.blake2b(repr(values).encode(), digest_size=16).hexdigest()
+
+
+def _copy_rows(rows) -> list[dict]:
+    # the callers transform the rows in place (ValuesQuery).
+    return [dict(row) for row in rows]
+
+
+class _CachingClient:
+    """
+    Client proxy answering the reads from the result cache.
+    """
+
+    __slots__ = ("_model", "_using", "_ttl")
+
+    def __init__(self, model, using, ttl: int):
+        self._model = model
+        self._using = using
+        self._ttl = ttl
+
+    @property
+    def _client(self):
+        # resolved when the query runs, not when the queryset is built.
+        if self._using is not None:
+            return self._using
+        return self._model._choose_db()  # pylint: disable=protected-access
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
+
+    async def _fetch(self, method: str, query: str, values: list | None) -> Any:
+        tables = read_tables(query)
+        if not tables:
+            return None
+        client = self._client
+        if isinstance(client, BaseTransactionWrapper):
+            return None
+        execute = getattr(client, method)
+        key = (client.connection_name, method, query, _params_key(values), get_generations().get(tables))
+
+        async def compute():
+            result = await execute(query, values)
+            if method == "execute_query":
+                return result[0], _copy_rows(result[1])
+            return _copy_rows(result)
+
+        return await _get_results().fetch(key, compute, self._ttl)
+
+    async def execute_query(self, query: str, values: list | None = None) -> tuple[int, list[dict]]:
+        result = await self._fetch("execute_query", query, values)
+        if result is None:
+            return await self._client.execute_query(query, values)
+        return result[0], _copy_rows(result[1])
+
+    async def execute_query_dict(self, query: str, values: list | None = None) -> list[dict]:
+        result = await self._fetch("execute_query_dict", query, values)
+        if result is None:
+            return await self._client.execute_query_dict(query, values)
+        return _copy_rows(result)
+
+
+class CachedQuerySet(QuerySet):
+    __slots__ = ()
+
+    def cached(self, ttl: int | None = None) -> "CachedQuerySet":
+        """
+        Memoize the rows of this query (and of the queries derived from it:
+        ``values()``, ``count()``, ``get()``, prefetches) for ``ttl``
+        seconds, ``settings.QUERY_CACHE_DEFAULT_TTL`` by default. The
+        connection is chosen when the query runs, unless set by ``using_db()``.
+        """
+        if not getattr(settings, "QUERY_CACHE_ENABLED", False) or self._select_for_update:
+            return self
+        queryset = self._clone()
+        using = self._db
+        if isinstance(using, _CachingClient):
+            using = using._using  # pylint: disable=protected-access
+        elif using is self.model._choose_db():  # pylint: disable=protected-access
+            # the default connection set by Tortoise, chosen again when the query runs.
+            using = None
+        if ttl is None:
+            ttl = getattr(settings, "QUERY_CACHE_DEFAULT_TTL", DEFAULT_TTL)
+        queryset._db = _CachingClient(self.model, using, ttl)
+        return queryset
+
+
+class CachedManager(Manager):
+    """
+    Manager whose querysets have the ``cached()`` modifier.
+    """
+
+    def get_queryset(self) -> CachedQuerySet:
+        return CachedQuerySet(self._model)
+
+
+def _track_writes(event: QueryEvent):
+    if event.error is None:
+        table = written_table(event.sql)
+        if table is not None:
+            async def bump():
+                get_generations().bump(table)
+
+            # the rows are visible to the other connections once committed.
+            if not queue_on_commit(bump, event.client):
+                get_generations().bump(table)
+
+
+def enable_query_cache():
+    """
+    Track the writes invalidating the cached queries, called once Tortoise is
+    initialized.
+    """
+    if getattr(settings, "QUERY_CACHE_ENABLED", False):
+        add_query_hook(_track_writes)
@@ -0,0 +1,74 @@
+"""
+Callbacks run once a transaction is committed.
+
+``on_commit()`` runs a coroutine function after the commit of the
+transaction of a connection, at once outside of a transaction. The callbacks
+of a transaction rolled back are dropped::
+
+    async with in_transaction() as connection:
+        await post.save(using_db=connection)
+        await on_commit(notify_subscribers, connection)
+"""
+
+import logging
+from typing import Any, Awaitable, Callable
+
+from tortoise.backends.base.client import BaseTransactionWrapper
+
+
+__all__ = ("on_commit", "queue_on_commit")
+
+
+logger = logging.getLogger("oya.db")
+
+_CALLBACKS = "_oya_on_commit"
+
+
+def _hook(wrapper: Any) -> list[Callable[[], Awaitable[Any]]]:
+    # the outermost transaction commits, the nested ones share its wrapper.
+    callbacks = wrapper.__dict__.get(_CALLBACKS)
+    if callbacks is not None:
+        return callbacks
+
+    callbacks = []
+    commit, rollback = wrapper.commit, wrapper.rollback
+
+    async def commit_then_run():
+        await commit()
+        queued = list(callbacks)
+        callbacks.clear()
+        for callback in queued:
+            try:
+                await callback()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("on_commit callback %r failed", callback)
+
+    async def rollback_and_drop():
+        callbacks.clear()
+        await rollback()
+
+    setattr(wrapper, _CALLBACKS, callbacks)
+    wrapper.commit = commit_then_run
+    wrapper.rollback = rollback_and_drop
+    return callbacks
+
+
+def queue_on_commit(callback: Callable[[], Awaitable[Any]], connection: Any) -> bool:
+    """
+    Queue ``callback()`` to run once the transaction of ``connection`` is
+    committed, from synchronous code. Return False, without queueing it, when
+    ``connection`` is not in a transaction.
+    """
+    if isinstance(connection, BaseTransactionWrapper) and not connection._finalized:  # pylint: disable=protected-access
+        _hook(connection).append(callback)
+        return True
+    return False
+
+
+async def on_commit(callback: Callable[[], Awaitable[Any]], connection: Any = None) -> None:
+    """
+    Run ``callback()`` once the transaction of ``connection`` is committed,
+    at once when ``connection`` is not in a transaction.
+    """
+    if not queue_on_commit(callback, connection):
+        await callback()
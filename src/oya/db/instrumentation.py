@@ -0,0 +1,179 @@
+"""
+Instrumentation of the Tortoise clients.
+
+The query methods of the client classes are wrapped once, at class level, and
+every executed statement is reported to the registered hooks as a
+``QueryEvent``. While no hook is registered the wrappers only add a single
+check to each query.
+"""
+
+import functools
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+
+__all__ = (
+    "QueryEvent",
+    "add_query_hook",
+    "fingerprint",
+    "instrument_clients",
+    "remove_query_hook",
+    "suspend_instrumentation",
+)
+
+
+logger = logging.getLogger("oya.db.instrumentation")
+
+QUERY_METHODS = ("execute_query", "execute_query_dict", "execute_insert", "execute_many")
+
+_hooks: list[Callable[["QueryEvent"], Any]] = []
+
+_suspended: ContextVar[bool] = ContextVar("oya_db_instrumentation_suspended", default=False)
+
+
+class QueryEvent:
+    """
+    A statement executed by a Tortoise client.
+    """
+
+    __slots__ = ("client", "method", "sql", "values", "start", "duration", "error")
+
+    def __init__(self, client, method, sql, values, start, duration, error):
+        self.client: BaseDBAsyncClient = client
+        self.method: str = method
+        self.sql: str = sql
+        self.values: list | None = values
+        self.start: float = start          # time.perf_counter()
+        self.duration: float = duration    # seconds
+        self.error: BaseException | None = error
+
+    @property
+    def connection_name(self) -> str:
+        return self.client.connection_name
+
+    @property
+    def fingerprint(self) -> str:
+        return fingerprint(self.sql)
+
+
+def add_query_hook(hook: Callable[[QueryEvent], Any]):
+    """
+    Register a callable called with a ``QueryEvent`` after each statement.
+
+    Hooks run inline on the event loop and must stay cheap, slow work should be
+    scheduled as a task.
+    """
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_query_hook(hook: Callable[[QueryEvent], Any]):
+    try:
+        _hooks.remove(hook)
+    except ValueError:
+        pass
+
+
+@contextmanager
+def suspend_instrumentation():
+    """
+    Do not report the statements executed inside the block, e.g. an ``EXPLAIN``
+    run by a hook.
+    """
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"\$\d+|%s|\?")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES_RE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(sql: str) -> str:
+    """
+    Normalize a statement so that the executions differing only by their
+    parameters share the same fingerprint.
+
+    Args:
+        sql (str): statement
+
+    Returns:
+        str: normalized statement
+    """
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _PLACEHOLDER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("(...)", sql)
+    return _SPACES_RE.sub(" ", sql).strip()
+
+
+def _dispatch(event: QueryEvent):
+    for hook in _hooks:
+        try:
+            hook(event)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Query hook %r failed", hook)
+
+
+def _wrap(method, name: str):
+    @functools.wraps(method)
+    async def wrapper(self, query, *args, **kwargs):
+        if not _hooks or _suspended.get():
+            return await method(self, query, *args, **kwargs)
+
+        error = None
+        start = time.perf_counter()
+        try:
+            return await method(self, query, *args, **kwargs)
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            values = args[0] if args else kwargs.get("values")
+            _dispatch(QueryEvent(self, name, query, values, start, duration, error))
+
+    wrapper.__oya_instrumented__ = True
+    return wrapper
+
+
+def _subclasses(cls: type) -> list[type]:
+    found = [cls]
+    for sub in cls.__subclasses__():
+        found.extend(_subclasses(sub))
+    return found
+
+
+def instrument_client_class(client_class: type):
+    """
+    Wrap the query methods defined by a client class and by its subclasses
+    (the transaction wrappers of the backend).
+    """
+    for cls in _subclasses(client_class):
+        for name in QUERY_METHODS:
+            # the methods inherited by the client class itself are wrapped too.
+            method = getattr(cls, name, None) if cls is client_class else cls.__dict__.get(name)
+            if method is None or getattr(method, "__oya_instrumented__", False):
+                continue
+            setattr(cls, name, _wrap(method, name))
+
+
+def instrument_clients():
+    """
+    Instrument the classes of every initialised connection.
+    """
+    for client in connections.all():
+        instrument_client_class(type(client))
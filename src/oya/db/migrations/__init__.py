@@ -47,8 +47,18 @@ class Command:
             content=get_models_describe(self.app),
         )
 
+    async def ensure_history_table(self):
+        """
+        Create the migration history table on the app connection, needed when
+        the app does not live on the database where initdb was run.
+        """
+        conn = get_app_connection(self.tortoise_config, self.app)
+        sql = conn.schema_generator(conn)._get_table_sql(Migration, True)  # pylint: disable=protected-access
+        await conn.execute_script(sql["table_creation_string"])
+
     async def upgrade(self, run_in_transaction: bool = True):
         migrated = []
+        await self.ensure_history_table()
         for version_file in Migrate.get_all_version_files():
             try:
                 exists = await Migration.exists(version=version_file, app=self.app)
@@ -1,3 +1,4 @@
+import copy
 import importlib.util
 import os
 import re
@@ -41,6 +42,26 @@ def get_app_connection_name(config, app_name: str) -> str:
     raise LookupError(f'Can\'t get app named "{app_name}"')
 
 
+def get_connection_config(config, app_name: str, connection: str) -> Dict:
+    """
+    get a copy of the config where the app and the migration history both use
+    the given connection, so each database keeps the history of its own tables
+    :param config:
+    :param app_name:
+    :param connection: connection name, e.g. a shard of the app
+    :return:
+    """
+    config = copy.deepcopy(config)
+    # migrations are always applied on the primary, never through routers.
+    config.pop("routers", None)
+    for name in (app_name, "oya.db.migrations"):
+        app = config.get("apps").get(name)
+        if app is None:
+            raise LookupError(f'Can\'t get app named "{name}"')
+        app["default_connection"] = connection
+    return config
+
+
 def get_app_connection(config, app) -> BaseDBAsyncClient:
     """
     get connection name
@@ -0,0 +1,242 @@
+"""
+Connection pool sizing, warm-up and statistics.
+
+Pool sizes are configured per connection with ``settings.DATABASE_POOLS``::
+
+    DATABASE_POOLS = {
+        "default": {"MIN_SIZE": 5, "MAX_SIZE": 20},
+    }
+"""
+
+import asyncio
+import copy
+import logging
+import time
+from typing import Any
+
+from tortoise import connections
+from tortoise.backends.base.config_generator import expand_db_url
+
+from oya.conf import settings
+from oya.core.exceptions import ImproperlyConfigured
+
+
+__all__ = (
+    "PoolStats",
+    "get_pool_config",
+    "get_pool_stats",
+    "instrument_pools",
+    "pool_stats",
+    "warmup_pools",
+)
+
+
+logger = logging.getLogger("oya.db.pool")
+
+# SQLite has no pool, unknown credentials would be sent as PRAGMAs.
+UNPOOLED_ENGINES = ("tortoise.backends.sqlite",)
+
+DEFAULT_VALIDATION_QUERY = "SELECT 1"
+
+
+class PoolStats:
+    """
+    Statistics of a single connection pool.
+    """
+
+    __slots__ = (
+        "name", "min_size", "max_size", "in_use", "acquired",
+        "wait_time_total", "wait_time_max", "_client",
+    )
+
+    def __init__(self, name: str, client: Any, min_size: int | None, max_size: int | None):
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.in_use = 0
+        self.acquired = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self._client = client
+
+    def record_acquire(self, wait_time: float):
+        self.in_use += 1
+        self.acquired += 1
+        self.wait_time_total += wait_time
+        if wait_time > self.wait_time_max:
+            self.wait_time_max = wait_time
+
+    @property
+    def size(self) -> int | None:
+        pool = getattr(self._client, "_pool", None)
+        if pool is None:
+            return None
+        if hasattr(pool, "get_size"):       # asyncpg
+            return pool.get_size()
+        if hasattr(pool, "get_stats"):      # psycopg_pool
+            return pool.get_stats().get("pool_size")
+        return getattr(pool, "size", None)  # aiomysql, asyncodbc
+
+    @property
+    def idle(self) -> int | None:
+        pool = getattr(self._client, "_pool", None)
+        if pool is None:
+            return None
+        if hasattr(pool, "get_idle_size"):
+            return pool.get_idle_size()
+        if hasattr(pool, "get_stats"):
+            return pool.get_stats().get("pool_available")
+        return getattr(pool, "freesize", None)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "size": self.size,
+            "idle": self.idle,
+            "in_use": self.in_use,
+            "acquired": self.acquired,
+            "wait_time_total": self.wait_time_total,
+            "wait_time_avg": self.wait_time_total / self.acquired if self.acquired else 0.0,
+            "wait_time_max": self.wait_time_max,
+        }
+
+
+# live statistics by connection name, exposed as ``app.state.db_pool_stats``.
+pool_stats: dict[str, PoolStats] = {}
+
+
+class _TimedAcquire:
+    """
+    Wrap the context manager returned by ``client.acquire_connection()``.
+    """
+
+    __slots__ = ("_ctx", "_stats")
+
+    def __init__(self, ctx, stats: PoolStats):
+        self._ctx = ctx
+        self._stats = stats
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        conn = await self._ctx.__aenter__()
+        self._stats.record_acquire(time.perf_counter() - start)
+        return conn
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._stats.in_use -= 1
+        return await self._ctx.__aexit__(exc_type, exc_val, exc_tb)
+
+
+def _get_pool_settings() -> dict[str, dict[str, int]]:
+    pools = getattr(settings, "DATABASE_POOLS", None) or {}
+    if not isinstance(pools, dict):
+        raise ImproperlyConfigured("settings.DATABASE_POOLS must be a dict.")
+    return pools
+
+
+def get_pool_config(tortoise_config: dict) -> dict:
+    """
+    Return a copy of the tortoise config with ``settings.DATABASE_POOLS``
+    applied to the connection credentials.
+
+    Args:
+        tortoise_config (dict): usually ``settings.TORTOISE_ORM``.
+
+    Returns:
+        dict: tortoise config
+    """
+    pools = _get_pool_settings()
+    if not pools:
+        return tortoise_config
+
+    config = copy.deepcopy(tortoise_config)
+    for name, pool in pools.items():
+        try:
+            conn = config["connections"][name]
+        except KeyError as exc:
+            raise ImproperlyConfigured(
+                "settings.DATABASE_POOLS refers to unknown connection '%s'." % name
+            ) from exc
+
+        if isinstance(conn, str):
+            conn = config["connections"][name] = expand_db_url(conn)
+
+        if conn["engine"] in UNPOOLED_ENGINES:
+            continue
+
+        credentials = conn.setdefault("credentials", {})
+        if "MIN_SIZE" in pool:
+            credentials["minsize"] = int(pool["MIN_SIZE"])
+        if "MAX_SIZE" in pool:
+            credentials["maxsize"] = int(pool["MAX_SIZE"])
+
+    return config
+
+
+def instrument_pools():
+    """
+    Track acquisitions of every initialised connection.
+    """
+    for client in connections.all():
+        name = client.connection_name
+        if name in pool_stats and pool_stats[name]._client is client:  # pylint: disable=protected-access
+            continue
+
+        stats = PoolStats(
+            name,
+            client,
+            getattr(client, "pool_minsize", None),
+            getattr(client, "pool_maxsize", None),
+        )
+        acquire = client.acquire_connection
+
+        def acquire_connection(_acquire=acquire, _stats=stats):
+            return _TimedAcquire(_acquire(), _stats)
+
+        client.acquire_connection = acquire_connection
+        pool_stats[name] = stats
+
+
+async def _validate(client, query: str):
+    async with client.acquire_connection() as conn:
+        if hasattr(conn, "fetchval"):       # asyncpg
+            await conn.fetchval(query)
+        elif hasattr(conn, "cursor"):       # aiomysql, aiosqlite, asyncodbc
+            cursor = await conn.cursor()
+            try:
+                await cursor.execute(query)
+                await cursor.fetchall()
+            finally:
+                await cursor.close()
+        else:
+            await client.execute_query(query)
+
+
+async def warmup_pools():
+    """
+    Open the minimum number of connections of every pool and run the
+    validation query on each of them.
+    """
+    query = getattr(settings, "DATABASE_POOL_VALIDATION_QUERY", DEFAULT_VALIDATION_QUERY)
+    for client in connections.all():
+        start = time.perf_counter()
+        if getattr(client, "_pool", True) is None:
+            # create the pool once, concurrent acquisitions would race on it.
+            await client.create_connection(with_db=True)
+
+        # acquiring them concurrently forces distinct connections.
+        count = getattr(client, "pool_minsize", None) or 1
+        await asyncio.gather(*(_validate(client, query) for _ in range(count)))
+
+        logger.info(
+            "Warmed up %s connection(s) of '%s' in %.1fms",
+            count, client.connection_name, (time.perf_counter() - start) * 1000,
+        )
+
+
+def get_pool_stats() -> dict[str, dict[str, Any]]:
+    """
+    Return the statistics of every instrumented pool, by connection name.
+    """
+    return {name: stats.as_dict() for name, stats in pool_stats.items()}
@@ -0,0 +1,164 @@
+"""
+Database routers, enabled with ``settings.DATABASE_ROUTERS``.
+
+``ReplicaRouter`` sends queryset reads to the read replicas of the model's
+connection and writes to the primary::
+
+    DATABASE_ROUTERS = ["oya.db.routers.ReplicaRouter"]
+    DATABASE_REPLICAS = {
+        "default": ["replica_1", "replica_2"],
+    }
+
+Once a write has been routed, the reads of the same request (asyncio task
+context) stick to the primary, so a handler always reads its own writes.
+Reads made inside a transaction always use the primary.
+
+Replicas can be overridden by an ``AppConfig`` or by a model ``Meta`` with
+``read_replicas`` (an empty list disables the replicas) and ``sticky_reads``.
+
+The models of an ``AppConfig`` declaring ``shards`` are partitioned by key,
+``get_shard()`` returns the connection to pass as ``using_db``::
+
+    await Event.create(tenant_id=tenant_id, using_db=get_shard(Event, tenant_id))
+"""
+
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Type
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient, BaseTransactionWrapper
+from tortoise.exceptions import ConfigurationError
+from tortoise.models import Model
+
+from oya.conf import settings
+from oya.core.exceptions import ImproperlyConfigured
+
+
+__all__ = (
+    "ReplicaRouter",
+    "get_shard",
+    "pin_primary",
+    "use_primary",
+)
+
+
+_primary_pinned: ContextVar[bool] = ContextVar("oya_db_primary_pinned", default=False)
+
+
+def pin_primary():
+    """
+    Send the following reads of the current context to the primary.
+    """
+    _primary_pinned.set(True)
+
+
+@contextmanager
+def use_primary():
+    """
+    Send the reads made inside the block to the primary.
+    """
+    token = _primary_pinned.set(True)
+    try:
+        yield
+    finally:
+        _primary_pinned.reset(token)
+
+
+def get_shard(model: Type[Model], key) -> BaseDBAsyncClient:
+    """
+    Return the connection of the shard holding ``key`` for the model.
+
+    Args:
+        model (Type[Model]): model of an app declaring ``shards``.
+        key: shard key of the row, e.g. a tenant id.
+
+    Returns:
+        BaseDBAsyncClient: connection to use as ``using_db``
+    """
+    # imported here, the registry imports the settings of every app.
+    from oya.apps import apps  # pylint: disable=import-outside-toplevel
+
+    app_config = apps.get_app_config(model._meta.app)  # pylint: disable=protected-access
+    return connections.get(app_config.get_shard_connection(model, key))
+
+
+def _in_transaction(connection_name: str) -> bool:
+    try:
+        return isinstance(connections.get(connection_name), BaseTransactionWrapper)
+    except ConfigurationError:
+        return False
+
+
+class _Route:
+    __slots__ = ("primary", "replicas", "sticky", "_cycle")
+
+    def __init__(self, primary: str, replicas: list[str], sticky: bool):
+        self.primary = primary
+        self.replicas = replicas
+        self.sticky = sticky
+        self._cycle = itertools.cycle(replicas) if replicas else None
+
+    def next_replica(self) -> str | None:
+        return next(self._cycle) if self._cycle is not None else None
+
+
+class ReplicaRouter:
+    """
+    Route reads to replicas and writes to the primary.
+    """
+
+    def __init__(self):
+        self._routes: dict[Type[Model], _Route] = {}
+
+    def get_route(self, model: Type[Model]) -> _Route:
+        try:
+            return self._routes[model]
+        except KeyError:
+            route = self._routes[model] = self._resolve(model)
+            return route
+
+    def _resolve(self, model: Type[Model]) -> _Route:
+        # imported here, the registry imports the settings of every app.
+        from oya.apps import apps  # pylint: disable=import-outside-toplevel
+
+        primary = model._meta.default_connection or "default"  # pylint: disable=protected-access
+        replicas = getattr(settings, "DATABASE_REPLICAS", {}).get(primary, [])
+        sticky = True
+
+        try:
+            app_config = apps.get_app_config(model._meta.app)  # pylint: disable=protected-access
+        except LookupError:
+            app_config = None
+
+        for source in (app_config, getattr(model, "Meta", None)):
+            if source is None:
+                continue
+            if getattr(source, "read_replicas", None) is not None:
+                replicas = source.read_replicas
+            if getattr(source, "sticky_reads", None) is not None:
+                sticky = source.sticky_reads
+
+        configured = settings.TORTOISE_ORM["connections"]
+        for replica in replicas:
+            if replica not in configured:
+                raise ImproperlyConfigured(
+                    "Read replica '%s' of '%s' is not in TORTOISE_ORM['connections']."
+                    % (replica, model.__name__)
+                )
+
+        return _Route(primary, list(replicas), sticky)
+
+    def db_for_read(self, model: Type[Model]) -> str | None:
+        route = self.get_route(model)
+        if route.replicas and not (route.sticky and _primary_pinned.get()):
+            if not _in_transaction(route.primary):
+                return route.next_replica()
+        return route.primary
+
+    def db_for_write(self, model: Type[Model]) -> str | None:
+        route = self.get_route(model)
+        if route.sticky:
+            pin_primary()
+        return route.primary
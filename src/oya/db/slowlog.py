@@ -0,0 +1,218 @@
+"""
+Slow query log.
+
+Statements slower than ``settings.SLOW_QUERY_THRESHOLD`` (milliseconds) are
+written as JSON lines to a rotating file together with their call site and the
+plan of the database (``EXPLAIN``, ``EXPLAIN QUERY PLAN`` on SQLite)::
+
+    SLOW_QUERY_THRESHOLD = 100
+    SLOW_QUERY_LOG_FILE = "logs/slow_queries.log"
+
+Counts and durations are aggregated per normalized statement, see
+``get_slow_query_stats()``.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sys
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any
+
+from tortoise import connections
+
+from oya.conf import settings
+from oya.db.instrumentation import QueryEvent, add_query_hook, fingerprint, suspend_instrumentation
+
+
+__all__ = (
+    "SlowQueryLog",
+    "enable_slow_query_log",
+    "get_slow_query_stats",
+)
+
+
+logger = logging.getLogger("oya.db.slowlog")
+
+DEFAULT_LOG_FILE = "slow_queries.log"
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+# frames of these modules are skipped when looking for the call site.
+INTERNAL_MODULES = (
+    "oya.db", "oya.core", "oya.middleware", "oya.apps",
+    "tortoise", "pypika", "asyncio", "litestar", "aiosqlite",
+    "asyncpg", "aiomysql", "psycopg",
+)
+
+
+class SlowQueryStat:
+    __slots__ = ("count", "total", "max", "plan")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.plan: list | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "plan": self.plan,
+        }
+
+
+def params_fingerprint(values: list | None) -> str | None:
+    """
+    Return the types of the parameters and a digest of their values, the
+    values themselves are never logged.
+    """
+    if not values:
+        return None
+    types = ",".join(type(value).__name__ for value in values)
+    digest = hashlib.blake2b(repr(values).encode(), digest_size=6).hexdigest()
+    return f"{types}:{digest}"
+
+
+def get_call_site() -> dict[str, str | None]:
+    """
+    Return the first frame of the stack which does not belong to oya, the ORM
+    or the event loop, with the label of its app.
+    """
+    # imported here, the registry imports the settings of every app.
+    from oya.apps import apps  # pylint: disable=import-outside-toplevel
+
+    frame = sys._getframe(1)  # pylint: disable=protected-access
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(INTERNAL_MODULES):
+            break
+        frame = frame.f_back
+
+    if frame is None:
+        return {"app": None, "endpoint": None, "call_site": None}
+
+    app_label = None
+    for app_config in apps.app_configs.values():
+        if module == app_config.name or module.startswith(app_config.name + "."):
+            app_label = app_config.label
+            break
+
+    code = frame.f_code
+    return {
+        "app": app_label,
+        "endpoint": f"{module}.{getattr(code, 'co_qualname', code.co_name)}",
+        "call_site": f"{code.co_filename}:{frame.f_lineno}",
+    }
+
+
+class SlowQueryLog:
+    """
+    Query hook logging the statements slower than ``threshold`` seconds.
+    """
+
+    def __init__(self, threshold: float, log_file: str, max_bytes: int, backup_count: int):
+        self.threshold = threshold
+        self.stats: dict[str, SlowQueryStat] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+        self.handler = RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        self.handler.setFormatter(logging.Formatter("%(message)s"))
+        self.file_logger = logging.getLogger("oya.db.slowlog.file")
+        self.file_logger.propagate = False
+        self.file_logger.setLevel(logging.INFO)
+        self.file_logger.addHandler(self.handler)
+
+    def __call__(self, event: QueryEvent):
+        if event.duration < self.threshold:
+            return
+
+        key = fingerprint(event.sql)
+        stat = self.stats.get(key)
+        if stat is None:
+            stat = self.stats[key] = SlowQueryStat()
+        stat.count += 1
+        stat.total += event.duration
+        if event.duration > stat.max:
+            stat.max = event.duration
+
+        record = {
+            "time": time.time(),
+            "connection": event.connection_name,
+            "duration_ms": round(event.duration * 1000, 3),
+            "sql": event.sql,
+            "fingerprint": key,
+            "params": params_fingerprint(event.values),
+            "count": stat.count,
+            **get_call_site(),
+        }
+
+        # the plan is captured once per statement, in the background.
+        if stat.plan is None and event.error is None and key[:6].upper() == "SELECT":
+            stat.plan = []
+            task = asyncio.ensure_future(self._explain(event, stat, record))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self._write(record)
+
+    async def _explain(self, event: QueryEvent, stat: SlowQueryStat, record: dict):
+        try:
+            # transactions may be over, the plan is read on the connection itself.
+            client = connections.get(event.connection_name)
+            dialect = client.capabilities.dialect
+            prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+            with suspend_instrumentation():
+                rows = await client.execute_query_dict(prefix + event.sql, event.values)
+            stat.plan = [{key: str(value) for key, value in row.items()} for row in rows]
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            logger.debug("Unable to explain %s: %s", event.sql, exc)
+        record["plan"] = stat.plan
+        self._write(record)
+
+    def _write(self, record: dict):
+        self.file_logger.info(json.dumps(record, default=str))
+
+    def get_stats(self) -> dict[str, dict[str, Any]]:
+        return {sql: stat.as_dict() for sql, stat in self.stats.items()}
+
+
+_slow_query_log: SlowQueryLog | None = None
+
+
+def enable_slow_query_log() -> SlowQueryLog | None:
+    """
+    Register the slow query log when ``settings.SLOW_QUERY_THRESHOLD`` is set.
+    """
+    global _slow_query_log  # pylint: disable=global-statement
+
+    threshold = getattr(settings, "SLOW_QUERY_THRESHOLD", None)
+    if threshold is None:
+        return None
+
+    if _slow_query_log is None:
+        _slow_query_log = SlowQueryLog(
+            threshold / 1000,
+            getattr(settings, "SLOW_QUERY_LOG_FILE", DEFAULT_LOG_FILE),
+            getattr(settings, "SLOW_QUERY_LOG_MAX_BYTES", DEFAULT_MAX_BYTES),
+            getattr(settings, "SLOW_QUERY_LOG_BACKUP_COUNT", DEFAULT_BACKUP_COUNT),
+        )
+        add_query_hook(_slow_query_log)
+    return _slow_query_log
+
+
+def get_slow_query_stats() -> dict[str, dict[str, Any]]:
+    """
+    Return the slow statements aggregated by fingerprint.
+    """
+    if _slow_query_log is None:
+        return {}
+    return _slow_query_log.get_stats()
@@ -5,17 +5,22 @@ from litestar.config.cors import CORSConfig
 from litestar.config.csrf import CSRFConfig
 from litestar.config.allowed_hosts import AllowedHostsConfig
 from litestar.config.compression import CompressionConfig
-from litestar.config.response_cache import ResponseCacheConfig
+from litestar.connection import Request
+from litestar.config.response_cache import ResponseCacheConfig, default_do_cache_predicate
 
 
 from oya.conf import settings
+from oya.core.cache.tags import add_cache_tags
 from oya.core.exceptions import ImproperlyConfigured
+from oya.middleware.builtins.compression import AdaptiveCompressionMiddleware
+from oya.middleware.builtins.hosts import MatchedAllowedHostsConfig, MatchedCORSConfig
 
 
 @cache
 def get_cors_config() -> Type[CORSConfig] | None :
     """
-    Load CORS Config from settings
+    Load CORS Config from settings, the origins are matched with
+    oya.middleware.builtins.hosts.OriginMatcher.
 
     Returns:
         CORSConfig | None
@@ -44,7 +49,7 @@ def get_cors_config() -> Type[CORSConfig] | None :
         _conf['max_age'] = settings.CORS_MAX_AGE
 
     if _conf:
-        return CORSConfig(**_conf)
+        return MatchedCORSConfig(**_conf)
 
     return None
 
@@ -103,7 +108,8 @@ def get_csrf_config() -> Type[CSRFConfig] | None:
 @cache
 def get_allowed_hosts_config() -> Type[AllowedHostsConfig] | None:
     """
-    Load Allowed hosts config from settings
+    Load Allowed hosts config from settings, the hosts are matched with
+    oya.middleware.builtins.hosts.HostMatcher.
 
     Returns:
         AllowedHostsConfig | None
@@ -127,12 +133,13 @@ def get_allowed_hosts_config() -> Type[AllowedHostsConfig] | None:
     if hasattr(settings, 'WWW_REDIRECT'):
         _conf['www_redirect'] = settings.WWW_REDIRECT
 
-    return AllowedHostsConfig(**_conf)
+    return MatchedAllowedHostsConfig(**_conf)
 
 @cache
 def get_compression_config() -> Type[CompressionConfig] | None:
     """
-    Load Conpression config from settings
+    Load Conpression config from settings, settings.COMPRESSION_ADAPTIVE
+    installs oya.middleware.builtins.compression.AdaptiveCompressionMiddleware.
     """
     _conf: Dict[str, Any] = {}
 
@@ -154,10 +161,11 @@ def get_compression_config() -> Type[CompressionConfig] | None:
     if hasattr(settings, 'BROTLI_LGWIN'):
         _conf['brotli_lgwin'] = settings.BROTLI_LGWIN
 
-    if hasattr(settings, ''):
+    if hasattr(settings, 'BROTLI_LGBLOCK'):
         _conf['brotli_lgblock'] = settings.BROTLI_LGBLOCK
 
-    if hasattr(settings, 'COMPRESSION_MIDDLEWARE_CLASS'):
+    # None in the project template: litestar's CompressionMiddleware.
+    if getattr(settings, 'COMPRESSION_MIDDLEWARE_CLASS', None):
         _conf['middleware_class'] = settings.COMPRESSION_MIDDLEWARE_CLASS
 
     if hasattr(settings, 'COMPRESSION_EXCLUDE'):
@@ -166,6 +174,12 @@ def get_compression_config() -> Type[CompressionConfig] | None:
     if hasattr(settings, 'COMPRESSION_EXCLUDE_OPT_KEY'):
         _conf['exclude_opt_key'] = settings.COMPRESSION_EXCLUDE_OPT_KEY
 
+    if getattr(settings, 'COMPRESSION_ADAPTIVE', False):
+        # the adaptive middleware picks the coding itself, the backend is unused.
+        _conf['backend'] = 'gzip'
+        if not _conf.get('middleware_class'):
+            _conf['middleware_class'] = AdaptiveCompressionMiddleware
+
     if _conf:
         return CompressionConfig(**_conf)
     else: return None
@@ -188,6 +202,31 @@ def get_response_cache_config() -> Type[ResponseCacheConfig] | None:
         _conf['store'] = settings.RESPONSE_CACHE_STORE_NAME
 
     if _conf:
-        return ResponseCacheConfig(**_conf)
+        config = ResponseCacheConfig(**_conf)
+        config.cache_response_filter = _get_cache_response_filter(config)
+        return config
 
     return None
+
+
+def _get_cache_response_filter(config: ResponseCacheConfig):
+    """
+    Wrap the response filter to tag the cached responses with the
+    ``cache_tags`` opt of their handler, and so that the requests waiting
+    for a response which is not cached (errors) do not wait for the store
+    lock timeout.
+    """
+
+    def cache_response_filter(scope, status_code: int) -> bool:
+        route_handler = scope["route_handler"]
+        if default_do_cache_predicate(scope, status_code):
+            if "cache_tags" in route_handler.opt:
+                add_cache_tags(route_handler.opt["cache_tags"])
+            return True
+        store = config.get_store_from_app(scope["app"])
+        release = getattr(store, "release", None)
+        if release is not None:
+            release((route_handler.cache_key_builder or config.key_builder)(Request(scope)))
+        return False
+
+    return cache_response_filter
@@ -0,0 +1,39 @@
+"""
+Coalesced response cache.
+
+Installed by ``Application`` with a response cache: the requests of a cached
+route hold a ``TieredStore.lease()`` of their cache key while litestar looks
+the response up and caches it. A single request recomputes an expired
+response, the other ones get the stale response or wait for the new one, and
+the key is released when the request ends, errors and disconnections
+included.
+"""
+
+from litestar.connection import Request
+from litestar.enums import ScopeType
+from litestar.middleware.base import AbstractMiddleware
+from litestar.types import Receive, Scope, Send
+
+
+__all__ = ("ResponseCacheLeaseMiddleware",)
+
+
+class ResponseCacheLeaseMiddleware(AbstractMiddleware):
+    """
+    Hold the lease of the cache key of the cached routes.
+    """
+
+    scopes = {ScopeType.HTTP}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        route_handler = scope["route_handler"]
+        config = scope["app"].response_cache_config
+        store = config.get_store_from_app(scope["app"]) if getattr(route_handler, "cache", False) else None
+        lease = getattr(store, "lease", None)
+        if lease is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = (route_handler.cache_key_builder or config.key_builder)(Request(scope))
+        async with lease(key):
+            await self.app(scope, receive, send)
@@ -0,0 +1,202 @@
+"""
+Content-aware, load-adaptive response compression.
+
+Enabled with ``settings.COMPRESSION_ADAPTIVE``, in place of the litestar
+compression middleware:
+
+- only the compressible content types are compressed (not the images,
+  archives or fonts), nor the responses already encoded (the precompressed
+  static files) or marked ``no-transform``;
+- the coding is the first of ``COMPRESSION_ENCODINGS`` (zstd, brotli, gzip)
+  the client accepts and the installed packages support;
+- the level goes down from its maximum (``GZIP_COMPRESS_LEVEL``,
+  ``BROTLI_QUALITY``, ``ZSTD_LEVEL``) to 1 as the process CPU usage or the
+  event loop lag (when the loop monitor runs) goes above its threshold;
+- streamed responses are compressed chunk by chunk, each chunk flushed.
+"""
+
+import asyncio
+import time
+from typing import Any
+
+from litestar.config.compression import CompressionConfig
+from litestar.constants import SCOPE_STATE_RESPONSE_COMPRESSED
+from litestar.datastructures import MutableScopeHeaders
+from litestar.middleware.compression import CompressionMiddleware
+from litestar.types import ASGIApp, Message, Receive, Scope, Send
+from litestar.utils import set_litestar_scope_state
+
+from oya.conf import settings
+from oya.core.exceptions import ImproperlyConfigured
+from oya.core.monitor import get_loop_monitor
+from oya.utils.http import choose_encoding, is_compressible
+from oya.utils.text import StreamCompressor, get_stream_encodings
+
+
+__all__ = (
+    "AdaptiveCompressionMiddleware",
+    "LoadSampler",
+)
+
+
+DEFAULT_ENCODINGS = ("zstd", "br", "gzip")
+DEFAULT_ZSTD_LEVEL = 3
+DEFAULT_CPU_THRESHOLD = 0.7
+DEFAULT_LAG_THRESHOLD = 0.02
+SAMPLE_INTERVAL = 0.5
+# bodies larger than this are compressed in a thread, off the event loop.
+THREAD_THRESHOLD = 256 * 1024
+SKIPPED_STATUSES = frozenset((204, 206, 304))
+
+
+class LoadSampler:
+    """
+    Load of the process between 0 (idle) and 1 (saturated), from its CPU
+    usage and the event loop lag, sampled every ``SAMPLE_INTERVAL`` seconds.
+    """
+
+    def __init__(self, cpu_threshold: float = DEFAULT_CPU_THRESHOLD, lag_threshold: float = DEFAULT_LAG_THRESHOLD):
+        self.cpu_threshold = cpu_threshold
+        self.lag_threshold = lag_threshold
+        self._sampled_at = time.monotonic()
+        self._cpu_time = time.process_time()
+        self._load = 0.0
+
+    def load(self) -> float:
+        now = time.monotonic()
+        elapsed = now - self._sampled_at
+        if elapsed < SAMPLE_INTERVAL:
+            return self._load
+
+        cpu_time = time.process_time()
+        cpu = (cpu_time - self._cpu_time) / elapsed
+        self._sampled_at, self._cpu_time = now, cpu_time
+
+        load = (cpu - self.cpu_threshold) / (1.0 - self.cpu_threshold) if self.cpu_threshold < 1 else 0.0
+        monitor = get_loop_monitor()
+        if monitor is not None and self.lag_threshold > 0:
+            # full load at 5 times the threshold.
+            load = max(load, (monitor.recent_lag - self.lag_threshold) / (4 * self.lag_threshold))
+        self._load = min(max(load, 0.0), 1.0)
+        return self._load
+
+
+class AdaptiveCompressionMiddleware(CompressionMiddleware):
+    """
+    Compression middleware choosing the coding by client support and the
+    level by the load of the process.
+    """
+
+    def __init__(self, app: ASGIApp, config: CompressionConfig) -> None:
+        super().__init__(app, config)
+        supported = get_stream_encodings()
+        preferred = getattr(settings, "COMPRESSION_ENCODINGS", DEFAULT_ENCODINGS)
+        unknown = set(preferred) - set(DEFAULT_ENCODINGS)
+        if unknown:
+            raise ImproperlyConfigured(f"settings.COMPRESSION_ENCODINGS: unknown codings {sorted(unknown)}.")
+        self.encodings = tuple(encoding for encoding in preferred if encoding in supported)
+        self.max_levels = {
+            "gzip": config.gzip_compress_level,
+            "br": config.brotli_quality,
+            "zstd": getattr(settings, "ZSTD_LEVEL", DEFAULT_ZSTD_LEVEL),
+        }
+        self.sampler = LoadSampler(
+            cpu_threshold=getattr(settings, "COMPRESSION_CPU_THRESHOLD", DEFAULT_CPU_THRESHOLD),
+            lag_threshold=getattr(settings, "COMPRESSION_LAG_THRESHOLD", DEFAULT_LAG_THRESHOLD),
+        )
+
+    def get_level(self, encoding: str) -> int:
+        """
+        Return the level of ``encoding`` for the current load.
+        """
+        maximum = max(self.max_levels[encoding], 1)
+        return max(round(maximum - self.sampler.load() * (maximum - 1)), 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        accept_encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+
+        encoding = choose_encoding(accept_encoding, self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, self._wrap_send(scope, send, encoding))
+
+    def _wrap_send(self, scope: Scope, send: Send, encoding: str) -> Send:
+        minimum_size = self.config.minimum_size
+        start: Any = None
+        compressor: StreamCompressor | None = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start = message
+                headers = MutableScopeHeaders.from_message(message)
+                if (
+                    message["status"] < 200
+                    or message["status"] in SKIPPED_STATUSES
+                    or "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type"))
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                headers.extend_header_value("vary", "Accept-Encoding")
+                if "no-transform" in (headers.get("cache-control") or ""):
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body":
+                # pathsend / zerocopysend bodies are sent as they are.
+                passthrough = True
+                if start is not None:
+                    await send(start)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                if not more_body and len(body) < minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                compressor = StreamCompressor(encoding, self.get_level(encoding))
+                headers = MutableScopeHeaders.from_message(start)
+                headers["content-encoding"] = encoding
+                set_litestar_scope_state(scope, SCOPE_STATE_RESPONSE_COMPRESSED, True)
+
+                if not more_body:
+                    if len(body) > THREAD_THRESHOLD:
+                        compressed = await asyncio.to_thread(compressor.finish, body)
+                    else:
+                        compressed = compressor.finish(body)
+                    headers["content-length"] = str(len(compressed))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed, "more_body": False})
+                    return
+
+                del headers["content-length"]
+                await send(start)
+
+            if more_body:
+                chunk = compressor.compress(body) if body else b""
+            else:
+                chunk = compressor.finish(body)
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        return send_wrapper
@@ -0,0 +1,188 @@
+"""
+Conditional GET answered before the handler runs.
+
+``conditional()`` decorates a route handler with a cheap "version query",
+evaluated first: when the ``If-None-Match`` or ``If-Modified-Since`` header
+of the request matches, a ``304 Not Modified`` is sent at once and neither
+the handler nor the serialization run. Otherwise the ``ETag`` and
+``Last-Modified`` headers are added to the response. The ``304`` carries
+the ``Cache-Control``, ``Vary``, ``Expires`` and ``Content-Location``
+headers declared on the route, as the ``200`` would (RFC 9110), and the
+request headers listed in its ``Vary`` are part of the ``ETag``::
+
+    @conditional(lambda pk: Post.filter(pk=pk))
+    @get("/posts/{pk:int}")
+    async def post(pk: int) -> Post:
+        ...
+
+The version callable receives the path parameters and returns either a
+queryset, versioned by the ``MAX()`` of its ``field`` and its ``COUNT()``,
+or an awaitable of any value (a ``(value, last_modified)`` tuple to send a
+``Last-Modified`` header too).
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from inspect import isawaitable
+from typing import Any, Callable
+
+from litestar.datastructures import MutableScopeHeaders
+from litestar.enums import ScopeType
+from litestar.handlers import HTTPRouteHandler
+from litestar.middleware.base import AbstractMiddleware, DefineMiddleware
+from litestar.types import ASGIApp, Message, Receive, Scope, Send
+from tortoise.functions import Count, Max
+from tortoise.queryset import QuerySet
+
+from oya.core.exceptions import ImproperlyConfigured
+
+
+__all__ = (
+    "ConditionalGetMiddleware",
+    "conditional",
+)
+
+
+SAFE_METHODS = frozenset(("GET", "HEAD"))
+
+# headers of the 200 repeated by the 304, RFC 9110 section 15.4.5.
+NOT_MODIFIED_HEADERS = frozenset(("cache-control", "content-location", "expires", "vary"))
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _parse_etags(header: str) -> set[str]:
+    # the weak comparison of RFC 9110 ignores the W/ prefix.
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+
+class ConditionalGetMiddleware(AbstractMiddleware):
+    scopes = {ScopeType.HTTP}
+
+    def __init__(self, app: ASGIApp, version: Callable[..., Any], field: str = "updated_at", **kwargs):
+        super().__init__(app, **kwargs)
+        self.version = version
+        self.field = field
+        self._route_headers: dict[str, str] | None = None
+
+    def _get_route_headers(self, scope: Scope) -> dict[str, str]:
+        # resolved once: a middleware instance per route handler.
+        if self._route_headers is None:
+            self._route_headers = {
+                header.name.lower(): header.value
+                for header in scope["route_handler"].resolve_response_headers()
+                if header.name.lower() in NOT_MODIFIED_HEADERS
+                and header.value is not None
+                and not header.documentation_only
+            }
+        return self._route_headers
+
+    async def _get_version(self, scope: Scope) -> tuple[Any, datetime | None]:
+        result = self.version(**scope.get("path_params", {}))
+        if isinstance(result, QuerySet):
+            pk = result.model._meta.pk_attr  # pylint: disable=protected-access
+            rows = await result.order_by().annotate(
+                _oya_last_modified=Max(self.field), _oya_count=Count(pk)
+            ).values("_oya_last_modified", "_oya_count")
+            row = rows[0] if rows else {"_oya_last_modified": None, "_oya_count": 0}
+            last_modified = row["_oya_last_modified"]
+            if isinstance(last_modified, str):
+                last_modified = datetime.fromisoformat(last_modified)
+            return (last_modified, row["_oya_count"]), last_modified
+
+        if isawaitable(result):
+            result = await result
+        if isinstance(result, tuple) and len(result) == 2 and isinstance(result[1], (datetime, type(None))):
+            return result
+        return result, None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["method"] not in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        value, last_modified = await self._get_version(scope)
+        route_headers = self._get_route_headers(scope)
+        # a representation per value of the request headers the route varies by.
+        varies = {name.strip().lower().encode() for name in route_headers.get("vary", "").split(",")}
+        request_headers = sorted((name, header) for name, header in scope["headers"] if name in varies)
+        digest = hashlib.blake2b(
+            repr((scope["path"], scope.get("query_string", b""), request_headers, value)).encode(), digest_size=16
+        ).hexdigest()
+        etag = f'W/"{digest}"'
+        headers = {"etag": etag}
+        if last_modified is not None:
+            last_modified = _as_utc(last_modified).replace(microsecond=0)
+            headers["last-modified"] = format_datetime(last_modified, usegmt=True)
+
+        if self._not_modified(scope, etag, last_modified):
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [
+                    (name.encode(), value.encode("latin-1")) for name, value in {**route_headers, **headers}.items()
+                ],
+            })
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and 200 <= message["status"] < 300:
+                response_headers = MutableScopeHeaders.from_message(message)
+                for name, header in headers.items():
+                    response_headers[name] = header
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _not_modified(scope: Scope, etag: str, last_modified: datetime | None) -> bool:
+        if_none_match = if_modified_since = None
+        for name, value in scope["headers"]:
+            if name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+            elif name == b"if-modified-since":
+                if_modified_since = value.decode("latin-1")
+
+        if if_none_match is not None:
+            tags = _parse_etags(if_none_match)
+            return "*" in tags or etag.removeprefix("W/") in tags
+
+        if if_modified_since is not None and last_modified is not None:
+            try:
+                since = _as_utc(parsedate_to_datetime(if_modified_since))
+            except (TypeError, ValueError):
+                return False
+            return last_modified <= since
+        return False
+
+
+def conditional(version: Callable[..., Any], field: str = "updated_at") -> Callable[[HTTPRouteHandler], HTTPRouteHandler]:
+    """
+    Answer the conditional GET requests of a route with the version returned
+    by ``version``, applied on top of the route decorator.
+
+    Args:
+        version (Callable): called with the path parameters, returns a
+            queryset or an awaitable.
+        field (str): timestamp field of the queryset models.
+
+    Returns:
+        Callable: route handler decorator
+    """
+
+    def decorator(handler: HTTPRouteHandler) -> HTTPRouteHandler:
+        if not isinstance(handler, HTTPRouteHandler):
+            raise ImproperlyConfigured("conditional() must decorate a route handler, above @get().")
+        handler.middleware = [
+            *(handler.middleware or ()),
+            DefineMiddleware(ConditionalGetMiddleware, version=version, field=field),
+        ]
+        return handler
+
+    return decorator
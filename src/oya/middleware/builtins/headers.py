@@ -0,0 +1,328 @@
+"""
+Header-only middlewares: security headers, and the fused layer.
+
+``SecurityHeadersMiddleware`` adds ``settings.SECURITY_HEADERS`` to every
+response. With ``settings.MIDDLEWARE_FUSED``, ``Application`` installs a
+single ``FusedHeadersMiddleware`` instead of the allowed hosts, CORS and
+security headers layers: the request headers are scanned once, the response
+headers are precomputed, and whether a route is excluded from each of them
+(``exclude`` patterns and ``exclude_opt_key``) is computed once at startup
+from the route table, see ``FusedHeadersConfig.compile()``.
+"""
+
+from typing import Any
+
+from litestar import Litestar
+from litestar.config.allowed_hosts import AllowedHostsConfig
+from litestar.config.cors import CORSConfig
+from litestar.datastructures import URL
+from litestar.enums import ScopeType
+from litestar.middleware._utils import build_exclude_path_pattern
+from litestar.middleware.base import AbstractMiddleware
+from litestar.response.redirect import ASGIRedirectResponse
+from litestar.types import ASGIApp, Message, Receive, Scope, Send
+
+from oya.conf import settings
+from oya.middleware.builtins.hosts import HostMatcher, MatchedAllowedHostsConfig, with_matcher
+
+
+__all__ = (
+    "FusedHeadersConfig",
+    "FusedHeadersMiddleware",
+    "SecurityHeadersMiddleware",
+    "get_security_headers",
+)
+
+
+HOSTS = 1
+CORS = 2
+SECURITY = 4
+# the exclude patterns are matched per request, on the routes with path
+# parameters.
+HOSTS_PATH = 8
+SECURITY_PATH = 16
+
+INVALID_HOST_BODY = b'{"message":"invalid host header"}'
+
+
+def get_security_headers() -> list[tuple[bytes, bytes]]:
+    """
+    Return ``settings.SECURITY_HEADERS`` as raw ASGI headers.
+    """
+    headers = getattr(settings, "SECURITY_HEADERS", None) or {}
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+
+
+def _merge_vary(current: list[tuple[bytes, bytes]], value: bytes):
+    for index, (name, existing) in enumerate(current):
+        if name.lower() == b"vary":
+            present = {item.strip().lower() for item in existing.split(b",")}
+            if b"*" not in present:
+                added = [item.strip() for item in value.split(b",") if item.strip().lower() not in present]
+                if added:
+                    current[index] = (name, b", ".join([existing, *added]))
+            return
+
+
+def _add_headers(message: Message, headers: list[tuple[bytes, bytes]]):
+    # the headers set by the handler win, but for Vary which lists both.
+    current = message.setdefault("headers", [])
+    if not current:
+        current.extend(headers)
+        return
+    names = {name.lower() for name, _ in current}
+    for header in headers:
+        if header[0] not in names:
+            current.append(header)
+        elif header[0] == b"vary":
+            _merge_vary(current, header[1])
+
+
+class SecurityHeadersMiddleware(AbstractMiddleware):
+    """
+    Add ``settings.SECURITY_HEADERS`` to the responses, unless excluded by
+    ``SECURITY_HEADERS_EXCLUDE`` or ``SECURITY_HEADERS_EXCLUDE_OPT_KEY``.
+    """
+
+    scopes = {ScopeType.HTTP}
+
+    def __init__(self, app: ASGIApp, **kwargs):
+        super().__init__(
+            app,
+            exclude=getattr(settings, "SECURITY_HEADERS_EXCLUDE", None),
+            exclude_opt_key=getattr(settings, "SECURITY_HEADERS_EXCLUDE_OPT_KEY", None),
+            **kwargs,
+        )
+        self.headers = get_security_headers()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        headers = self.headers
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                _add_headers(message, headers)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class _HostCheck:
+    """
+    Allowed hosts check of ``AllowedHostsMiddleware``.
+    """
+
+    def __init__(self, config: MatchedAllowedHostsConfig):
+        self.config = config
+        self.scopes = config.scopes or {ScopeType.HTTP, ScopeType.WEBSOCKET}
+        self.matcher: HostMatcher | None = None
+        self.redirect_domains: HostMatcher | None = None
+        if any(host == "*" for host in config.allowed_hosts):
+            return
+        self.matcher = config.matcher
+        self.redirect_domains = config.redirect_matcher
+
+    def is_allowed(self, host: str) -> bool:
+        return self.matcher is None or self.matcher.match(host)
+
+    def is_redirected(self, host: str) -> bool:
+        return self.redirect_domains is not None and self.redirect_domains.match(host)
+
+
+class FusedHeadersConfig:
+    """
+    Settings of the fused layer, and the per route flags compiled at startup.
+
+    Args:
+        allowed_hosts (AllowedHostsConfig | None): hosts check.
+        cors_config (CORSConfig | None): CORS headers and preflight answers.
+        security_headers (list[tuple[bytes, bytes]] | None): headers added to
+            every response.
+        security_exclude (str | list[str] | None): paths without security
+            headers.
+        security_exclude_opt_key (str | None): route opt disabling the
+            security headers.
+    """
+
+    def __init__(
+        self,
+        allowed_hosts: AllowedHostsConfig | None = None,
+        cors_config: CORSConfig | None = None,
+        security_headers: list[tuple[bytes, bytes]] | None = None,
+        security_exclude: str | list[str] | None = None,
+        security_exclude_opt_key: str | None = None,
+    ):
+        allowed_hosts, cors_config = with_matcher(allowed_hosts), with_matcher(cors_config)
+        self.hosts = _HostCheck(allowed_hosts) if allowed_hosts is not None else None
+        self.hosts_exclude = build_exclude_path_pattern(exclude=allowed_hosts.exclude) if allowed_hosts else None
+        self.hosts_exclude_opt_key = allowed_hosts.exclude_opt_key if allowed_hosts else None
+
+        self.cors = cors_config
+        self.cors_headers: list[tuple[bytes, bytes]] = []
+        if cors_config is not None:
+            self.cors_headers = [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in cors_config.simple_headers.items()
+            ]
+
+        self.security_headers = security_headers or []
+        self.security_exclude = build_exclude_path_pattern(exclude=security_exclude)
+        self.security_exclude_opt_key = security_exclude_opt_key
+
+        self.default_flags = (
+            (HOSTS if self.hosts is not None else 0)
+            | (CORS if self.cors is not None else 0)
+            | (SECURITY if self.security_headers else 0)
+        )
+        self.routes: dict[Any, int] = {}
+
+    @classmethod
+    def from_settings(cls, allowed_hosts: Any = None, cors_config: CORSConfig | None = None) -> "FusedHeadersConfig":
+        if allowed_hosts is not None and not isinstance(allowed_hosts, AllowedHostsConfig):
+            allowed_hosts = AllowedHostsConfig(allowed_hosts=list(allowed_hosts))
+        return cls(
+            allowed_hosts=allowed_hosts,
+            cors_config=cors_config,
+            security_headers=get_security_headers(),
+            security_exclude=getattr(settings, "SECURITY_HEADERS_EXCLUDE", None),
+            security_exclude_opt_key=getattr(settings, "SECURITY_HEADERS_EXCLUDE_OPT_KEY", None),
+        )
+
+    def get_flags(self, path: str, handler: Any, dynamic: bool) -> int:
+        """
+        Return the layers applied to ``handler``, served on ``path``.
+        """
+        flags = self.default_flags
+        opt = getattr(handler, "opt", None) or {}
+        for flag, path_flag, pattern, opt_key in (
+            (HOSTS, HOSTS_PATH, self.hosts_exclude, self.hosts_exclude_opt_key),
+            (SECURITY, SECURITY_PATH, self.security_exclude, self.security_exclude_opt_key),
+        ):
+            if not flags & flag:
+                continue
+            if (opt_key and opt.get(opt_key)) or (pattern is not None and pattern.search(path)):
+                flags &= ~flag
+            elif pattern is not None and dynamic:
+                flags |= path_flag
+        return flags
+
+    def compile(self, app: Litestar):
+        """
+        Compute the flags of every route handler of ``app``.
+        """
+        for route in app.routes:
+            handlers = getattr(route, "route_handlers", None) or [route.route_handler]
+            dynamic = bool(route.path_parameters) or any(getattr(handler, "is_mount", False) for handler in handlers)
+            for handler in handlers:
+                self.routes[handler] = self.get_flags(route.path, handler, dynamic)
+
+
+class FusedHeadersMiddleware:
+    """
+    Allowed hosts, CORS and security headers in one ASGI layer.
+    """
+
+    __slots__ = ("app", "config")
+
+    def __init__(self, app: ASGIApp, config: FusedHeadersConfig):
+        self.app = app
+        self.config = config
+
+    def _flags(self, scope: Scope) -> int:
+        config = self.config
+        flags = config.routes.get(scope.get("route_handler"))
+        if flags is None:
+            flags = config.default_flags
+        if flags & HOSTS_PATH and config.hosts_exclude.search(scope["path"]):
+            flags &= ~HOSTS
+        if flags & SECURITY_PATH and config.security_exclude.search(scope["path"]):
+            flags &= ~SECURITY
+        return flags
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        scope_type = scope["type"]
+        if scope_type not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        config = self.config
+        flags = self._flags(scope)
+
+        host = origin = request_method = request_headers = None
+        has_cookie = False
+        for name, value in scope["headers"]:
+            if name == b"host":
+                host = value
+            elif name == b"origin":
+                origin = value
+            elif name == b"cookie":
+                has_cookie = True
+            elif name == b"x-forwarded-host":
+                host = host or value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        headers: list[tuple[bytes, bytes]] = []
+        if scope_type == "http":
+            if flags & CORS and origin is not None:
+                headers.extend(config.cors_headers)
+                cors = config.cors
+                if (cors.is_allow_all_origins and has_cookie) or (
+                    not cors.is_allow_all_origins and cors.is_origin_allowed(origin.decode("latin-1"))
+                ):
+                    headers.append((b"access-control-allow-origin", origin))
+                    headers.append((b"vary", b"Origin"))
+            if flags & SECURITY:
+                headers.extend(config.security_headers)
+
+        if headers:
+            # the answers of this layer get the headers too, as with the
+            # separate layers.
+            inner_send = send
+
+            async def send(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    _add_headers(message, headers)
+                await inner_send(message)
+
+        if flags & HOSTS and scope_type in config.hosts.scopes:
+            hostname = host.decode("latin-1").split(":")[0] if host else ""
+            if not config.hosts.is_allowed(hostname):
+                await self._reject_host(scope, receive, send, hostname)
+                return
+
+        if flags & CORS and origin is not None and request_method is not None and scope["method"] == "OPTIONS":
+            await self._preflight(send, origin, request_method, request_headers)
+            return
+
+        await self.app(scope, receive, send)
+
+    async def _reject_host(self, scope: Scope, receive: Receive, send: Send, hostname: str):
+        if self.config.hosts.is_redirected(hostname):
+            url = URL.from_scope(scope)
+            await ASGIRedirectResponse(path=str(url.with_replacements(netloc=f"www.{url.netloc}")))(
+                scope, receive, send
+            )
+            return
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1008, "reason": "invalid host header"})
+            return
+        await send({
+            "type": "http.response.start",
+            "status": 400,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(INVALID_HOST_BODY)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": INVALID_HOST_BODY})
+
+    async def _preflight(self, send: Send, origin: bytes, request_method: bytes, request_headers: bytes | None):
+        # same answers as the OPTIONS handler of litestar, cached by the
+        # config.
+        status, headers, body = self.config.cors.preflight(
+            origin.decode("latin-1"), request_method.decode("latin-1"), (request_headers or b"").decode("latin-1")
+        )
+        await send({"type": "http.response.start", "status": status, "headers": list(headers)})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,260 @@
+"""
+Precompiled host and origin matching.
+
+Litestar joins ``ALLOWED_HOSTS`` and ``ALLOW_ORIGINS`` into a regex scanned
+for every request, linear in the number of entries. ``HostMatcher`` sorts
+them once: plain names go to a hash set, ``*.example.com`` wildcards to a
+trie of reversed labels, and anything else (regex patterns) to a single
+combined regex. ``OriginMatcher`` does the same per scheme and port for the
+CORS origins.
+
+``get_allowed_hosts_config()`` and ``get_cors_config()`` build
+``MatchedAllowedHostsConfig`` and ``MatchedCORSConfig``, used by the allowed
+hosts middleware, the CORS middleware and the fused headers layer. The
+preflight answers are cached by origin, method and requested headers.
+"""
+
+import re
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Iterable, Pattern
+
+from litestar.config.allowed_hosts import AllowedHostsConfig
+from litestar.config.cors import CORSConfig
+from litestar.constants import DEFAULT_ALLOWED_CORS_HEADERS
+from litestar.middleware.allowed_hosts import AllowedHostsMiddleware
+from litestar.types import ASGIApp
+
+
+__all__ = (
+    "AllowedHostsMatcherMiddleware",
+    "HostMatcher",
+    "MatchedAllowedHostsConfig",
+    "MatchedCORSConfig",
+    "OriginMatcher",
+    "with_matcher",
+)
+
+
+_NAME_RE = re.compile(r"[a-z0-9\-]+(?:\.[a-z0-9\-]+)*")
+_ORIGIN_RE = re.compile(r"(?P<scheme>[a-z][a-z0-9+.\-]*)://(?P<host>(?:\*\.)?[a-z0-9.\-]+)(?::(?P<port>\d+))?")
+# leaf of the trie: the names under this node match.
+_WILDCARD = ""
+PREFLIGHT_CACHE_SIZE = 1024
+
+
+class HostMatcher:
+    """
+    Match a host name against exact names, ``*.domain`` wildcards (any
+    subdomain, not the domain itself) and regex patterns, ``*`` matching
+    any host.
+
+    Args:
+        hosts (Iterable[str]): allowed hosts.
+    """
+
+    __slots__ = ("allow_all", "exact", "trie", "regex")
+
+    def __init__(self, hosts: Iterable[str]):
+        self.allow_all = False
+        self.exact: set[str] = set()
+        self.trie: dict = {}
+        patterns: list[str] = []
+
+        for host in hosts:
+            host = host.lower()
+            if host == "*":
+                self.allow_all = True
+            elif host.startswith("*.") and _NAME_RE.fullmatch(host[2:]):
+                node = self.trie
+                for label in reversed(host[2:].split(".")):
+                    node = node.setdefault(label, {})
+                node[_WILDCARD] = True
+            elif _NAME_RE.fullmatch(host):
+                self.exact.add(host)
+            else:
+                patterns.append(host.replace("*.", r".*\."))
+
+        self.regex: Pattern | None = (
+            re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE) if patterns else None
+        )
+
+    def match(self, host: str) -> bool:
+        if self.allow_all:
+            return True
+        if not host:
+            return False
+        host = host.lower()
+        if host in self.exact:
+            return True
+        if self.trie:
+            node = self.trie
+            labels = host.split(".")
+            for index in range(len(labels) - 1, 0, -1):
+                node = node.get(labels[index])
+                if node is None:
+                    break
+                if _WILDCARD in node:
+                    return True
+        return self.regex is not None and self.regex.fullmatch(host) is not None
+
+    # drop-in for the compiled regexes of the litestar middlewares.
+    fullmatch = match
+
+
+class OriginMatcher:
+    """
+    Match an ``Origin`` header against the CORS origins: a ``HostMatcher``
+    per scheme and port for the ``scheme://host[:port]`` entries (wildcards
+    included), one regex for the others and ``allow_origin_regex``.
+
+    Args:
+        origins (Iterable[str]): allowed origins.
+        origin_regex (str | None): allowed origins pattern.
+    """
+
+    __slots__ = ("allow_all", "hosts", "regex")
+
+    def __init__(self, origins: Iterable[str], origin_regex: str | None = None):
+        self.allow_all = False
+        grouped: dict[tuple[str, str | None], list[str]] = {}
+        patterns: list[str] = []
+        for origin in origins:
+            if origin == "*":
+                self.allow_all = True
+                continue
+            match = _ORIGIN_RE.fullmatch(origin.lower())
+            if match is None:
+                patterns.append(origin.replace("*.", r".*\."))
+            else:
+                grouped.setdefault((match["scheme"], match["port"]), []).append(match["host"])
+        if origin_regex:
+            patterns.append(origin_regex)
+
+        self.hosts = {key: HostMatcher(hosts) for key, hosts in grouped.items()}
+        self.regex: Pattern | None = (
+            re.compile("|".join(f"(?:{pattern})" for pattern in patterns)) if patterns else None
+        )
+
+    def match(self, origin: str) -> bool:
+        if self.allow_all:
+            return True
+        scheme, sep, rest = origin.partition("://")
+        if sep and self.hosts:
+            host, colon, port = rest.rpartition(":")
+            if not colon or not port.isdigit():
+                host, port = rest, None
+            matcher = self.hosts.get((scheme.lower(), port))
+            if matcher is not None and matcher.match(host):
+                return True
+        return self.regex is not None and self.regex.fullmatch(origin) is not None
+
+    fullmatch = match
+
+
+@dataclass
+class MatchedAllowedHostsConfig(AllowedHostsConfig):
+    """
+    ``AllowedHostsConfig`` matching the hosts with a ``HostMatcher``.
+    """
+
+    @cached_property
+    def matcher(self) -> HostMatcher:
+        return HostMatcher(self.allowed_hosts)
+
+    @cached_property
+    def redirect_matcher(self) -> HostMatcher | None:
+        if not self.www_redirect:
+            return None
+        domains = [host.replace("www.", "", 1) for host in self.allowed_hosts if host.startswith("www.")]
+        return HostMatcher(domains) if domains else None
+
+
+class AllowedHostsMatcherMiddleware(AllowedHostsMiddleware):
+    """
+    ``AllowedHostsMiddleware`` using the matchers of a
+    ``MatchedAllowedHostsConfig`` in place of its regexes.
+    """
+
+    def __init__(self, app: ASGIApp, config: AllowedHostsConfig | list[str]) -> None:
+        if not isinstance(config, AllowedHostsConfig):
+            config = AllowedHostsConfig(allowed_hosts=list(config))
+        config = with_matcher(config)
+        super().__init__(app, config)
+        if self.allowed_hosts_regex is not None:
+            self.allowed_hosts_regex = config.matcher
+            self.redirect_domains = config.redirect_matcher
+
+
+@dataclass
+class MatchedCORSConfig(CORSConfig):
+    """
+    ``CORSConfig`` matching the origins with an ``OriginMatcher`` and
+    caching the preflight answers.
+    """
+
+    @cached_property
+    def matcher(self) -> OriginMatcher:
+        return OriginMatcher(self.allow_origins, self.allow_origin_regex)
+
+    @cached_property
+    def _preflights(self) -> dict:
+        return {}
+
+    def is_origin_allowed(self, origin: str) -> bool:
+        return self.is_allow_all_origins or self.matcher.match(origin)
+
+    def preflight(self, origin: str, method: str, requested_headers: str) -> tuple[int, list[tuple[bytes, bytes]], bytes]:
+        """
+        Return the status, raw headers and body answering a preflight
+        request, as the OPTIONS handler of litestar does. The headers list is
+        shared between the requests, copy it before changing it.
+        """
+        key = (origin, method, requested_headers)
+        answer = self._preflights.get(key)
+        if answer is not None:
+            return answer
+
+        failures = []
+        if not self.is_allow_all_methods and method not in self.allow_methods:
+            failures.append("method")
+
+        headers = dict(self.preflight_headers)
+        if not self.is_origin_allowed(origin):
+            failures.append("Origin")
+        elif headers.get("Access-Control-Allow-Origin") != "*":
+            headers["Access-Control-Allow-Origin"] = origin
+
+        requested = [header.strip() for header in requested_headers.split(",") if header.strip()]
+        if requested:
+            if self.is_allow_all_headers:
+                headers["Access-Control-Allow-Headers"] = ", ".join(
+                    sorted(set(requested) | DEFAULT_ALLOWED_CORS_HEADERS)
+                )
+            elif any(header.lower() not in self.allow_headers for header in requested):
+                failures.append("headers")
+
+        if failures:
+            body = f"Disallowed CORS {', '.join(failures)}".encode()
+            raw_headers = [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", str(len(body)).encode())]
+            answer = (400, raw_headers, body)
+        else:
+            raw_headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+            answer = (204, raw_headers, b"")
+
+        if len(self._preflights) >= PREFLIGHT_CACHE_SIZE:
+            # bounded against arbitrary origins and headers.
+            self._preflights.clear()
+        self._preflights[key] = answer
+        return answer
+
+
+def with_matcher(config: Any) -> Any:
+    """
+    Return ``config``, an ``AllowedHostsConfig`` or a ``CORSConfig``, as its
+    matched counterpart.
+    """
+    for base, matched in ((AllowedHostsConfig, MatchedAllowedHostsConfig), (CORSConfig, MatchedCORSConfig)):
+        if isinstance(config, base) and not isinstance(config, matched):
+            return matched(**{name: getattr(config, name) for name in base.__dataclass_fields__})
+    return config
@@ -0,0 +1,277 @@
+"""
+Per route request metrics in the Prometheus text format.
+
+Enabled with ``settings.METRICS_ENABLED``, ``Application`` then installs
+``MetricsMiddleware`` and mounts the handler on ``settings.METRICS_PATH``.
+
+Routes are labelled with their path template. With several processes (e.g.
+the pre-fork server) each worker periodically writes a snapshot of its
+metrics to ``settings.METRICS_MULTIPROCESS_DIR`` and the handler merges the
+snapshots of the live workers.
+"""
+
+import json
+import os
+import time
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Callable
+
+from litestar import get
+from litestar.enums import ScopeType
+from litestar.middleware.base import AbstractMiddleware
+from litestar.types import Message, Receive, Scope, Send
+
+from oya.conf import settings
+from oya.middleware.context import get_route_template
+
+
+__all__ = (
+    "MetricsMiddleware",
+    "RouteMetrics",
+    "get_metrics_handler",
+    "registry",
+    "render_metrics",
+)
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+
+class RouteMetrics:
+    """
+    Counters of a single route and method, allocated once.
+    """
+
+    __slots__ = ("route", "method", "statuses", "buckets", "sum")
+
+    def __init__(self, route: str, method: str, bucket_count: int):
+        self.route = route
+        self.method = method
+        self.statuses = array("Q", bytes(8 * len(STATUS_CLASSES)))
+        # one more bucket for +Inf, counts are not cumulative.
+        self.buckets = array("Q", bytes(8 * (bucket_count + 1)))
+        self.sum = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "route": self.route,
+            "method": self.method,
+            "statuses": self.statuses.tolist(),
+            "buckets": self.buckets.tolist(),
+            "sum": self.sum,
+        }
+
+
+class MetricsRegistry:
+    """
+    Metrics of the current process.
+    """
+
+    def __init__(self):
+        self.bounds: tuple[float, ...] = tuple(getattr(settings, "METRICS_BUCKETS", DEFAULT_BUCKETS))
+        self.series: dict[tuple[int, str], RouteMetrics] = {}
+        self.directory: str | None = (
+            getattr(settings, "METRICS_MULTIPROCESS_DIR", None) or os.environ.get("OYA_METRICS_DIR")
+        )
+        self.flush_interval: float = getattr(settings, "METRICS_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)
+        self.gauge_providers: list[Callable[[], list[dict[str, Any]]]] = []
+        self._next_flush = 0.0
+
+    def add_gauge_provider(self, provider: Callable[[], list[dict[str, Any]]]):
+        """
+        Register a callable returning gauges of this process, as dicts with
+        ``name``, ``help``, ``labels`` and ``value`` keys.
+        """
+        if provider not in self.gauge_providers:
+            self.gauge_providers.append(provider)
+
+    def gauges(self) -> list[dict[str, Any]]:
+        pid = str(os.getpid())
+        gauges = []
+        for provider in self.gauge_providers:
+            for gauge in provider():
+                gauges.append({**gauge, "labels": {**gauge.get("labels", {}), "pid": pid}})
+        return gauges
+
+    def get_series(self, scope: Scope) -> RouteMetrics:
+        key = (id(scope.get("route_handler")), scope["method"])
+        try:
+            return self.series[key]
+        except KeyError:
+            series = self.series[key] = RouteMetrics(
+                get_route_template(scope), scope["method"], len(self.bounds)
+            )
+            return series
+
+    def observe(self, series: RouteMetrics, status: int, duration: float):
+        index = status // 100 - 1
+        if 0 <= index < 5:
+            series.statuses[index] += 1
+        series.buckets[bisect_left(self.bounds, duration)] += 1
+        series.sum += duration
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if self.directory is not None:
+            now = time.monotonic()
+            if now >= self._next_flush:
+                self._next_flush = now + self.flush_interval
+                self.flush()
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        return [series.as_dict() for series in self.series.values()]
+
+    def flush(self):
+        """
+        Write the snapshot of this process in the multiprocess directory.
+        """
+        directory = Path(self.directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{os.getpid()}.json"
+        tmp = directory / f".{os.getpid()}.json.tmp"
+        tmp.write_text(json.dumps({
+            "bounds": self.bounds, "series": self.snapshot(), "gauges": self.gauges(),
+        }))
+        os.replace(tmp, path)
+
+    def collect(self) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+        """
+        Return the series and the gauges of every live process, this one
+        included.
+        """
+        snapshots, gauges = self.snapshot(), self.gauges()
+        if self.directory is None:
+            return snapshots, gauges
+
+        pid = os.getpid()
+        for path in Path(self.directory).glob("*.json"):
+            other = int(path.stem) if path.stem.isdigit() else None
+            if other is None or other == pid:
+                continue
+            try:
+                os.kill(other, 0)
+            except ProcessLookupError:
+                # the counters of a dead worker are dropped, like a restart.
+                path.unlink(missing_ok=True)
+                continue
+            except PermissionError:
+                pass
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            if tuple(data["bounds"]) == self.bounds:
+                snapshots.extend(data["series"])
+            gauges.extend(data.get("gauges", ()))
+        return snapshots, gauges
+
+
+registry = MetricsRegistry()
+
+
+def _merge(snapshots: list[dict[str, Any]]) -> dict[tuple[str, str], dict[str, Any]]:
+    merged: dict[tuple[str, str], dict[str, Any]] = {}
+    for series in snapshots:
+        key = (series["route"], series["method"])
+        current = merged.get(key)
+        if current is None:
+            merged[key] = {
+                "statuses": list(series["statuses"]),
+                "buckets": list(series["buckets"]),
+                "sum": series["sum"],
+            }
+            continue
+        for i, value in enumerate(series["statuses"]):
+            current["statuses"][i] += value
+        for i, value in enumerate(series["buckets"]):
+            current["buckets"][i] += value
+        current["sum"] += series["sum"]
+    return merged
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_metrics() -> str:
+    """
+    Render the metrics of every process in the Prometheus text format.
+    """
+    snapshots, gauges = registry.collect()
+    merged = _merge(snapshots)
+    bounds = ["%g" % bound for bound in registry.bounds] + ["+Inf"]
+
+    lines = [
+        "# HELP oya_http_requests_total Total number of HTTP requests.",
+        "# TYPE oya_http_requests_total counter",
+    ]
+    for (route, method), series in sorted(merged.items()):
+        labels = f'route="{_label(route)}",method="{method}"'
+        for status, count in zip(STATUS_CLASSES, series["statuses"]):
+            if count:
+                lines.append(f'oya_http_requests_total{{{labels},status="{status}"}} {count}')
+
+    lines.append("# HELP oya_http_request_duration_seconds HTTP request latency.")
+    lines.append("# TYPE oya_http_request_duration_seconds histogram")
+    for (route, method), series in sorted(merged.items()):
+        labels = f'route="{_label(route)}",method="{method}"'
+        cumulative = 0
+        for bound, count in zip(bounds, series["buckets"]):
+            cumulative += count
+            lines.append(f'oya_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"oya_http_request_duration_seconds_sum{{{labels}}} {series['sum']}")
+        lines.append(f"oya_http_request_duration_seconds_count{{{labels}}} {cumulative}")
+
+    described = set()
+    for gauge in sorted(gauges, key=lambda gauge: gauge["name"]):
+        name = gauge["name"]
+        if name not in described:
+            described.add(name)
+            lines.append(f"# HELP {name} {gauge.get('help', name)}")
+            lines.append(f"# TYPE {name} gauge")
+        labels = ",".join(f'{key}="{_label(str(value))}"' for key, value in gauge["labels"].items())
+        lines.append(f"{name}{{{labels}}} {gauge['value']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def get_metrics_handler():
+    """
+    Return the handler serving the metrics on ``settings.METRICS_PATH``.
+    """
+
+    @get(
+        getattr(settings, "METRICS_PATH", "/metrics"),
+        media_type="text/plain; version=0.0.4",
+        include_in_schema=False,
+        sync_to_thread=False,
+    )
+    def metrics() -> str:
+        return render_metrics()
+
+    return metrics
+
+
+class MetricsMiddleware(AbstractMiddleware):
+    scopes = {ScopeType.HTTP}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        series = registry.get_series(scope)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            registry.observe(series, status, time.perf_counter() - start)
@@ -0,0 +1,34 @@
+"""
+Middleware telling the event loop monitor which route each task serves, so
+that blocking periods are attributed to a route. Installed by ``Application``
+when ``settings.LOOP_MONITOR_ENABLED`` is set.
+"""
+
+import asyncio
+
+from litestar.enums import ScopeType
+from litestar.middleware.base import AbstractMiddleware
+from litestar.types import Receive, Scope, Send
+
+from oya.core.monitor import get_loop_monitor
+from oya.middleware.context import get_route_template
+
+
+__all__ = ("LoopMonitorMiddleware",)
+
+
+class LoopMonitorMiddleware(AbstractMiddleware):
+    scopes = {ScopeType.HTTP, ScopeType.WEBSOCKET}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        monitor = get_loop_monitor()
+        if monitor is None:
+            await self.app(scope, receive, send)
+            return
+
+        task = asyncio.current_task()
+        monitor.routes[task] = get_route_template(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            monitor.routes.pop(task, None)
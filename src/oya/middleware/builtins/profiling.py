@@ -0,0 +1,174 @@
+"""
+Sampling profiler for slow requests.
+
+Enable it in the settings::
+
+    MIDDLEWARE = ["oya.middleware.builtins.profiling.ProfilingMiddleware"]
+    PROFILING_THRESHOLD = 500       # milliseconds
+
+A background thread samples the event loop thread every
+``settings.PROFILING_INTERVAL`` seconds and charges each stack to the request
+whose task is running, requests waiting on I/O get the stack of the awaited
+coroutines. When a request takes longer than the threshold its samples are
+written in the collapsed stack format (``flamegraph.pl``, speedscope) to
+``settings.PROFILING_DIR``, at most ``PROFILING_MAX_FILES_PER_MINUTE`` files
+per minute.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from pathlib import Path
+
+from litestar.enums import ScopeType
+from litestar.middleware.base import AbstractMiddleware
+from litestar.types import ASGIApp, Receive, Scope, Send
+
+from oya.conf import settings
+from oya.middleware.context import get_route_template
+
+
+__all__ = (
+    "ProfilingMiddleware",
+    "StackSampler",
+)
+
+
+logger = logging.getLogger("oya.profiling")
+
+DEFAULT_INTERVAL = 0.01
+DEFAULT_THRESHOLD = 1000
+DEFAULT_MAX_FILES_PER_MINUTE = 10
+MAX_DEPTH = 128
+
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    # co_qualname since Python 3.11.
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse_frames(frame) -> str:
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+def _collapse_coroutine(coro) -> str:
+    labels = []
+    while coro is not None and len(labels) < MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        labels.append(_frame_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return ";".join(labels)
+
+
+class StackSampler(threading.Thread):
+    """
+    Thread sampling the stack of the event loop thread.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float):
+        super().__init__(name="oya-stack-sampler", daemon=True)
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.interval = interval
+        self.active: dict[asyncio.Task, Counter] = {}
+
+    def run(self):
+        # pylint: disable=protected-access
+        current_tasks = asyncio.tasks._current_tasks
+        while not self.loop.is_closed():
+            time.sleep(self.interval)
+            if not self.active:
+                continue
+            try:
+                running = current_tasks.get(self.loop)
+                frame = sys._current_frames().get(self.loop_thread_id)
+                for task, samples in list(self.active.items()):
+                    if task is running and frame is not None:
+                        samples[_collapse_frames(frame)] += 1
+                    else:
+                        samples["[await];" + _collapse_coroutine(task.get_coro())] += 1
+            except Exception:  # pylint: disable=broad-exception-caught
+                # the loop keeps running while the stacks are read.
+                continue
+
+
+class ProfilingMiddleware(AbstractMiddleware):
+    scopes = {ScopeType.HTTP}
+
+    def __init__(self, app: ASGIApp, **kwargs):
+        super().__init__(app, **kwargs)
+        self.threshold = getattr(settings, "PROFILING_THRESHOLD", DEFAULT_THRESHOLD) / 1000
+        self.interval = getattr(settings, "PROFILING_INTERVAL", DEFAULT_INTERVAL)
+        self.directory = Path(getattr(settings, "PROFILING_DIR", "profiles"))
+        self.max_files = getattr(settings, "PROFILING_MAX_FILES_PER_MINUTE", DEFAULT_MAX_FILES_PER_MINUTE)
+        self._written: deque[float] = deque()
+        self._sampler: StackSampler | None = None
+
+    def _get_sampler(self) -> StackSampler:
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = StackSampler(asyncio.get_running_loop(), self.interval)
+            self._sampler.start()
+        return self._sampler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        sampler = self._get_sampler()
+        task = asyncio.current_task()
+        samples: Counter = Counter()
+        sampler.active[task] = samples
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            duration = time.perf_counter() - start
+            sampler.active.pop(task, None)
+            if duration >= self.threshold and samples and self._acquire_slot():
+                self._dump(scope, duration, samples)
+
+    def _acquire_slot(self) -> bool:
+        now = time.monotonic()
+        while self._written and self._written[0] < now - 60:
+            self._written.popleft()
+        if len(self._written) >= self.max_files:
+            return False
+        self._written.append(now)
+        return True
+
+    def _dump(self, scope: Scope, duration: float, samples: Counter):
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+
+        route = _UNSAFE_RE.sub("_", get_route_template(scope)).strip("_") or "root"
+        name = "%s-%s-%s-%dms.collapsed" % (
+            time.strftime("%Y%m%dT%H%M%S"), route, _UNSAFE_RE.sub("_", request_id), duration * 1000
+        )
+        data = "".join(f"{stack} {count}\n" for stack, count in samples.items())
+        asyncio.get_running_loop().run_in_executor(None, self._write, self.directory / name, data)
+
+    @staticmethod
+    def _write(path: Path, data: str):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(data, encoding="utf-8")
+        except OSError as exc:
+            logger.warning("Unable to write the profile %s: %s", path, exc)
@@ -0,0 +1,124 @@
+"""
+Request scoped query counter and N+1 detector.
+
+Enable it in the settings::
+
+    MIDDLEWARE = ["oya.middleware.builtins.queries.QueryCountMiddleware"]
+
+In DEBUG the numbers are sent as ``x-db-query-count``, ``x-db-query-time``
+(milliseconds) and ``x-db-n-plus-one`` response headers, otherwise they are
+logged as fields of the ``oya.db.queries`` logger records.
+"""
+
+import logging
+from collections import Counter
+from contextvars import ContextVar
+
+from litestar.datastructures import MutableScopeHeaders
+from litestar.enums import ScopeType
+from litestar.middleware.base import AbstractMiddleware
+from litestar.types import ASGIApp, Message, Receive, Scope, Send
+
+from oya.conf import settings
+from oya.db.instrumentation import QueryEvent, add_query_hook
+
+
+__all__ = (
+    "QueryCountMiddleware",
+    "QueryStats",
+    "get_query_stats",
+)
+
+
+logger = logging.getLogger("oya.db.queries")
+
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+
+
+class QueryStats:
+    """
+    Queries executed while handling a request.
+    """
+
+    __slots__ = ("count", "duration", "fingerprints")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints: Counter = Counter()
+
+    def record(self, event: QueryEvent):
+        self.count += 1
+        self.duration += event.duration
+        self.fingerprints[event.fingerprint] += 1
+
+    def n_plus_one(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        Return the SELECT statements repeated at least ``threshold`` times.
+        """
+        return [
+            (sql, count) for sql, count in self.fingerprints.items()
+            if count >= threshold and sql[:6].upper() == "SELECT"
+        ]
+
+
+_query_stats: ContextVar[QueryStats | None] = ContextVar("oya_query_stats", default=None)
+
+
+def get_query_stats() -> QueryStats | None:
+    """
+    Return the query statistics of the current request.
+    """
+    return _query_stats.get()
+
+
+def _record_query(event: QueryEvent):
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.record(event)
+
+
+class QueryCountMiddleware(AbstractMiddleware):
+    scopes = {ScopeType.HTTP}
+
+    def __init__(self, app: ASGIApp, **kwargs):
+        super().__init__(app, **kwargs)
+        self.threshold = getattr(settings, "QUERY_N_PLUS_ONE_THRESHOLD", DEFAULT_N_PLUS_ONE_THRESHOLD)
+        self.send_headers = getattr(settings, "QUERY_COUNT_HEADERS", settings.DEBUG)
+        add_query_hook(_record_query)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and self.send_headers:
+                headers = MutableScopeHeaders.from_message(message=message)
+                headers["x-db-query-count"] = str(stats.count)
+                headers["x-db-query-time"] = "%.2f" % (stats.duration * 1000)
+                headers["x-db-n-plus-one"] = str(len(stats.n_plus_one(self.threshold)))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _query_stats.reset(token)
+            self._log(scope, stats)
+
+    def _log(self, scope: Scope, stats: QueryStats):
+        path = scope["path"]
+        for sql, count in stats.n_plus_one(self.threshold):
+            logger.warning(
+                "Possible N+1 on %s: %s executed %s times", path, sql, count,
+                extra={"path": path, "db_statement": sql, "db_statement_count": count},
+            )
+
+        if not self.send_headers:
+            logger.info(
+                "%s: %s queries in %.2fms", path, stats.count, stats.duration * 1000,
+                extra={
+                    "path": path,
+                    "db_query_count": stats.count,
+                    "db_query_time_ms": round(stats.duration * 1000, 2),
+                },
+            )
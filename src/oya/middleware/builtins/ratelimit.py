@@ -0,0 +1,461 @@
+"""
+Rate limiting, per route and per client key.
+
+Enabled with ``settings.RATE_LIMIT_ENABLED``, ``Application`` then installs
+``RateLimitMiddleware`` after the other app middlewares (so the
+authentication has set ``scope["user"]``). Every request is counted against
+the policy of its route handler, set with the ``rate_limit()`` decorator (or
+``opt={"rate_limit": "10/second"}``), else against ``settings.RATE_LIMIT``
+(None limits the decorated routes only)::
+
+    @rate_limit("10/minute", key="user")
+    @get("/search")
+    async def search() -> ...
+
+Policies count with a token bucket (``burst`` requests at once, refilled at
+``limit / period``) or a sliding window (the count of the current window
+plus the weighted count of the previous one). The clients are identified by
+``ip``, ``user``, ``api_key`` (the ``RATE_LIMIT_API_KEY_HEADER`` header) or
+any ``callable(scope) -> str | None``.
+
+The counters live in the process (``MemoryRateLimitStore``), or in a SQLite
+file shared by the pre-forked workers (``SQLiteRateLimitStore``, best on a
+tmpfs such as ``/dev/shm``). The responses carry the ``RateLimit-Limit``,
+``RateLimit-Remaining``, ``RateLimit-Reset`` and ``RateLimit-Policy``
+headers, the rejected requests get a 429 with ``Retry-After``.
+"""
+
+import asyncio
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import cache
+from pathlib import Path
+from typing import Any, Callable, NamedTuple
+
+from litestar.enums import ScopeType
+from litestar.handlers import HTTPRouteHandler
+from litestar.middleware.base import AbstractMiddleware
+from litestar.types import ASGIApp, Message, Receive, Scope, Send
+
+from oya.conf import settings
+from oya.core.exceptions import ImproperlyConfigured
+from oya.utils.module_loading import import_string
+
+
+__all__ = (
+    "MemoryRateLimitStore",
+    "RateLimit",
+    "RateLimitMiddleware",
+    "RateLimitResult",
+    "SQLiteRateLimitStore",
+    "get_rate_limit_store",
+    "rate_limit",
+)
+
+
+TOKEN_BUCKET = "token_bucket"
+SLIDING_WINDOW = "sliding_window"
+ALGORITHMS = (TOKEN_BUCKET, SLIDING_WINDOW)
+KEYS = ("ip", "user", "api_key")
+
+OPT_KEY = "rate_limit"
+DEFAULT_API_KEY_HEADER = "x-api-key"
+DEFAULT_MAX_KEYS = 100_000
+CLEANUP_EVERY = 1000
+
+_UNITS = {"s": 1, "second": 1, "m": 60, "minute": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+_RATE_RE = re.compile(r"\s*(\d+)\s*/\s*(\d*)\s*([a-z]+?)s?\s*")
+_DENIED_BODY = b'{"status_code":429,"detail":"Too Many Requests"}'
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    remaining: int
+    # seconds until the limit is fully available again.
+    reset: float
+    # seconds before a rejected request can be retried.
+    retry_after: float
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    """
+    Parse ``"100/minute"``, ``"10/s"`` or ``"50/10m"`` into (limit, period
+    in seconds).
+    """
+    match = _RATE_RE.fullmatch(rate.lower())
+    if match is None or match[3] not in _UNITS:
+        raise ImproperlyConfigured(f"Invalid rate limit '{rate}', expected e.g. '100/minute' or '10/30s'.")
+    limit, period = int(match[1]), int(match[2] or 1) * _UNITS[match[3]]
+    if not limit or not period:
+        raise ImproperlyConfigured(f"Invalid rate limit '{rate}', the limit and the period must not be 0.")
+    return limit, period
+
+
+def _token_bucket(state: list[float] | None, now: float, limit: int, period: float, burst: int, cost: int):
+    # state: [tokens, updated at]
+    rate = limit / period
+    if state is None:
+        tokens = float(burst)
+    else:
+        tokens = min(burst, state[0] + (now - state[1]) * rate)
+    allowed = tokens >= cost
+    if allowed:
+        tokens -= cost
+    reset = (burst - tokens) / rate
+    retry_after = 0.0 if allowed else (cost - tokens) / rate
+    return [tokens, now, 0.0], RateLimitResult(allowed, int(tokens), reset, retry_after), now + reset
+
+
+def _sliding_window(state: list[float] | None, now: float, limit: int, period: float, burst: int, cost: int):
+    # state: [start of the current window, its count, count of the previous]
+    window = now - now % period
+    if state is None or state[0] < window - period:
+        current = previous = 0.0
+    elif state[0] < window:
+        current, previous = 0.0, state[1]
+    else:
+        current, previous = state[1], state[2]
+
+    weight = 1.0 - (now - window) / period
+    estimated = previous * weight + current
+    allowed = estimated + cost <= limit
+    retry_after = 0.0
+    if allowed:
+        current += cost
+        estimated += cost
+    elif current + cost > limit:
+        # the current window becomes the previous one.
+        retry_after = window + period * (2.0 - (limit - cost) / current) - now
+    else:
+        retry_after = window + period * (1.0 - (limit - cost - current) / previous) - now
+    result = RateLimitResult(allowed, max(int(limit - estimated), 0), window + period - now, retry_after)
+    return [window, current, previous], result, window + 2 * period
+
+
+_STEPS = {TOKEN_BUCKET: _token_bucket, SLIDING_WINDOW: _sliding_window}
+
+
+class RateLimit:
+    """
+    A rate limit policy.
+
+    Args:
+        rate (str): ``"<limit>/<period>"``, e.g. ``"100/minute"``.
+        key (str | Callable): ``ip``, ``user``, ``api_key`` or a
+            ``callable(scope)`` returning the client key.
+        algorithm (str): ``token_bucket`` or ``sliding_window``.
+        burst (int | None): size of the token bucket, ``limit`` by default.
+        cost (int): tokens taken by a request.
+        name (str): counters namespace, the counters of policies with the
+            same name are shared.
+    """
+
+    __slots__ = ("rate", "limit", "period", "key", "algorithm", "burst", "cost", "name", "step", "policy_header")
+
+    def __init__(
+        self,
+        rate: str,
+        key: str | Callable[[Scope], str | None] = "ip",
+        algorithm: str = TOKEN_BUCKET,
+        burst: int | None = None,
+        cost: int = 1,
+        name: str = "default",
+    ):
+        if algorithm not in ALGORITHMS:
+            raise ImproperlyConfigured(f"Unknown rate limit algorithm '{algorithm}', expected one of {ALGORITHMS}.")
+        if isinstance(key, str) and key not in KEYS:
+            raise ImproperlyConfigured(f"Unknown rate limit key '{key}', expected one of {KEYS} or a callable.")
+        self.rate = rate
+        self.limit, self.period = parse_rate(rate)
+        self.key = key
+        self.algorithm = algorithm
+        self.burst = burst if burst is not None and algorithm == TOKEN_BUCKET else self.limit
+        if not 0 < cost <= self.burst:
+            raise ImproperlyConfigured(f"Rate limit cost {cost} must be between 1 and {self.burst}.")
+        self.cost = cost
+        self.name = name
+        self.step = _STEPS[algorithm]
+        self.policy_header = f"{self.limit};w={int(self.period)}".encode()
+
+    def __repr__(self) -> str:
+        return f"RateLimit({self.rate!r}, key={self.key!r}, algorithm={self.algorithm!r}, name={self.name!r})"
+
+
+class MemoryRateLimitStore:
+    """
+    Counters of the current process. The event loop runs one ``hit()`` at a
+    time and it never awaits, so no lock is needed. Idle keys are dropped
+    once there are more than ``max_keys``.
+    """
+
+    def __init__(self, max_keys: int = DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._sweep_at = max_keys
+        # key -> [state..., expires at]
+        self._data: dict[str, list[float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def hit_sync(self, key: str, policy: RateLimit, now: float | None = None) -> RateLimitResult:
+        now = time.monotonic() if now is None else now
+        entry = self._data.get(key)
+        state = entry if entry is not None and entry[3] > now else None
+        state, result, expires_at = policy.step(state, now, policy.limit, policy.period, policy.burst, policy.cost)
+        if entry is None:
+            self._data[key] = [*state, expires_at]
+            if len(self._data) > self._sweep_at:
+                self._sweep(now)
+        else:
+            entry[0], entry[1], entry[2], entry[3] = state[0], state[1], state[2], expires_at
+        return result
+
+    async def hit(self, key: str, policy: RateLimit) -> RateLimitResult:
+        return self.hit_sync(key, policy)
+
+    def _sweep(self, now: float):
+        self._data = {key: entry for key, entry in self._data.items() if entry[3] > now}
+        # amortized: the next sweep once the live keys have doubled.
+        self._sweep_at = max(self.max_keys, 2 * len(self._data))
+
+    def clear(self):
+        self._data.clear()
+
+
+class SQLiteRateLimitStore:
+    """
+    Counters shared by the processes of a host, in a SQLite file in WAL mode.
+    Each hit is a read and a write in one immediate transaction, run in a
+    thread.
+
+    Args:
+        path (str | Path): database file, created on first use.
+        timeout (float): seconds to wait for the lock of a concurrent writer.
+    """
+
+    def __init__(self, path: str | Path = "ratelimit.sqlite3", timeout: float = 5.0):
+        self.path = str(path)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection must not cross a fork, each worker opens its own.
+        if self._connection is None or self._pid != os.getpid():
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS oya_ratelimit ("
+                " key TEXT PRIMARY KEY, a REAL NOT NULL, b REAL NOT NULL, c REAL NOT NULL, expires_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def hit_sync(self, key: str, policy: RateLimit, now: float | None = None) -> RateLimitResult:
+        # wall clock, shared by the processes.
+        now = time.time() if now is None else now
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT a, b, c FROM oya_ratelimit WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                state, result, expires_at = policy.step(
+                    list(row) if row else None, now, policy.limit, policy.period, policy.burst, policy.cost
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO oya_ratelimit (key, a, b, c, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, *state, expires_at),
+                )
+                self._writes += 1
+                if self._writes % CLEANUP_EVERY == 0:
+                    connection.execute("DELETE FROM oya_ratelimit WHERE expires_at <= ?", (now,))
+            finally:
+                connection.execute("COMMIT")
+        return result
+
+    async def hit(self, key: str, policy: RateLimit) -> RateLimitResult:
+        return await asyncio.to_thread(self.hit_sync, key, policy)
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM oya_ratelimit")
+
+
+@cache
+def get_rate_limit_store() -> Any:
+    """
+    Return the store of ``settings.RATE_LIMIT_STORE``, shared by the routes:
+    ``memory`` (default), ``sqlite`` (at ``RATE_LIMIT_LOCATION``) or the
+    dotted path of a class.
+    """
+    store = getattr(settings, "RATE_LIMIT_STORE", "memory")
+    location = getattr(settings, "RATE_LIMIT_LOCATION", None)
+    if store == "memory":
+        return MemoryRateLimitStore(getattr(settings, "RATE_LIMIT_MAX_KEYS", DEFAULT_MAX_KEYS))
+    if store == "sqlite":
+        return SQLiteRateLimitStore(location) if location is not None else SQLiteRateLimitStore()
+    if not isinstance(store, str):
+        return store
+    try:
+        store_class = import_string(store)
+    except ImportError as e:
+        raise ImproperlyConfigured(f"settings.RATE_LIMIT_STORE: {e}") from e
+    return store_class(location) if location is not None else store_class()
+
+
+def rate_limit(
+    rate: str,
+    key: str | Callable[[Scope], str | None] | None = None,
+    algorithm: str | None = None,
+    burst: int | None = None,
+    cost: int = 1,
+    name: str | None = None,
+) -> Callable[[HTTPRouteHandler], HTTPRouteHandler]:
+    """
+    Limit the requests of a route, applied on top of the route decorator.
+    The key and algorithm default to ``RATE_LIMIT_KEY`` and
+    ``RATE_LIMIT_ALGORITHM``, the counters are the route's own unless
+    another policy has the same ``name``.
+
+    Returns:
+        Callable: route handler decorator
+    """
+
+    def decorator(handler: HTTPRouteHandler) -> HTTPRouteHandler:
+        if not isinstance(handler, HTTPRouteHandler):
+            raise ImproperlyConfigured("rate_limit() must decorate a route handler, above @get().")
+        handler.opt[OPT_KEY] = RateLimit(
+            rate,
+            key=key or getattr(settings, "RATE_LIMIT_KEY", "ip"),
+            algorithm=algorithm or getattr(settings, "RATE_LIMIT_ALGORITHM", TOKEN_BUCKET),
+            burst=burst,
+            cost=cost,
+            name=name or f"{handler.fn.__module__}.{handler.fn.__qualname__}",
+        )
+        return handler
+
+    return decorator
+
+
+def _get_client_ip(scope: Scope) -> str | None:
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+def _get_user(scope: Scope) -> str | None:
+    user = scope.get("user")
+    if user is None:
+        return None
+    pk = getattr(user, "pk", None)
+    if pk is None:
+        pk = getattr(user, "id", None)
+    return str(pk) if pk is not None else None
+
+
+class RateLimitMiddleware(AbstractMiddleware):
+    """
+    Count the requests of every route against its rate limit policy.
+    Requests without a ``user`` or API key are counted by IP address.
+    """
+
+    scopes = {ScopeType.HTTP}
+
+    def __init__(self, app: ASGIApp, store: Any = None, **kwargs):
+        super().__init__(
+            app,
+            exclude=getattr(settings, "RATE_LIMIT_EXCLUDE", None),
+            exclude_opt_key=getattr(settings, "RATE_LIMIT_EXCLUDE_OPT_KEY", None),
+            **kwargs,
+        )
+        self.store = store if store is not None else get_rate_limit_store()
+        rate = getattr(settings, "RATE_LIMIT", None)
+        self.default = (
+            RateLimit(
+                rate,
+                key=getattr(settings, "RATE_LIMIT_KEY", "ip"),
+                algorithm=getattr(settings, "RATE_LIMIT_ALGORITHM", TOKEN_BUCKET),
+            )
+            if rate
+            else None
+        )
+        self.api_key_header = getattr(settings, "RATE_LIMIT_API_KEY_HEADER", DEFAULT_API_KEY_HEADER).lower().encode()
+        # the in-process store is called without awaiting.
+        self.hit_sync = self.store.hit_sync if isinstance(self.store, MemoryRateLimitStore) else None
+        self._policies: dict[Any, RateLimit | None] = {}
+
+    def get_policy(self, handler: Any) -> RateLimit | None:
+        try:
+            return self._policies[handler]
+        except KeyError:
+            pass
+        policy = (getattr(handler, "opt", None) or {}).get(OPT_KEY, self.default)
+        if isinstance(policy, str):
+            policy = RateLimit(
+                policy,
+                key=getattr(settings, "RATE_LIMIT_KEY", "ip"),
+                algorithm=getattr(settings, "RATE_LIMIT_ALGORITHM", TOKEN_BUCKET),
+                name=f"{handler.fn.__module__}.{handler.fn.__qualname__}",
+            )
+        self._policies[handler] = policy
+        return policy
+
+    def get_key(self, scope: Scope, policy: RateLimit) -> str | None:
+        key = policy.key
+        if key == "ip":
+            return _get_client_ip(scope)
+        if key == "user":
+            return _get_user(scope) or _get_client_ip(scope)
+        if key == "api_key":
+            for name, value in scope["headers"]:
+                if name == self.api_key_header:
+                    return value.decode("latin-1")
+            return _get_client_ip(scope)
+        return key(scope)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        policy = self.get_policy(scope.get("route_handler"))
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+        client_key = self.get_key(scope, policy)
+        if client_key is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = f"{policy.name}:{client_key}"
+        result = self.hit_sync(key, policy) if self.hit_sync is not None else await self.store.hit(key, policy)
+        headers = [
+            (b"ratelimit-limit", str(policy.limit).encode()),
+            (b"ratelimit-remaining", str(result.remaining).encode()),
+            (b"ratelimit-reset", str(math.ceil(result.reset)).encode()),
+            (b"ratelimit-policy", policy.policy_header),
+        ]
+
+        if not result.allowed:
+            headers.append((b"retry-after", str(math.ceil(result.retry_after)).encode()))
+            headers.append((b"content-type", b"application/json"))
+            headers.append((b"content-length", str(len(_DENIED_BODY)).encode()))
+            await send({"type": "http.response.start", "status": 429, "headers": headers})
+            await send({"type": "http.response.body", "body": _DENIED_BODY})
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).extend(headers)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
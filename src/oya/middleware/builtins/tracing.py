@@ -0,0 +1,342 @@
+"""
+Request tracing.
+
+Enabled with ``settings.TRACING_ENABLED``, ``Application`` then installs
+``TracingMiddleware`` which opens a span per sampled request, with child
+spans for the ``before_request``/``after_request`` hooks and for each
+Tortoise query.
+
+Finished spans are buffered in memory and exported in batches, in the
+background, as OTLP JSON: appended to ``settings.TRACING_EXPORT_FILE`` or
+posted to the collector at ``settings.TRACING_EXPORT_ENDPOINT``
+(e.g. ``http://127.0.0.1:4318/v1/traces``).
+"""
+
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+import urllib.request
+from collections import deque
+from contextvars import ContextVar
+from inspect import isawaitable
+from typing import Any, Callable
+
+from litestar.enums import ScopeType
+from litestar.middleware.base import AbstractMiddleware
+from litestar.types import ASGIApp, Message, Receive, Scope, Send
+
+from oya.conf import settings
+from oya.db.instrumentation import QueryEvent, add_query_hook
+from oya.middleware.context import get_route_template
+
+
+__all__ = (
+    "FileExporter",
+    "OTLPHttpExporter",
+    "Span",
+    "TracingMiddleware",
+    "get_current_span",
+    "get_tracer",
+    "shutdown_tracing",
+    "trace_hook",
+)
+
+
+logger = logging.getLogger("oya.tracing")
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# version, trace id, parent id and flags of a W3C traceparent header.
+TRACEPARENT_RE = re.compile(r"[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+INVALID_TRACE_ID = "0" * 32
+INVALID_SPAN_ID = "0" * 16
+
+
+class Span:
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind",
+        "start", "end", "attributes", "status",
+    )
+
+    def __init__(self, trace_id: str, parent_id: str | None, name: str, kind: int, start: int | None = None):
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = start or time.time_ns()
+        self.end = 0
+        self.attributes: dict[str, Any] = {}
+        self.status = STATUS_OK
+
+    def child(self, name: str, kind: int = SPAN_KIND_INTERNAL, start: int | None = None) -> "Span":
+        return Span(self.trace_id, self.span_id, name, kind, start)
+
+    def to_otlp(self) -> dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _attribute(key: str, value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+_current_span: ContextVar[Span | None] = ContextVar("oya_current_span", default=None)
+
+
+def get_current_span() -> Span | None:
+    """
+    Return the innermost span of the current request, None when the request
+    is not sampled.
+    """
+    return _current_span.get()
+
+
+class FileExporter:
+    """
+    Append the batches to a file, one OTLP JSON document per line.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, payload: dict[str, Any]):
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(payload, separators=(",", ":")) + "\n")
+
+
+class OTLPHttpExporter:
+    """
+    Post the batches to an OTLP/HTTP JSON collector.
+    """
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, payload: dict[str, Any]):
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:  # nosec: configured endpoint
+            response.read()
+
+
+class Tracer:
+    """
+    Sampling, buffering and batched export of the spans of this process.
+    """
+
+    def __init__(self):
+        self.sample_rate: float = getattr(settings, "TRACING_SAMPLE_RATE", 0.1)
+        self.service_name: str = getattr(settings, "TRACING_SERVICE_NAME", "oya")
+        self.batch_size: int = getattr(settings, "TRACING_BATCH_SIZE", 512)
+        self.export_interval: float = getattr(settings, "TRACING_EXPORT_INTERVAL", 5.0)
+        self.buffer: deque[Span] = deque(maxlen=getattr(settings, "TRACING_BUFFER_SIZE", 10000))
+        self.dropped = 0
+
+        endpoint = getattr(settings, "TRACING_EXPORT_ENDPOINT", None)
+        if endpoint:
+            self.exporter = OTLPHttpExporter(endpoint)
+        else:
+            self.exporter = FileExporter(getattr(settings, "TRACING_EXPORT_FILE", "traces.jsonl"))
+
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    def should_sample(self, scope: Scope) -> tuple[str, str | None] | None:
+        """
+        Return the trace id and remote parent of a sampled request, the
+        decision of a W3C ``traceparent`` header is honoured.
+        """
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                match = TRACEPARENT_RE.fullmatch(value.decode("latin-1").strip())
+                # a malformed header is ignored, the request is sampled at the rate.
+                if match and match[1] != INVALID_TRACE_ID and match[2] != INVALID_SPAN_ID:
+                    if int(match[3], 16) & 1:
+                        return match[1], match[2]
+                    return None
+                break
+
+        if self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+            return "%032x" % random.getrandbits(128), None
+        return None
+
+    def finish(self, span: Span, end: int | None = None):
+        span.end = end or time.time_ns()
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(span)
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._export_loop())
+        elif len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _take_batch(self) -> dict[str, Any] | None:
+        spans = []
+        while self.buffer and len(spans) < self.batch_size:
+            spans.append(self.buffer.popleft().to_otlp())
+        if not spans:
+            return None
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "oya"}, "spans": spans}],
+            }]
+        }
+
+    async def _export_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.export_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        while (payload := self._take_batch()) is not None:
+            try:
+                await asyncio.to_thread(self.exporter.export, payload)
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                logger.warning("Unable to export spans: %s", exc)
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+_tracer: Tracer | None = None
+
+
+def get_tracer() -> Tracer:
+    global _tracer  # pylint: disable=global-statement
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+
+async def shutdown_tracing():
+    """
+    Export the buffered spans, registered as an on_shutdown hook.
+    """
+    if _tracer is not None:
+        await _tracer.shutdown()
+
+
+def _record_query(event: QueryEvent):
+    parent = _current_span.get()
+    if parent is None:
+        return
+
+    elapsed = time.perf_counter() - event.start
+    span = parent.child(event.method, SPAN_KIND_CLIENT, start=time.time_ns() - int(elapsed * 1e9))
+    span.attributes["db.system"] = event.client.capabilities.dialect
+    span.attributes["db.name"] = event.connection_name
+    span.attributes["db.statement"] = event.fingerprint
+    if event.error is not None:
+        span.status = STATUS_ERROR
+    get_tracer().finish(span, end=span.start + int(event.duration * 1e9))
+
+
+def trace_hook(hook: Callable, name: str) -> Callable:
+    """
+    Wrap a lifecycle hook (``before_request``, ``after_request``) so that it
+    is recorded as a child span of the request.
+    """
+
+    async def wrapper(arg):
+        parent = _current_span.get()
+        if parent is None:
+            result = hook(arg)
+            return await result if isawaitable(result) else result
+
+        span = parent.child(name)
+        token = _current_span.set(span)
+        try:
+            result = hook(arg)
+            return await result if isawaitable(result) else result
+        except BaseException:
+            span.status = STATUS_ERROR
+            raise
+        finally:
+            _current_span.reset(token)
+            get_tracer().finish(span)
+
+    wrapper.__wrapped__ = hook
+    return wrapper
+
+
+class TracingMiddleware(AbstractMiddleware):
+    scopes = {ScopeType.HTTP}
+
+    def __init__(self, app: ASGIApp, **kwargs):
+        super().__init__(app, **kwargs)
+        self.tracer = get_tracer()
+        add_query_hook(_record_query)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        sampled = self.tracer.should_sample(scope)
+        if sampled is None:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id, remote_parent = sampled
+        route = get_route_template(scope)
+        span = Span(trace_id, remote_parent, f"{scope['method']} {route}", SPAN_KIND_SERVER)
+        span.attributes["http.method"] = scope["method"]
+        span.attributes["http.route"] = route
+        span.attributes["http.target"] = scope["path"]
+        handler = scope.get("route_handler")
+        if handler is not None:
+            span.attributes["code.function"] = handler.handler_name
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                span.attributes["http.status_code"] = message["status"]
+                if message["status"] >= 500:
+                    span.status = STATUS_ERROR
+            await send(message)
+
+        token = _current_span.set(span)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            span.status = STATUS_ERROR
+            raise
+        finally:
+            _current_span.reset(token)
+            self.tracer.finish(span)
@@ -0,0 +1,116 @@
+"""
+Streamed multipart uploads.
+
+Enabled with ``settings.UPLOAD_SPOOLED``: ``SpooledUploadMiddleware`` parses
+the ``multipart/form-data`` bodies before the handler, as they arrive, with
+``oya.core.files.MultipartParser``. The form is stored where litestar looks
+for an already parsed one, so ``data`` parameters and ``request.form()`` get
+the values and ``SpooledUploadFile`` objects. The temporary files not moved
+to a storage are deleted after the response.
+
+``UPLOAD_MAX_SIZE`` (checked against ``Content-Length`` first) and
+``UPLOAD_MAX_PART_SIZE`` answer 413 as soon as they are exceeded, routes
+override them with the ``upload_max_size`` and ``upload_max_part_size`` opts.
+A malformed ``Content-Length`` is answered with 400.
+
+litestar runs the ``CSRFMiddleware`` of ``csrf_config`` inside the
+application middlewares: with ``UPLOAD_SPOOLED`` it reads the ``_csrf_token``
+field from the form parsed here instead of buffering the body, and the body
+of a request with an invalid token is received before it is rejected.
+"""
+
+from typing import Any, AsyncIterator
+
+from litestar._multipart import parse_content_header
+from litestar.enums import RequestEncodingType, ScopeType
+from litestar.exceptions import ClientException, InternalServerException
+from litestar.middleware.base import AbstractMiddleware
+from litestar.types import ASGIApp, Message, Receive, Scope, Send
+
+from oya.conf import settings
+from oya.core.files.uploads import DEFAULT_MAX_FIELD_SIZE, DEFAULT_SPOOL_SIZE, MultipartParser
+
+
+__all__ = ("SpooledUploadMiddleware",)
+
+
+DEFAULT_HASHES = ("sha256",)
+MAX_SIZE_OPT_KEY = "upload_max_size"
+MAX_PART_SIZE_OPT_KEY = "upload_max_part_size"
+
+
+async def _iter_body(receive: Receive) -> AsyncIterator[bytes]:
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise InternalServerException("client disconnected prematurely")
+        if message.get("body"):
+            yield message["body"]
+        if not message.get("more_body", False):
+            return
+
+
+async def _receive_consumed() -> Message:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+class SpooledUploadMiddleware(AbstractMiddleware):
+    """
+    Parse the multipart bodies as a stream, spooling the files.
+    """
+
+    scopes = {ScopeType.HTTP}
+
+    def __init__(self, app: ASGIApp, **kwargs):
+        super().__init__(app, **kwargs)
+        self.max_size: int | None = getattr(settings, "UPLOAD_MAX_SIZE", None)
+        self.max_part_size: int | None = getattr(settings, "UPLOAD_MAX_PART_SIZE", None)
+        self.max_field_size: int = getattr(settings, "UPLOAD_MAX_FIELD_SIZE", DEFAULT_MAX_FIELD_SIZE)
+        self.spool_size: int = getattr(settings, "UPLOAD_SPOOL_SIZE", DEFAULT_SPOOL_SIZE)
+        self.hashes = tuple(getattr(settings, "UPLOAD_HASHES", DEFAULT_HASHES))
+        self.temp_dir: str | None = getattr(settings, "UPLOAD_TEMP_DIR", None)
+        if self.temp_dir is not None:
+            self.temp_dir = str(self.temp_dir)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        content_type = content_length = None
+        for name, value in scope["headers"]:
+            if name == b"content-type":
+                content_type = value.decode("latin-1")
+            elif name == b"content-length":
+                content_length = value
+
+        if content_type is None or "_form" in scope:
+            await self.app(scope, receive, send)
+            return
+        media_type, options = parse_content_header(content_type)
+        if media_type != RequestEncodingType.MULTI_PART:
+            await self.app(scope, receive, send)
+            return
+
+        handler: Any = scope.get("route_handler")
+        opt = getattr(handler, "opt", None) or {}
+        max_size = opt.get(MAX_SIZE_OPT_KEY, self.max_size)
+        if content_length is not None:
+            try:
+                content_length = int(content_length)
+            except ValueError:
+                raise ClientException(detail="Malformed Content-Length header") from None
+        if max_size is not None and content_length is not None and content_length > max_size:
+            raise ClientException(status_code=413, detail=f"Request body exceeds the limit of {max_size} bytes")
+
+        parser = MultipartParser(
+            boundary=options.get("boundary", "").encode(),
+            part_limit=scope["app"].multipart_form_part_limit,
+            max_size=max_size,
+            max_part_size=opt.get(MAX_PART_SIZE_OPT_KEY, self.max_part_size),
+            max_field_size=self.max_field_size,
+            spool_size=self.spool_size,
+            hashes=self.hashes,
+            temp_dir=self.temp_dir,
+        )
+        try:
+            scope["_form"] = await parser.parse(_iter_body(receive))  # type: ignore[typeddict-unknown-key]
+            await self.app(scope, _receive_consumed, send)
+        finally:
+            await parser.close()
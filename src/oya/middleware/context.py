@@ -0,0 +1,46 @@
+"""
+Helpers giving the middlewares access to the matched route.
+"""
+
+from typing import Any
+
+from litestar.types import Scope
+
+
+__all__ = ("get_route_template",)
+
+
+def _build_route_templates(app: Any) -> dict[int, str]:
+    templates: dict[int, str] = {}
+    for route in app.routes:
+        handlers = getattr(route, "route_handlers", None) or [route.route_handler]
+        for handler in handlers:
+            templates[id(handler)] = route.path
+    return templates
+
+
+def get_route_template(scope: Scope) -> str:
+    """
+    Return the path template of the route matched for the scope, e.g.
+    ``/posts/{post_id:int}``, usable as a low cardinality label.
+
+    Args:
+        scope (Scope): ASGI scope, after routing.
+
+    Returns:
+        str: path template, the raw path when no route was matched
+    """
+    handler = scope.get("route_handler")
+    if handler is None:
+        return scope["path"]
+
+    app = scope["app"]
+    try:
+        templates = app.state["_oya_route_templates"]
+    except KeyError:
+        templates = app.state["_oya_route_templates"] = _build_route_templates(app)
+
+    try:
+        return templates[id(handler)]
+    except KeyError:
+        return scope["path"]
@@ -0,0 +1,93 @@
+"""
+HTTP content negotiation helpers.
+"""
+
+from functools import lru_cache
+
+
+__all__ = (
+    "choose_encoding",
+    "is_compressible",
+    "parse_accept_encoding",
+)
+
+
+# types worth compressing, the others (images, fonts, archives, media) are
+# already compressed.
+COMPRESSIBLE_TYPES = frozenset((
+    "application/javascript",
+    "application/json",
+    "application/ld+json",
+    "application/manifest+json",
+    "application/rss+xml",
+    "application/atom+xml",
+    "application/wasm",
+    "application/x-javascript",
+    "application/xhtml+xml",
+    "application/xml",
+    "font/otf",
+    "font/ttf",
+    "image/bmp",
+    "image/svg+xml",
+    "image/vnd.microsoft.icon",
+    "image/x-icon",
+))
+
+
+@lru_cache(maxsize=256)
+def is_compressible(content_type: str | None) -> bool:
+    """
+    Return True when a body of ``content_type`` (parameters allowed) is
+    worth compressing.
+    """
+    if not content_type:
+        return False
+    mime = content_type.split(";", 1)[0].strip().lower()
+    return mime.startswith("text/") or mime in COMPRESSIBLE_TYPES or mime.endswith(("+json", "+xml"))
+
+
+@lru_cache(maxsize=256)
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """
+    Parse an ``Accept-Encoding`` header into the quality of each coding.
+    """
+    codings: dict[str, float] = {}
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        codings[coding] = quality
+    return codings
+
+
+def choose_encoding(header: str | None, available: tuple[str, ...]) -> str | None:
+    """
+    Return the first coding of ``available`` (by order of preference) the
+    client accepts, None for the identity.
+
+    Args:
+        header (str | None): value of the ``Accept-Encoding`` header.
+        available (tuple[str, ...]): codings in order of preference.
+
+    Returns:
+        str | None
+    """
+    if not header or not available:
+        return None
+    codings = parse_accept_encoding(header)
+    default = codings.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = codings.get(coding, default)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
@@ -0,0 +1,197 @@
+"""
+Non-blocking logging pipeline.
+
+``QueueLogHandler`` formats the records (as JSON lines with
+``JSONFormatter``) and puts the lines in a bounded queue, a background thread
+writes them in batches to the configured outputs. The records are formatted
+when they are logged, so their arguments are not read after they may have
+changed, nor their tracebacks kept alive. Records are dropped and counted
+when the queue is full, so a slow output never stalls the event loop.
+
+``oya.apps.asgi.utils.get_logging_config()`` builds the default
+``LoggingConfig`` of ``Application`` with it.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from typing import Any, BinaryIO
+
+import msgspec
+
+
+__all__ = (
+    "JSONFormatter",
+    "QueueLogHandler",
+)
+
+
+# attributes of every LogRecord, the other ones come from ``extra``.
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_STOP = object()
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Serialize a record as a single JSON line, ``extra`` fields included.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._encoder = msgspec.json.Encoder(enc_hook=str)
+
+    def format(self, record: logging.LogRecord) -> str:
+        return self.format_bytes(record).decode()
+
+    def format_bytes(self, record: logging.LogRecord) -> bytes:
+        data: dict[str, Any] = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = "".join(traceback.format_exception(*record.exc_info))
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+        if record.stack_info:
+            data["stack"] = record.stack_info
+        return self._encoder.encode(data)
+
+
+class _Output:
+    __slots__ = ("stream", "owned")
+
+    def __init__(self, target: str):
+        if target == "stdout":
+            self.stream, self.owned = sys.stdout.buffer, False
+        elif target == "stderr":
+            self.stream, self.owned = sys.stderr.buffer, False
+        else:
+            self.stream, self.owned = open(target, "ab"), True  # pylint: disable=consider-using-with
+
+    def write(self, data: bytes):
+        stream: BinaryIO = self.stream
+        stream.write(data)
+        stream.flush()
+
+    def close(self):
+        if self.owned:
+            self.stream.close()
+
+
+class QueueLogHandler(logging.Handler):
+    """
+    Handler whose cost on the calling thread is formatting the record and
+    an enqueue, without any I/O.
+
+    Args:
+        outputs (list[str]): ``"stdout"``, ``"stderr"`` or file paths.
+        queue_size (int): records kept in memory before dropping.
+        batch_size (int): records written at once.
+    """
+
+    def __init__(
+        self,
+        outputs: list[str] | None = None,
+        queue_size: int = 10000,
+        batch_size: int = 256,
+        level: int = logging.NOTSET,
+    ):
+        super().__init__(level)
+        self.outputs_config = list(outputs or ["stdout"])
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._start()
+        atexit.register(self.close)
+        # a thread does not survive fork, the pre-fork workers start their own.
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self.queue: queue.Queue = queue.Queue(self.queue_size)
+        self._reported_dropped = self.dropped
+        self._outputs = [_Output(target) for target in self.outputs_config]
+        self._thread = threading.Thread(target=self._run, name="oya-log-writer", daemon=True)
+        self._thread.start()
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # no handler lock, the queue is thread safe.
+        if not self.filter(record):
+            return False
+        if self.queue.full():
+            self.dropped += 1
+            return True
+        try:
+            data = self._serialize(record)
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.handleError(record)
+            return True
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            self.dropped += 1
+        return True
+
+    def emit(self, record: logging.LogRecord):
+        self.handle(record)
+
+    def _serialize(self, record: logging.LogRecord) -> bytes:
+        formatter = self.formatter
+        if isinstance(formatter, JSONFormatter):
+            return formatter.format_bytes(record) + b"\n"
+        return (self.format(record) + "\n").encode("utf-8", "replace")
+
+    def _run(self):
+        while True:
+            data = self.queue.get()
+            batch = [data]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = _STOP in batch
+            chunks = [data for data in batch if data is not _STOP]
+
+            if self.dropped != self._reported_dropped:
+                count = self.dropped - self._reported_dropped
+                self._reported_dropped = self.dropped
+                chunks.append(self._serialize(logging.makeLogRecord({
+                    "name": "oya.log", "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": "%s log records dropped, the logging queue is full",
+                    "args": (count,), "created": time.time(),
+                })))
+
+            if chunks:
+                data = b"".join(chunks)
+                for output in self._outputs:
+                    try:
+                        output.write(data)
+                    except (OSError, ValueError):
+                        pass
+
+            if stop:
+                return
+
+    def close(self):
+        thread = getattr(self, "_thread", None)
+        if thread is not None and thread.is_alive():
+            try:
+                self.queue.put(_STOP, timeout=1)
+            except queue.Full:
+                pass
+            thread.join(timeout=5)
+        for output in getattr(self, "_outputs", ()):
+            output.close()
+        super().close()
@@ -2,6 +2,7 @@ import gzip
 import re
 import secrets
 import unicodedata
+import zlib
 from gzip import GzipFile
 from gzip import compress as gzip_compress
 from io import BytesIO
@@ -10,6 +11,16 @@ from oya.core.exceptions import SuspiciousFileOperation
 from oya.utils.functional import keep_lazy_text, lazy
 from oya.utils.regex_helper import _lazy_re_compile
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 @keep_lazy_text
 def capfirst(x):
@@ -162,6 +173,60 @@ def compress_sequence(sequence, *, max_random_bytes=None):
     yield buf.read()
 
 
+def get_stream_encodings() -> tuple[str, ...]:
+    """
+    Return the content codings StreamCompressor supports with the installed
+    packages.
+    """
+    return (
+        *(("zstd",) if zstandard is not None else ()),
+        *(("br",) if brotli is not None else ()),
+        "gzip",
+    )
+
+
+# Like compress_sequence, but pushed: the ASGI bodies are sent, not iterated.
+class StreamCompressor:
+    """
+    Incremental compressor of a response body. Each chunk is flushed so that
+    a streamed response reaches the client as it is produced.
+
+    Args:
+        encoding (str): ``gzip``, ``br`` (brotli package) or ``zstd``
+            (zstandard package).
+        level (int): compression level (brotli quality).
+    """
+
+    __slots__ = ("encoding", "_compressor")
+
+    def __init__(self, encoding: str = "gzip", level: int = 6):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        elif encoding == "br" and brotli is not None:
+            self._compressor = brotli.Compressor(quality=level)
+        elif encoding == "zstd" and zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            raise ValueError(f"Unsupported content coding: {encoding}")
+
+    def compress(self, data: bytes, flush: bool = True) -> bytes:
+        compressor = self._compressor
+        if self.encoding == "br":
+            return compressor.process(data) + compressor.flush() if flush else compressor.process(data)
+        if not flush:
+            return compressor.compress(data)
+        if self.encoding == "gzip":
+            return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return compressor.compress(data) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        compressor = self._compressor
+        if self.encoding == "br":
+            return compressor.process(data) + compressor.finish()
+        return compressor.compress(data) + compressor.flush()
+
+
 # Expression to match some_token and some_token="with spaces" (and similarly
 # for single-quoted strings).
 smart_split_re = _lazy_re_compile(
@@ -0,0 +1,58 @@
+"""
+Smoke test of the project template: the default settings build the app.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+
+jinja2 = pytest.importorskip("jinja2")
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+TEMPLATE_DIR = SRC_DIR / "oya" / "core" / "initializer" / "templates" / "project"
+
+
+def render_project(root: Path, name: str = "demo") -> Path:
+    environment = jinja2.Environment(loader=jinja2.FileSystemLoader(str(TEMPLATE_DIR)))
+    context = {
+        "secret_key": "x" * 50,
+        "base_name": name,
+        "camel_case_name": name,
+        "snake_case_name": name,
+    }
+    package = root / name
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    for template in ("settings.py.jinja", "main.py.jinja"):
+        (package / template.replace(".jinja", "")).write_text(environment.get_template(template).render(**context))
+    return package
+
+
+def build_app(root: Path, settings_module: str) -> subprocess.CompletedProcess:
+    # a process per build: Application reads the settings when it is imported.
+    env = {
+        **os.environ,
+        "OYA_SETTINGS_MODULE": settings_module,
+        "PYTHONPATH": os.pathsep.join([str(SRC_DIR), str(root)]),
+    }
+    code = "from oya.apps.asgi import Application; Application.get_asgi_application()"
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=root, env=env, capture_output=True, text=True, timeout=60, check=False
+    )
+
+
+def test_default_settings_build_the_app(tmp_path):
+    render_project(tmp_path)
+    result = build_app(tmp_path, "demo.settings")
+    assert result.returncode == 0, result.stderr
+
+
+def test_adaptive_compression_builds_the_app(tmp_path):
+    package = render_project(tmp_path)
+    (package / "adaptive.py").write_text("from demo.settings import *\n\nCOMPRESSION_ADAPTIVE = True\n")
+    result = build_app(tmp_path, "demo.adaptive")
+    assert result.returncode == 0, result.stderr